@@ -1,9 +1,15 @@
+import hashlib
 import os
+import uuid
 
 import streamlit as st
 from dotenv import load_dotenv
 
 from nutria_core.chat_engine import ChatEngine
+from nutria_core.conversation_store import ConversationStore
+from nutria_core.data_processing import recargar_compartido
+from nutria_core.enrutador import EnrutadorIntenciones
+from nutria_core.historial import Conversacion, burbuja_html
 from nutria_core.voice_utils import whisper_to_text, text_to_speech
 
 # =====================================================
@@ -69,27 +75,77 @@ html, body, [class*="css"] {
 # =====================================================
 # INICIALIZAR MOTOR DE CHAT Y ESTADO
 # =====================================================
+# Mensajes que se redibujan siempre; los anteriores se paginan bajo demanda
+VENTANA_MENSAJES = 20
+TAM_PAGINA = 20
+
+# Historial de todas las sesiones: ventana en RAM + SQLite (uno por proceso)
+@st.cache_resource
+def cargar_store() -> ConversationStore:
+    return ConversationStore(
+        ruta_db=os.getenv("NUTRIA_DB_CONVERSACIONES", "conversaciones.sqlite"),
+        ventana=int(os.getenv("NUTRIA_VENTANA_RAM", "40")),
+        inactividad_s=float(os.getenv("NUTRIA_INACTIVIDAD_S", "1800")),
+    )
+
+
+# Motor LLM + tools (uno por proceso, no uno por rerun)
+@st.cache_resource
+def cargar_chat_engine(api_key: str) -> ChatEngine:
+    with open("system_message.txt", "r", encoding="utf-8") as f:
+        system_message = f.read()
+    return ChatEngine(
+        api_key=api_key,
+        model_llm="gpt-4o-mini",
+        system_message=system_message,
+        store=cargar_store(),
+        especular=os.getenv("NUTRIA_ESPECULAR", "0") == "1",
+        compacto=os.getenv("NUTRIA_PROMPT_COMPACTO", "0") == "1",
+        enrutador=(
+            EnrutadorIntenciones.desde_archivo(os.getenv("NUTRIA_MODELO_INTENCIONES"))
+            if os.getenv("NUTRIA_ENRUTAR", "0") == "1"
+            else None
+        ),
+    )
+
+
+chat_engine = cargar_chat_engine(OPENAI_API_KEY)
+
 if "dialog" not in st.session_state:
-    # dialog = lista de dicts: {"role": "user"/"assistant", "content": "..."}
-    st.session_state.dialog = []
-    # Mensaje de bienvenida inicial
-    st.session_state.dialog.append(
-        {
-            "role": "assistant",
-            "content": (
-                "👋 Hola, soy **NutrIA**.\n\n"
-                "Puedo ayudarte a analizar alimentos, sugerir sustituciones y generar "
-                "un plan nutricional basado en tus datos (edad, peso, estatura, actividad y objetivo)."
-            ),
-        }
+    # dialog = Conversacion: vista de esta sesión sobre el store compartido
+    st.session_state.dialog = Conversacion(
+        cargar_store(),
+        sesion=uuid.uuid4().hex,
+        bienvenida=(
+            "👋 Hola, soy **NutrIA**.\n\n"
+            "Puedo ayudarte a analizar alimentos, sugerir sustituciones y generar "
+            "un plan nutricional basado en tus datos (edad, peso, estatura, actividad y objetivo)."
+        ),
     )
 
-# Motor LLM + tools
-chat_engine = ChatEngine(
-    api_key=OPENAI_API_KEY,
-    model_llm="gpt-4o-mini",
-    system_message=open("system_message.txt", "r", encoding="utf-8").read(),
-)
+# Liberar de RAM las sesiones inactivas (se vuelcan a disco)
+cargar_store().desalojar_inactivas()
+
+# Con NUTRIA_DATASET_COMPARTIDO: adoptar la generación nueva si se publicó otra
+recargar_compartido()
+
+
+def responder(texto: str) -> str:
+    """
+    Llama al motor con el historial de la sesión; el motor lee los pares
+    del store y registra el turno. Compartido por las pestañas de chat y voz.
+    """
+    dialog: Conversacion = st.session_state.dialog
+    return chat_engine.chat(texto, session_id=dialog.sesion)
+
+
+def mostrar_mensajes(mensajes) -> None:
+    if mensajes:
+        st.markdown(
+            "".join(burbuja_html(m["role"], m["content"]) for m in mensajes),
+            unsafe_allow_html=True,
+        )
+
 
 # =====================================================
 # HEADER
@@ -160,46 +216,45 @@ with col_main:
     with tab_chat:
         st.subheader("💬 Conversa con NutrIA")
 
-        # Mostrar historial con burbujas
-        for msg in st.session_state.dialog:
-            role = "Usuario" if msg["role"] == "user" else "NutrIA"
-            css_class = "chat-user" if msg["role"] == "user" else "chat-bot"
-            st.markdown(
-                f"<div class='{css_class}'>"
-                f"<div class='chat-role'><b>{role}</b></div>"
-                f"{msg['content']}</div>",
-                unsafe_allow_html=True,
+        dialog: Conversacion = st.session_state.dialog
+
+        # Mensajes anteriores a la ventana: solo se dibujan si se piden
+        n_anteriores = dialog.n_anteriores(VENTANA_MENSAJES)
+        if n_anteriores and st.toggle(
+            "Mostrar mensajes anteriores",
+            key="ver_anteriores",
+            help=f"{n_anteriores} mensajes fuera de la vista reciente",
+        ):
+            n_paginas = -(-n_anteriores // TAM_PAGINA)
+            pagina = st.number_input(
+                "Página (1 = más reciente)",
+                min_value=1,
+                max_value=n_paginas,
+                value=1,
+                key="pagina_anteriores",
+            )
+            mostrar_mensajes(
+                dialog.pagina_anterior(pagina - 1, TAM_PAGINA, VENTANA_MENSAJES)
             )
+            st.divider()
+
+        # Ventana reciente con burbujas
+        mostrar_mensajes(dialog.recientes(VENTANA_MENSAJES))
+
+        # Turnos nuevos de esta corrida (chat o voz): la pestaña de voz se
+        # dibuja después, así que escribe aquí su turno al registrarlo
+        turnos_nuevos = st.container()
 
         # Entrada tipo chat (ENTER envía el mensaje)
         user_input = st.chat_input("Escribe tu mensaje...")
 
         if user_input:
-            # 1) Guardar mensaje del usuario
-            st.session_state.dialog.append(
-                {"role": "user", "content": user_input}
-            )
-
-            # 2) Construir historial como pares (user, assistant)
-            history_pairs = []
-            last_user = None
-            for m in st.session_state.dialog:
-                if m["role"] == "user":
-                    last_user = m["content"]
-                elif m["role"] == "assistant" and last_user is not None:
-                    history_pairs.append((last_user, m["content"]))
-                    last_user = None
-
-            # 3) Llamar al motor de chat
-            respuesta = chat_engine.chat(user_input, history_pairs)
-
-            # 4) Guardar respuesta
-            st.session_state.dialog.append(
-                {"role": "assistant", "content": respuesta}
-            )
+            # El turno nuevo se dibuja aquí mismo, sin st.rerun():
+            # en la siguiente corrida ya forma parte de la ventana reciente.
+            responder(user_input)
+            with turnos_nuevos:
+                mostrar_mensajes(dialog.recientes(2))
 
-            # 5) Redibujar inmediatamente
-            st.rerun()
     # =================================================
     # TAB 2: VOZ (grabación nativa de Streamlit)
     # =================================================
@@ -209,74 +264,46 @@ with col_main:
         st.markdown("### 🎙️ Grabar audio desde el micrófono")
         audio_input = st.audio_input("Pulsa el botón para grabar tu voz")
 
-        # Mover la generación de respuesta a una función que se llama cuando hay audio nuevo
-        if audio_input is not None and 'audio_processed' not in st.session_state:
-            # Añadir un indicador de que el audio ya fue procesado en esta corrida
-            # Esto es solo para que el flujo de procesamiento se ejecute una sola vez
-            st.session_state.audio_processed = True
+        # Procesar cada grabación una sola vez (el widget conserva el audio entre corridas)
+        audio_id = (
+            hashlib.sha1(audio_input.getvalue()).hexdigest() if audio_input is not None else None
+        )
+
+        if audio_id is not None and audio_id != st.session_state.get("ultimo_audio_id"):
+            st.session_state.ultimo_audio_id = audio_id
 
             st.success("Audio grabado correctamente. Procesando...")
 
             # Convertir audio a texto con Whisper
             text = whisper_to_text(audio_input)
-            st.session_state.transcription = text # Guardar transcripción en la sesión
-            st.info(f"📝 Transcripción: {st.session_state.transcription}")
-
-            # Construcción de historial como pares
-            history_pairs = []
-            last_user = None
-            for m in st.session_state.dialog:
-                if m["role"] == "user":
-                    last_user = m["content"]
-                elif m["role"] == "assistant" and last_user is not None:
-                    history_pairs.append((last_user, m["content"]))
-                    last_user = None
-
-            # Chat LLM
-            respuesta = chat_engine.chat(text, history_pairs)
+            st.info(f"📝 Transcripción: {text}")
 
-            # 1) Guardar en el historial (en el orden correcto)
-            st.session_state.dialog.append({"role": "user", "content": text})
-            st.session_state.dialog.append({"role": "assistant", "content": respuesta})
+            # Chat LLM (registra el turno en el historial compartido)
+            respuesta = responder(text)
+            with turnos_nuevos:
+                mostrar_mensajes(st.session_state.dialog.recientes(2))
+            st.success(f"🤖 Respuesta: {respuesta}")
 
-            # 2) Guardar la respuesta para la generación de audio
-            st.session_state.last_response_text = respuesta
-
-            # 3) Forzar el redibujado
-            st.rerun()
-
-        # Lógica de visualización y audio después del rerun
-        if 'last_response_text' in st.session_state:
-            # 4) Mostrar la respuesta en texto
-            st.success(f"🤖 Respuesta: {st.session_state.last_response_text}")
-
-            # 5) Convertir respuesta a audio (solo se hace después del rerun)
-            audio_out = text_to_speech(st.session_state.last_response_text, voice="alloy")
+            # Convertir respuesta a audio
+            audio_out = text_to_speech(respuesta, voice="alloy")
 
             if audio_out and os.path.exists(audio_out):
                 try:
                     # Intentar leer el archivo MP3
                     with open(audio_out, "rb") as f:
                         audio_bytes = f.read()
-                
+
                     # Reproducir el audio en Streamlit
                     st.audio(audio_bytes, format="audio/mp3")
-                
+
                 except Exception as e:
                     # Si la lectura o reproducción falla
                     st.error(f"No pude reproducir el audio: {e}")
-            
+
                 finally:
                     # ¡CRUCIAL! Asegurar la eliminación del archivo después de intentar leerlo
-                    os.remove(audio_out) 
-                
+                    os.remove(audio_out)
+
             else:
                 # Si text_to_speech devolvió None o el archivo no existe
                 st.warning("No pude generar audio de la respuesta...")
-
-            # 6) Limpiar las variables temporales para la siguiente interacción
-            del st.session_state.last_response_text
-            if 'audio_processed' in st.session_state:
-                del st.session_state.audio_processed
-            if 'transcription' in st.session_state:
-                del st.session_state.transcription
\ No newline at end of file
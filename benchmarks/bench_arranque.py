@@ -0,0 +1,153 @@
+"""
+Tiempo de arranque en frío: imports de nutria_core y de app.py.
+
+Cada caso corre en un proceso nuevo con `python -X importtime` y sin
+OPENAI_API_KEY (importar no debe exigirla). Por caso se informa la mediana
+de N corridas de:
+
+- import_ms: suma de los tiempos acumulados de los imports de primer nivel
+  según -X importtime;
+- total_ms: reloj del caso completo (imports y, si el caso la tiene, la
+  primera llamada, p. ej. la primera tool con la carga del dataset);
+- pesados: los paquetes de terceros más caros (ms acumulados de su
+  import, donde sea que se haya disparado);
+- cargados: cuáles de openai / pandas / numpy / pydantic / streamlit
+  quedaron en sys.modules.
+
+Para app.py solo se ejecutan sus imports (extraídos con ast): el resto del
+script necesita el runtime de Streamlit.
+
+Verifica que la ruta de tools (tools_handler y enrutador, con la carga del
+dataset incluida) no importa el SDK de OpenAI.
+
+Uso:
+    python benchmarks/bench_arranque.py --repeticiones 5
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAQUETES = ("openai", "pandas", "numpy", "pydantic", "streamlit")
+
+PLANTILLA = r"""
+import sys, time
+t0 = time.perf_counter()
+{codigo}
+total_ms = (time.perf_counter() - t0) * 1000
+import json
+print(json.dumps({{"total_ms": total_ms, "cargados": [p for p in {paquetes!r} if p in sys.modules]}}))
+"""
+
+
+def imports_de_app() -> str:
+    with open(os.path.join(RAIZ, "app.py"), "r", encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    return "\n".join(
+        ast.unparse(nodo) for nodo in arbol.body if isinstance(nodo, (ast.Import, ast.ImportFrom))
+    )
+
+
+CASOS = {
+    "tools_handler": "import nutria_core.tools_handler",
+    "enrutador": "import nutria_core.enrutador",
+    "chat_engine": "import nutria_core.chat_engine",
+    "server": "import nutria_core.server",
+    "voice_utils": "import nutria_core.voice_utils",
+    "app.py": imports_de_app(),
+    # Cold start hasta la primera respuesta sin LLM
+    "primera_tool": (
+        "from nutria_core.tools_handler import ejecutar_tool\n"
+        "ejecutar_tool('get_food_info', {'nombre_alimento': 'manzana'})"
+    ),
+    "primera_ruta_local": (
+        "from nutria_core.enrutador import EnrutadorIntenciones\n"
+        "EnrutadorIntenciones().enrutar('¿Cuántas calorías tiene la manzana?')"
+    ),
+}
+
+# Casos que no deben cargar el SDK de OpenAI
+SIN_OPENAI = ("tools_handler", "enrutador", "chat_engine", "server", "voice_utils",
+              "primera_tool", "primera_ruta_local")
+
+
+def parsear_importtime(stderr: str) -> tuple:
+    """
+    A partir de la salida de -X importtime: ({import de primer nivel: ms
+    acumulados}, {paquete raíz: ms acumulados de su import más caro}).
+    """
+    primer_nivel, paquetes = {}, {}
+    for linea in stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        ms = int(acumulado) / 1000
+        if not nombre.startswith("  "):  # sin sangría extra = import de primer nivel
+            primer_nivel[nombre.strip()] = ms
+        raiz = nombre.strip().split(".")[0]
+        paquetes[raiz] = max(paquetes.get(raiz, 0.0), ms)
+    return primer_nivel, paquetes
+
+
+def correr(codigo: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=RAIZ)
+    env.pop("OPENAI_API_KEY", None)
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PLANTILLA.format(codigo=codigo, paquetes=PAQUETES)],
+        cwd=RAIZ, env=env, capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr[-2000:])
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    resultado["modulos"], resultado["paquetes"] = parsear_importtime(proceso.stderr)
+    return resultado
+
+
+def medir(nombre: str, codigo: str, repeticiones: int, base: set) -> dict:
+    corridas = [correr(codigo) for _ in range(repeticiones)]
+    por_paquete = {}
+    for c in corridas:
+        for paquete, ms in c["paquetes"].items():
+            if paquete not in base and paquete != "nutria_core":
+                por_paquete.setdefault(paquete, []).append(ms)
+    medianas = {p: statistics.median(v) for p, v in por_paquete.items()}
+    return {
+        "caso": nombre,
+        "import_ms": round(
+            statistics.median(
+                sum(ms for m, ms in c["modulos"].items() if m not in base) for c in corridas
+            ), 1
+        ),
+        "total_ms": round(statistics.median(c["total_ms"] for c in corridas), 1),
+        "pesados": {
+            m: round(ms, 1) for m, ms in sorted(medianas.items(), key=lambda x: -x[1])[:5]
+        },
+        "cargados": corridas[0]["cargados"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío (python -X importtime).")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--casos", nargs="+", default=list(CASOS), choices=list(CASOS))
+    args = parser.parse_args()
+
+    # Los imports que el intérprete ya hace al arrancar no son del caso
+    vacio = correr("pass")
+    base = set(vacio["modulos"]) | set(vacio["paquetes"])
+    resultados = [medir(nombre, CASOS[nombre], args.repeticiones, base) for nombre in args.casos]
+    print(json.dumps({"resultados": resultados}, indent=2, ensure_ascii=False))
+
+    for r in resultados:
+        if r["caso"] in SIN_OPENAI:
+            assert "openai" not in r["cargados"], r
+
+
+if __name__ == "__main__":
+    main()
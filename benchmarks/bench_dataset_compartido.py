@@ -0,0 +1,147 @@
+"""
+Memoria y arranque de N workers con el dataset leído del CSV por cada
+proceso frente al dataset publicado en memoria compartida.
+
+Cada worker es un proceso nuevo (como una instancia más de Streamlit o un
+worker del test de carga) que importa data_processing, ejercita las tres
+rutas que tocan el dataset (get_food_info, recomendaciones por categoría y
+el detector de alimentos) y queda vivo mientras se mide. Por modo y número
+de workers se informa:
+
+- carga_ms: import de data_processing y detector listos (sin contar el
+  import de pandas/pydantic; incluye los modelos pydantic, igual en ambos
+  modos). Con el dataset compartido, mapearlo y armar el df toma ~1 ms;
+- RSS medio, PSS total y USS medio (memoria privada) de los workers, leídos
+  de /proc/<pid>/smaps_rollup con todos vivos. El RSS cuenta las páginas
+  compartidas completas en cada proceso; el PSS total y el USS son los que
+  muestran si la memoria crece con los workers.
+
+Al final publica otra generación con los workers vivos y verifica que
+todos la adoptan con `recargar_compartido()`.
+
+Uso (Linux):
+    python benchmarks/bench_dataset_compartido.py --workers 1 4 8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from nutria_core.dataset_compartido import publicar_csv  # noqa: E402
+
+WORKER = r"""
+import json, sys, time, warnings
+warnings.simplefilter("ignore")  # nombres con paréntesis en str.contains
+import pandas, pydantic  # lo mismo en ambos modos: no cuenta como carga
+
+t0 = time.perf_counter()
+from nutria_core import data_processing as dp
+from nutria_core.especulacion import detector_global
+detector = detector_global()
+carga_ms = (time.perf_counter() - t0) * 1000
+
+from nutria_core.food_tools import get_food_info, get_nutrition_recommendations
+datos = dp.vista()
+for nombre in datos.df["alimento"][::25]:
+    get_food_info(nombre)
+    detector.detectar(f"¿Cuántas calorías tiene {nombre}?")
+for categoria in datos.df["categoria"].unique():
+    get_nutrition_recommendations("mejorar", categoria, "pollo", 10)
+
+print(json.dumps({"carga_ms": carga_ms, "generacion": datos.generacion}), flush=True)
+for linea in sys.stdin:
+    dp.recargar_compartido()
+    print(json.dumps({"generacion": dp.vista().generacion}), flush=True)
+"""
+
+
+def smaps(pid: int) -> dict:
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == "kB":
+                valores[partes[0].rstrip(":")] = int(partes[1]) / 1024
+    return valores
+
+
+def medir(modo: str, n: int, directorio: str, verificar_recarga: bool = False) -> dict:
+    env = dict(os.environ, PYTHONPATH=RAIZ)
+    env.pop("NUTRIA_DATASET_COMPARTIDO", None)
+    if modo == "compartido":
+        env["NUTRIA_DATASET_COMPARTIDO"] = directorio
+
+    procesos = [
+        subprocess.Popen(
+            [sys.executable, "-c", WORKER],
+            cwd=RAIZ, env=env, text=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        for _ in range(n)
+    ]
+    listos = [json.loads(p.stdout.readline()) for p in procesos]
+    memoria = [smaps(p.pid) for p in procesos]
+
+    resultado = {
+        "modo": modo,
+        "workers": n,
+        "generacion": listos[0]["generacion"],
+        "carga_ms_media": round(statistics.mean(r["carga_ms"] for r in listos), 1),
+        "rss_mb_medio": round(statistics.mean(m["Rss"] for m in memoria), 1),
+        "pss_mb_total": round(sum(m["Pss"] for m in memoria), 1),
+        "uss_mb_medio": round(
+            statistics.mean(m["Private_Clean"] + m["Private_Dirty"] for m in memoria), 1
+        ),
+    }
+
+    if verificar_recarga:
+        nueva = publicar_csv(directorio)
+        for p in procesos:
+            p.stdin.write("recargar\n")
+            p.stdin.flush()
+        resultado["recarga"] = {
+            "publicada": nueva,
+            "adoptada": [json.loads(p.stdout.readline())["generacion"] for p in procesos],
+        }
+
+    for p in procesos:
+        p.stdin.close()
+        p.wait()
+    return resultado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del dataset en memoria compartida.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--dir", default=None, help="Directorio de publicación (por defecto, uno temporal).")
+    args = parser.parse_args()
+
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    directorio = args.dir or tempfile.mkdtemp(prefix="nutria-bench-", dir=base)
+    publicar_csv(directorio)
+
+    resultados = []
+    for n in args.workers:
+        resultados.append(medir("csv", n, directorio))
+        resultados.append(medir("compartido", n, directorio, verificar_recarga=n == max(args.workers)))
+    print(json.dumps({"directorio": directorio, "resultados": resultados}, indent=2))
+    if args.dir is None:
+        shutil.rmtree(directorio)
+
+    por_modo = {(r["modo"], r["workers"]): r for r in resultados}
+    for n in args.workers:
+        assert por_modo[("compartido", n)]["uss_mb_medio"] < por_modo[("csv", n)]["uss_mb_medio"]
+    recarga = next(r["recarga"] for r in resultados if "recarga" in r)
+    assert all(g == recarga["publicada"] for g in recarga["adoptada"]), recarga
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Evalúa el enrutador local de intenciones con el conjunto etiquetado de
+benchmarks/datos/intenciones_eval.jsonl.
+
+Para cada variante (solo reglas / reglas + clasificador entrenado con
+benchmarks/datos/intenciones_entrenamiento.jsonl) informa:
+
+- precisión: de lo que se respondió localmente, cuánto tenía la
+  intención y los slots correctos (nutrientes, datos de TMB) y, para
+  nutrientes, si la fila usada y el nombre en la respuesta son los del
+  alimento esperado ("alimento": nombre exacto en el dataset; null si la
+  frase es ambigua y no debe responderse localmente);
+- cobertura: cuántas de las consultas resolubles localmente se resolvieron;
+- latencia del ruteo (p50/p99) y de la respuesta con plantilla.
+
+Después corre el conjunto completo por ChatEngine contra el servidor
+falso, con y sin enrutador, para medir la latencia ahorrada.
+
+Uso:
+    python benchmarks/bench_enrutador.py --latencia-ms 400
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from nutria_core.chat_engine import ChatEngine  # noqa: E402
+from nutria_core.data_processing import vista  # noqa: E402
+from nutria_core.enrutador import (  # noqa: E402
+    EnrutadorIntenciones,
+    entrenar_clasificador,
+    leer_consultas,
+)
+from nutria_core.fake_openai import iniciar_en_hilo  # noqa: E402
+from nutria_core.openai_scheduler import OpenAIScheduler  # noqa: E402
+
+DATOS = os.path.join(RAIZ, "benchmarks", "datos")
+SLOTS_TMB = ("sexo", "edad", "peso_kg", "estatura_cm")
+
+
+def percentil(datos, p):
+    datos = sorted(datos)
+    return datos[min(len(datos) - 1, int(len(datos) * p))]
+
+
+def es_correcta(ejemplo: dict, intencion) -> bool:
+    if intencion.nombre != ejemplo["intencion"]:
+        return False
+    if intencion.nombre == "nutriente":
+        if ejemplo["alimento"] is None:
+            return False  # ambiguo: no debía responderse localmente
+        # La fila con la que se respondió, no solo la frase detectada
+        usada = vista().df["alimento"][intencion.slots["filas"][0]]
+        columnas = [c[0] for c in intencion.slots["nutrientes"]]
+        return (
+            usada == ejemplo["alimento"]
+            and f"**{ejemplo['alimento']}**" in (intencion.respuesta or "")
+            and columnas == ejemplo["nutrientes"]
+        )
+    return all(intencion.slots.get(k) == ejemplo[k] for k in SLOTS_TMB)
+
+
+def evaluar(nombre: str, enrutador: EnrutadorIntenciones, ejemplos) -> dict:
+    ruteo_us, respuesta_us = [], []
+    locales, correctas, errores = 0, 0, []
+    for ej in ejemplos:
+        t0 = time.perf_counter()
+        enrutador.clasificar(ej["texto"])
+        ruteo_us.append((time.perf_counter() - t0) * 1e6)
+
+        t0 = time.perf_counter()
+        intencion = enrutador.enrutar(ej["texto"])
+        respuesta_us.append((time.perf_counter() - t0) * 1e6)
+
+        if intencion.respuesta is None:
+            continue
+        locales += 1
+        if es_correcta(ej, intencion):
+            correctas += 1
+        else:
+            errores.append({"texto": ej["texto"], "esperado": ej["intencion"], "slots": repr(intencion.slots)})
+
+    resolubles = sum(
+        1 for ej in ejemplos if ej["intencion"] != "otro" and ej.get("alimento", "") is not None
+    )
+    return {
+        "variante": nombre,
+        "consultas": len(ejemplos),
+        "respondidas_localmente": locales,
+        "precision": round(correctas / locales, 3) if locales else None,
+        "cobertura": round(correctas / resolubles, 3),
+        "ruteo_us_p50": round(percentil(ruteo_us, 0.50), 1),
+        "ruteo_us_p99": round(percentil(ruteo_us, 0.99), 1),
+        "enrutar_y_responder_us_p99": round(percentil(respuesta_us, 0.99), 1),
+        "errores": errores,
+    }
+
+
+def latencia_ahorrada(enrutador: EnrutadorIntenciones, ejemplos, latencia_ms: float) -> dict:
+    server = iniciar_en_hilo(latencia_ms=latencia_ms)
+
+    def correr(con_enrutador: bool):
+        engine = ChatEngine(
+            api_key="fake",
+            model_llm="gpt-4o-mini",
+            system_message="Eres NutrIA.",
+            base_url=server.base_url,
+            scheduler=OpenAIScheduler(coalescer=False),
+            enrutador=enrutador if con_enrutador else None,
+        )
+        tiempos = []
+        for ej in ejemplos:
+            t0 = time.perf_counter()
+            engine.chat(ej["texto"])
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        return tiempos, engine
+
+    sin, _ = correr(False)
+    con, engine = correr(True)
+    server.shutdown()
+    return {
+        "latencia_llm_ms_por_llamada": latencia_ms,
+        "turno_ms_media_sin_enrutador": round(statistics.mean(sin), 1),
+        "turno_ms_media_con_enrutador": round(statistics.mean(con), 1),
+        "ms_ahorrados_total": round(sum(sin) - sum(con), 1),
+        "enrutador": dict(engine.stats_enrutador),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluación del enrutador de intenciones.")
+    parser.add_argument("--latencia-ms", type=float, default=400.0)
+    parser.add_argument("--umbral", type=float, default=0.5)
+    args = parser.parse_args()
+
+    ejemplos = leer_consultas(os.path.join(DATOS, "intenciones_eval.jsonl"))
+    entrenamiento = leer_consultas(os.path.join(DATOS, "intenciones_entrenamiento.jsonl"))
+
+    reglas = EnrutadorIntenciones()
+    con_modelo = EnrutadorIntenciones(entrenar_clasificador(entrenamiento), umbral=args.umbral)
+    salida = {
+        "evaluacion": [
+            evaluar("reglas", reglas, ejemplos),
+            evaluar("reglas+clasificador", con_modelo, ejemplos),
+        ],
+        "latencia": latencia_ahorrada(reglas, ejemplos, args.latencia_ms),
+    }
+    print(json.dumps(salida, indent=2, ensure_ascii=False))
+
+    for variante in salida["evaluacion"]:
+        assert variante["precision"] == 1.0, variante["errores"]
+        assert variante["ruteo_us_p99"] < 1000, variante
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Mide la detección local de alimentos con prefetch de `get_food_info`.
+
+Corre el mismo guion de preguntas contra el servidor falso con y sin
+`especular` e informa, por modo: llamadas al modelo por turno, latencia
+del turno y, con prefetch, la tasa de acierto y los viajes de ida y
+vuelta ahorrados. También el costo del detector por mensaje.
+
+Uso:
+    python benchmarks/bench_especulacion.py --latencia-ms 150 --repeticiones 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutria_core.chat_engine import ChatEngine  # noqa: E402
+from nutria_core.especulacion import detector_global  # noqa: E402
+from nutria_core.fake_openai import iniciar_en_hilo  # noqa: E402
+from nutria_core.openai_scheduler import OpenAIScheduler  # noqa: E402
+
+# Preguntas típicas de la app: la mayoría sobre un alimento concreto
+GUION = [
+    "¿Cuántas calorías tiene la manzana?",
+    "¿Qué tanta proteína tiene la pechuga de pollo?",
+    "¿El aguacate tiene mucha grasa?",
+    "Dame la información nutricional del atún",
+    "¿Cuánta fibra tiene la avena?",
+    "¿La tortilla de maíz engorda?",
+    "¿Cuánto sodio tiene el queso panela?",
+    "¿Es bueno el plátano para antes de entrenar?",
+    "Recomienda alimentos para subir proteína",
+    "Hazme un plan nutricional",
+    "Hola, ¿qué puedes hacer?",
+    "¿Qué me conviene desayunar?",
+]
+
+
+def stats_fake(server) -> dict:
+    with urllib.request.urlopen(server.base_url.replace("/v1", "/_stats")) as r:
+        return json.loads(r.read())
+
+
+def correr(especular: bool, args) -> dict:
+    server = iniciar_en_hilo(latencia_ms=args.latencia_ms)
+    engine = ChatEngine(
+        api_key="fake",
+        model_llm="gpt-4o-mini",
+        system_message="Eres NutrIA.",
+        base_url=server.base_url,
+        scheduler=OpenAIScheduler(coalescer=False),
+        especular=especular,
+    )
+    latencias = []
+    for _ in range(args.repeticiones):
+        for pregunta in GUION:
+            t0 = time.perf_counter()
+            engine.chat(pregunta)
+            latencias.append((time.perf_counter() - t0) * 1000)
+    llamadas = stats_fake(server)["peticiones"]
+    server.shutdown()
+
+    turnos = len(latencias)
+    salida = {
+        "especular": especular,
+        "turnos": turnos,
+        "llamadas_modelo_por_turno": round(llamadas / turnos, 2),
+        "turno_ms_media": round(statistics.mean(latencias), 1),
+        "turno_ms_p50": round(statistics.median(latencias), 1),
+    }
+    if especular:
+        salida["especulacion"] = engine.metricas_especulacion()
+    return salida
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de prefetch especulativo.")
+    parser.add_argument("--latencia-ms", type=float, default=150.0)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    detector = detector_global()
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        for pregunta in GUION:
+            detector.detectar(pregunta)
+    us_por_mensaje = (time.perf_counter() - t0) * 1e6 / (1000 * len(GUION))
+
+    base = correr(False, args)
+    especulado = correr(True, args)
+    print(
+        json.dumps(
+            {
+                "detector": {
+                    "frases_indexadas": len(detector.indice),
+                    "us_por_mensaje": round(us_por_mensaje, 1),
+                    "detectados": {p: detector.detectar(p) for p in GUION},
+                },
+                "resultados": [base, especulado],
+            },
+            indent=2,
+            ensure_ascii=False,
+        )
+    )
+
+    assert especulado["llamadas_modelo_por_turno"] < base["llamadas_modelo_por_turno"]
+    assert especulado["especulacion"]["tasa_acierto"] == 1.0
+
+
+if __name__ == "__main__":
+    main()
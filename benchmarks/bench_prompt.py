@@ -0,0 +1,152 @@
+"""
+Tokens de prompt por componente, modo completo frente a compacto.
+
+Corre una conversación con historial (preguntas de alimento, recomendaciones
+y un plan) contra el servidor falso con el system_message.txt real y las
+tools reales, una vez con ChatEngine(compacto=False) y otra con
+compacto=True. Informa, por modo, los tokens por turno de cada componente
+(system, tools, historial, usuario, resultados_tools), el total, el ahorro
+que el propio modo compacto calcula y los prompt_tokens que recibió el
+servidor falso (deben coincidir con la cuenta local).
+
+Además manda un mensaje multimodal como los de la ingesta del SMAE (texto
+más una imagen en base64) y verifica que el servidor lo cuenta igual que
+la cuenta local.
+
+Uso:
+    python benchmarks/bench_prompt.py --max-tokens-tool 300
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import sys
+import urllib.request
+
+from openai import OpenAI
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from nutria_core.chat_engine import ChatEngine  # noqa: E402
+from nutria_core.contabilidad_prompt import (  # noqa: E402
+    COMPONENTES,
+    TOKENS_POR_IMAGEN,
+    TOKENS_RESPUESTA,
+    medir_prompt,
+)
+from nutria_core.fake_openai import iniciar_en_hilo  # noqa: E402
+from nutria_core.openai_scheduler import OpenAIScheduler  # noqa: E402
+from nutria_core.smae_ingesta import PROMPT_EXTRACCION  # noqa: E402
+
+GUION = [
+    "¿Cuántas calorías tiene la manzana?",
+    "Recomienda alimentos para subir proteína",
+    "¿Y el aguacate?",
+    "Hazme un plan nutricional",
+    "Recomienda algo para la cena",
+    "¿Qué tal la avena?",
+    "Recomienda snacks con poca azúcar",
+    "¿Cuánto sodio tiene el queso panela?",
+]
+
+
+def stats_fake(server) -> dict:
+    with urllib.request.urlopen(server.base_url.replace("/v1", "/_stats")) as r:
+        return json.loads(r.read())
+
+
+def correr(compacto: bool, system_message: str, args) -> dict:
+    server = iniciar_en_hilo(latencia_ms=args.latencia_ms)
+    engine = ChatEngine(
+        api_key="fake",
+        model_llm="gpt-4o-mini",
+        system_message=system_message,
+        base_url=server.base_url,
+        scheduler=OpenAIScheduler(coalescer=False),
+        compacto=compacto,
+        max_tokens_tool=args.max_tokens_tool,
+    )
+    historial = []
+    for pregunta in GUION:
+        historial.append((pregunta, engine.chat(pregunta, history=historial)))
+    recibidos = stats_fake(server)["prompt_tokens"]
+    server.shutdown()
+
+    st = engine.metricas_prompt()
+    turnos = st["turnos"]
+    return {
+        "modo": st["modo"],
+        "turnos": turnos,
+        "llamadas": st["llamadas"],
+        "tokens_por_turno": {c: round(st[c] / turnos, 1) for c in (*COMPONENTES, "total")},
+        "ahorro_pct_calculado": st["ahorro_pct"],
+        "prompt_tokens_servidor": recibidos,
+        "prompt_tokens_locales": st["total"],
+    }
+
+
+def correr_multimodal(args) -> dict:
+    server = iniciar_en_hilo(latencia_ms=args.latencia_ms)
+    client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+    b64 = base64.b64encode(b"\x89PNG\r\n\x1a\n" + bytes(4096)).decode("utf-8")
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": PROMPT_EXTRACCION},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}},
+            ],
+        }
+    ]
+    client.chat.completions.create(
+        model="gpt-4.1-mini", response_format={"type": "json_object"}, messages=messages
+    )
+    recibidos = stats_fake(server)["prompt_tokens"]
+    server.shutdown()
+    return {
+        "prompt_tokens_servidor": recibidos,
+        "prompt_tokens_locales": sum(medir_prompt(messages).values()) + TOKENS_RESPUESTA,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tokens de prompt: completo vs compacto.")
+    parser.add_argument("--latencia-ms", type=float, default=5.0)
+    parser.add_argument("--max-tokens-tool", type=int, default=600)
+    parser.add_argument("--log", action="store_true", help="Mostrar la línea de log de cada turno.")
+    args = parser.parse_args()
+    if args.log:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with open(os.path.join(RAIZ, "system_message.txt"), "r", encoding="utf-8") as f:
+        system_message = f.read()
+
+    completo = correr(False, system_message, args)
+    compacto = correr(True, system_message, args)
+    reduccion = {
+        c: round(100 * (1 - compacto["tokens_por_turno"][c] / completo["tokens_por_turno"][c]), 1)
+        for c in (*COMPONENTES, "total")
+        if completo["tokens_por_turno"][c]
+    }
+    multimodal = correr_multimodal(args)
+    print(
+        json.dumps(
+            {"resultados": [completo, compacto], "reduccion_pct": reduccion, "multimodal": multimodal},
+            indent=2,
+            ensure_ascii=False,
+        )
+    )
+
+    for r in (completo, compacto):
+        assert r["prompt_tokens_servidor"] == r["prompt_tokens_locales"], r
+    assert compacto["tokens_por_turno"]["total"] < completo["tokens_por_turno"]["total"]
+    assert multimodal["prompt_tokens_servidor"] == multimodal["prompt_tokens_locales"], multimodal
+    assert multimodal["prompt_tokens_locales"] > TOKENS_POR_IMAGEN, multimodal
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Verifica timeouts, reintentos y hedging de ChatEngine contra el servidor
+falso con errores (429/500) y una cola de respuestas lentas inyectados.
+
+Se comparan tres políticas sobre los mismos turnos:
+
+- sin_politica: sin reintentos ni hedging (como antes).
+- reintentos:   timeout por llamada + backoff exponencial con jitter.
+- hedge:        lo anterior + copia de la petición tras el p95.
+
+Para cada una: turnos con error, p50/p95/p99 del turno completo y
+contadores de la política. Al final se comprueba que el presupuesto del
+turno corta a tiempo cuando el proveedor no responde.
+
+Uso:
+    python benchmarks/bench_resiliencia.py --turnos 300 --tasa-error 0.05 --tasa-lenta 0.05
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutria_core.chat_engine import (  # noqa: E402
+    MENSAJE_ERROR_TECNICO,
+    MENSAJE_TIEMPO_AGOTADO,
+    ChatEngine,
+)
+from nutria_core.fake_openai import iniciar_en_hilo  # noqa: E402
+from nutria_core.openai_scheduler import OpenAIScheduler  # noqa: E402
+from nutria_core.resiliencia import PoliticaLlamadas  # noqa: E402
+
+PREGUNTAS = [
+    "¿Cuántas calorías tiene la manzana?",
+    "Recomienda alimentos para subir proteína",
+    "¿Qué proteína tiene el pollo?",
+    "Hazme un plan nutricional",
+]
+
+
+def percentil(datos, p):
+    datos = sorted(datos)
+    return datos[min(len(datos) - 1, int(len(datos) * p))]
+
+
+def correr(nombre: str, politica: PoliticaLlamadas, args, presupuesto_s=None, **fake) -> dict:
+    server = iniciar_en_hilo(latencia_ms=args.latencia_ms, seed=args.seed, **fake)
+    engine = ChatEngine(
+        api_key="fake",
+        model_llm="gpt-4o-mini",
+        system_message="Eres NutrIA.",
+        base_url=server.base_url,
+        scheduler=OpenAIScheduler(limites={"chat": 64}, coalescer=False),
+        politica=politica,
+        presupuesto_turno_s=presupuesto_s or args.presupuesto_s,
+    )
+
+    def turno(i):
+        t0 = time.perf_counter()
+        respuesta = engine.chat(PREGUNTAS[i % len(PREGUNTAS)])
+        return respuesta, (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        resultados = list(pool.map(turno, range(args.turnos)))
+    total_s = time.perf_counter() - t0
+    server.shutdown()
+
+    latencias = [ms for _, ms in resultados]
+    return {
+        "politica": nombre,
+        "turnos": len(resultados),
+        "errores": sum(1 for r, _ in resultados if r == MENSAJE_ERROR_TECNICO),
+        "tiempo_agotado": sum(1 for r, _ in resultados if r == MENSAJE_TIEMPO_AGOTADO),
+        "turno_ms_p50": round(percentil(latencias, 0.50), 1),
+        "turno_ms_p95": round(percentil(latencias, 0.95), 1),
+        "turno_ms_p99": round(percentil(latencias, 0.99), 1),
+        "turno_ms_max": round(max(latencias), 1),
+        "llamadas": dict(politica.stats),
+        "duracion_s": round(total_s, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de timeouts, reintentos y hedging.")
+    parser.add_argument("--turnos", type=int, default=300)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--latencia-ms", type=float, default=50.0)
+    parser.add_argument("--tasa-error", type=float, default=0.05)
+    parser.add_argument("--tasa-lenta", type=float, default=0.05)
+    parser.add_argument("--latencia-lenta-ms", type=float, default=3000.0)
+    parser.add_argument("--timeout-s", type=float, default=1.0)
+    parser.add_argument("--presupuesto-s", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fake = dict(
+        tasa_error=args.tasa_error,
+        tasa_lenta=args.tasa_lenta,
+        latencia_lenta_ms=args.latencia_lenta_ms,
+    )
+    salida = [
+        correr("sin_politica", PoliticaLlamadas(timeout_s=60.0, reintentos=0), args, **fake),
+        correr("reintentos", PoliticaLlamadas(timeout_s=args.timeout_s, backoff_s=0.05), args, **fake),
+        correr(
+            "hedge",
+            PoliticaLlamadas(
+                timeout_s=args.timeout_s, backoff_s=0.05, hedge=True, hedge_delay_s=0.2
+            ),
+            args,
+            **fake,
+        ),
+    ]
+
+    # Proveedor que nunca contesta a tiempo: el turno debe cortarse en su presupuesto
+    args.turnos = 8
+    corte = correr(
+        "presupuesto",
+        PoliticaLlamadas(timeout_s=60.0),
+        args,
+        presupuesto_s=0.5,
+        tasa_lenta=1.0,
+        latencia_lenta_ms=5000.0,
+    )
+    salida.append(corte)
+    print(json.dumps(salida, indent=2, ensure_ascii=False))
+
+    sin, reint, hedge = salida[:3]
+    assert reint["errores"] < sin["errores"], (sin, reint)
+    assert hedge["turno_ms_p99"] < reint["turno_ms_p99"], (reint, hedge)
+    assert corte["tiempo_agotado"] == corte["turnos"] and corte["turno_ms_max"] < 1000, corte
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Verifica el OpenAIScheduler contra el servidor falso con rate limit.
+
+Escenario "taller": muchas sesiones preguntan a la vez (varias con la misma
+pregunta) y una sesión ruidosa dispara muchas peticiones seguidas. El
+proveedor simulado solo acepta `--limite-proveedor` peticiones simultáneas
+y responde 429 al resto.
+
+Se compara el cliente directo contra el cliente envuelto por el scheduler:
+429 recibidos, peticiones que llegan al proveedor, coalescidas, espera en
+cola y latencia de las sesiones normales frente a la ruidosa.
+
+Uso:
+    python benchmarks/bench_scheduler.py --sesiones 60 --latencia-ms 100
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI, RateLimitError  # noqa: E402
+
+from nutria_core.fake_openai import iniciar_en_hilo  # noqa: E402
+from nutria_core.openai_scheduler import (  # noqa: E402
+    ClienteProgramado,
+    OpenAIScheduler,
+    en_sesion,
+)
+
+
+def stats_fake(server) -> dict:
+    url = server.base_url.replace("/v1", "/_stats")
+    with urllib.request.urlopen(url) as r:
+        return json.loads(r.read())
+
+
+def correr(modo: str, args) -> dict:
+    server = iniciar_en_hilo(
+        latencia_ms=args.latencia_ms, max_concurrencia=args.limite_proveedor
+    )
+    raw = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+    scheduler = None
+    client = raw
+    if modo == "scheduler":
+        scheduler = OpenAIScheduler(limites={"chat": args.limite_proveedor})
+        client = ClienteProgramado(raw, scheduler)
+
+    # (sesion, pregunta): la mitad repite la misma pregunta
+    trabajos = []
+    for s in range(args.sesiones):
+        pregunta = "¿Cuántas calorías tiene la manzana?" if s % 2 == 0 else f"Pregunta {s}"
+        trabajos.append((f"s{s}", pregunta))
+    trabajos += [("ruidosa", f"Spam {i}") for i in range(args.ruidosa)]
+    # La sesión ruidosa llega primero, como el peor caso para la equidad
+    trabajos = trabajos[args.sesiones:] + trabajos[:args.sesiones]
+
+    def llamar(trabajo):
+        sesion, pregunta = trabajo
+        t0 = time.perf_counter()
+        try:
+            with en_sesion(sesion):
+                client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": pregunta}],
+                )
+            ok = True
+        except RateLimitError:
+            ok = False
+        return sesion, ok, (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(trabajos)) as pool:
+        resultados = list(pool.map(llamar, trabajos))
+    total_s = time.perf_counter() - t0
+
+    normales = [ms for s, ok, ms in resultados if ok and s != "ruidosa"]
+    ruidosa = [ms for s, ok, ms in resultados if ok and s == "ruidosa"]
+    fake = stats_fake(server)
+    server.shutdown()
+
+    salida = {
+        "modo": modo,
+        "llamadas": len(trabajos),
+        "exitosas": sum(1 for _, ok, _ in resultados if ok),
+        "errores_429": sum(1 for _, ok, _ in resultados if not ok),
+        "peticiones_al_proveedor": fake["peticiones"],
+        "pico_concurrencia_proveedor": fake["pico_concurrencia"],
+        "latencia_ms_normales_media": round(statistics.mean(normales), 1) if normales else None,
+        "latencia_ms_ruidosa_media": round(statistics.mean(ruidosa), 1) if ruidosa else None,
+        "duracion_s": round(total_s, 2),
+    }
+    if scheduler is not None:
+        salida["scheduler"] = scheduler.metricas()["chat"]
+    return salida
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del scheduler de OpenAI.")
+    parser.add_argument("--sesiones", type=int, default=60)
+    parser.add_argument("--ruidosa", type=int, default=30, help="Peticiones de la sesión ruidosa.")
+    parser.add_argument("--limite-proveedor", type=int, default=8)
+    parser.add_argument("--latencia-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    directo = correr("directo", args)
+    programado = correr("scheduler", args)
+    print(json.dumps([directo, programado], indent=2, ensure_ascii=False))
+
+    assert programado["errores_429"] == 0, programado
+    assert programado["pico_concurrencia_proveedor"] <= args.limite_proveedor
+    assert programado["peticiones_al_proveedor"] < programado["llamadas"]  # coalescencia
+
+
+if __name__ == "__main__":
+    main()
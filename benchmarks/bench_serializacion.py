@@ -0,0 +1,124 @@
+"""
+Costo de serialización por respuesta de las tools, antes y después de
+precomputar los fragmentos JSON de cada FoodInfoScore.
+
+"antes" reproduce el camino original: construir FoodInfoScore por fila
+(iterrows), model_dump y json.dumps. "después" usa las tools actuales.
+
+Uso:
+    python benchmarks/bench_serializacion.py --repeticiones 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutria_core.data_processing import (  # noqa: E402
+    buscar_alimento_por_nombre,
+    calcular_nutria_score,
+    construir_foodinfo_score,
+    df,
+    foodinfo_score_json,
+)
+from nutria_core.food_tools import get_food_info, get_nutrition_recommendations  # noqa: E402
+
+
+# =========================================================
+# Camino original
+# =========================================================
+
+def get_food_info_antes(nombre_alimento: str) -> str:
+    fila = buscar_alimento_por_nombre(nombre_alimento)
+    return construir_foodinfo_score(fila).model_dump_json(ensure_ascii=False)
+
+
+def recomendaciones_antes(objetivo: str, categoria: str = "", top_k: int = 5) -> str:
+    data = df.copy()
+    if categoria:
+        data = data[data["categoria"].str.lower() == categoria]
+    data["nutria_score"] = data.apply(lambda fila: calcular_nutria_score(fila), axis=1)
+    top = data.sort_values("nutria_score", ascending=False).head(top_k)
+    recomendaciones = []
+    for _, row in top.iterrows():
+        try:
+            recomendaciones.append(construir_foodinfo_score(row).model_dump())
+        except Exception:
+            continue
+    return json.dumps(
+        {"objetivo": objetivo, "alimento_base": "", "recomendaciones": recomendaciones},
+        ensure_ascii=False,
+    )
+
+
+def serializar_antes(indices) -> str:
+    filas = [construir_foodinfo_score(df.loc[i]).model_dump() for i in indices]
+    return json.dumps({"recomendaciones": filas}, ensure_ascii=False)
+
+
+def serializar_despues(indices) -> str:
+    return '{"recomendaciones": [' + ", ".join(foodinfo_score_json(i) for i in indices) + "]}"
+
+
+def medir(fn, repeticiones: int, *args, **kwargs) -> float:
+    fn(*args, **kwargs)  # calentamiento
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        fn(*args, **kwargs)
+    return (time.perf_counter() - t0) / repeticiones * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de tools.")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+    n = args.repeticiones
+
+    # Las respuestas deben ser equivalentes (get_food_info agrega además la
+    # comparativa por categoría, que el camino original no tenía)
+    info = json.loads(get_food_info("acelga"))
+    assert "rank_categoria" in info.pop("comparativa")
+    assert info == json.loads(get_food_info_antes("acelga"))
+    nuevo = json.loads(get_nutrition_recommendations("proteína", categoria="frutas", top_k=10))
+    viejo = json.loads(recomendaciones_antes("proteína", categoria="frutas", top_k=10))
+    assert [r["nutria_score"] for r in nuevo["recomendaciones"]] == [
+        r["nutria_score"] for r in viejo["recomendaciones"]
+    ]
+
+    top20 = list(df["nutria_score"].nlargest(20).index)
+    casos = [
+        ("solo serialización (20 alimentos)", serializar_antes, serializar_despues, (top20,), {}),
+        ("get_food_info", get_food_info_antes, get_food_info, ("acelga",), {}),
+        (
+            "recomendaciones top 5 (todas)",
+            recomendaciones_antes, get_nutrition_recommendations,
+            ("proteína",), {"top_k": 5},
+        ),
+        (
+            "recomendaciones top 20 (frutas)",
+            recomendaciones_antes, get_nutrition_recommendations,
+            ("proteína",), {"categoria": "frutas", "top_k": 20},
+        ),
+    ]
+
+    resultados = []
+    for nombre, antes, despues, a, kw in casos:
+        ms_antes = medir(antes, n, *a, **kw)
+        ms_despues = medir(despues, n, *a, **kw)
+        resultados.append(
+            {
+                "caso": nombre,
+                "antes_ms": round(ms_antes, 3),
+                "despues_ms": round(ms_despues, 3),
+                "aceleracion": round(ms_antes / ms_despues, 1),
+            }
+        )
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Prueba de carga de punta a punta de un worker de NutrIA.
+
+Levanta el servidor falso de OpenAI en un proceso aparte (chat con tools
+y streaming, transcripción y TTS, con distribuciones de latencia
+configurables) y lanza --procesos workers; cada uno con su ChatEngine,
+su ConversationStore y su parte de las --sesiones concurrentes. Cada
+sesión reproduce un guion de varios turnos que dispara las tres tools y
+mezcla turnos de texto, de texto en streaming y de voz (voice_utils:
+transcripción → chat → TTS).
+
+Informa throughput, latencia del turno p50/p95/p99 (global y por tipo),
+CPU y RSS por worker y contadores del servidor falso, y escribe todo en
+JSON para comparar corridas.
+
+Uso:
+    python benchmarks/carga.py --sesiones 50 --rondas 2 \
+        --latencia-chat lognormal:400:0.4 --salida carga.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# (tipo, plantilla). El servidor falso elige la tool por el texto:
+# "plan" → generar_plan_nutricional, "recomienda" → recomendaciones,
+# cualquier otra cosa → get_food_info con la última palabra.
+# Cada sesión rellena las plantillas con sus propios alimentos y datos,
+# así las peticiones de sesiones distintas no son idénticas.
+GUIONES = [
+    [
+        ("texto", "Hola, ¿cuántas calorías tiene {a1}?"),
+        ("texto", "Recomienda alimentos para subir proteína sin {a2}"),
+        ("stream", "¿Y cuánta proteína tiene {a2}?"),
+        ("texto", "Hazme un plan: hombre, {edad} años, {peso} kg, 175 cm, actividad moderada"),
+    ],
+    [
+        ("voz", "¿Cuánta fibra tiene {a1}?"),
+        ("voz", "Recomienda algo ligero para cenar con {a2}"),
+        ("texto", "Quiero un plan para perder grasa, tengo {edad} años"),
+    ],
+    [
+        ("stream", "¿Tiene mucha grasa {a1}?"),
+        ("stream", "Recomienda sustitutos de {a2}"),
+        ("voz", "Arma mi plan nutricional, mujer de {edad} años y {peso} kg"),
+        ("texto", "¿Cuánto sodio tiene {a3}?"),
+    ],
+]
+
+ALIMENTOS = [
+    "manzana", "pollo", "avena", "aguacate", "queso", "atún", "huevo", "arroz",
+    "frijol", "plátano", "salmón", "tortilla", "yoghurt", "nuez", "papaya",
+    "lenteja", "jamón", "pera", "mango", "tofu", "brócoli", "leche", "pan", "sandía",
+]
+
+
+def guion_de_sesion(numero: int, rng: random.Random) -> list:
+    a1, a2, a3 = rng.sample(ALIMENTOS, 3)
+    datos = {"a1": a1, "a2": a2, "a3": a3, "edad": rng.randint(18, 70), "peso": rng.randint(50, 110)}
+    return [(tipo, plantilla.format(**datos)) for tipo, plantilla in GUIONES[numero % len(GUIONES)]]
+
+
+def percentil(datos, p):
+    if not datos:
+        return None
+    datos = sorted(datos)
+    return round(datos[min(len(datos) - 1, int(len(datos) * p))], 1)
+
+
+def resumen(latencias):
+    return {
+        "n": len(latencias),
+        "p50_ms": percentil(latencias, 0.50),
+        "p95_ms": percentil(latencias, 0.95),
+        "p99_ms": percentil(latencias, 0.99),
+    }
+
+
+# =========================================================
+# Worker
+# =========================================================
+
+def worker(indice: int, sesiones: list, opciones: dict, base_url: str, cola) -> None:
+    """
+    Un proceso = un worker de NutrIA. Las sesiones corren en hilos, como
+    en el servidor HTTP.
+    """
+    os.chdir(RAIZ)  # data_processing lee dataset_limpio.csv relativo al cwd
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["NUTRIA_MAX_CHAT"] = str(opciones["max_chat"])
+    os.environ["NUTRIA_MAX_AUDIO"] = str(opciones["max_audio"])
+
+    import io
+
+    from nutria_core.chat_engine import (
+        MENSAJE_ERROR_TECNICO,
+        MENSAJE_TIEMPO_AGOTADO,
+        ChatEngine,
+        FalloStream,
+    )
+    from nutria_core.conversation_store import ConversationStore, rss_proceso_bytes
+    from nutria_core.enrutador import EnrutadorIntenciones
+    from nutria_core.fake_openai import audio_de_prueba
+    from nutria_core.voice_utils import text_to_speech, whisper_to_text
+
+    errores_texto = {MENSAJE_ERROR_TECNICO, MENSAJE_TIEMPO_AGOTADO}
+    with open("system_message.txt", "r", encoding="utf-8") as f:
+        system_message = f.read()
+
+    tmp = tempfile.mkdtemp(prefix="nutria-carga-")
+    store = ConversationStore(ruta_db=os.path.join(tmp, "conversaciones.sqlite"))
+    engine = ChatEngine(
+        api_key="fake",
+        model_llm="gpt-4o-mini",
+        system_message=system_message,
+        base_url=base_url,
+        store=store,
+        especular=opciones["especular"],
+        enrutador=EnrutadorIntenciones() if opciones["enrutar"] else None,
+    )
+
+    lock = threading.Lock()
+    latencias = {"texto": [], "stream": [], "voz": []}
+    primer_fragmento = []
+    errores = {"texto": 0, "stream": 0, "voz": 0}
+    barrera = threading.Barrier(len(sesiones) + 1)
+
+    def turno(sesion: str, tipo: str, texto: str) -> None:
+        t0 = time.perf_counter()
+        error = False
+        if tipo == "texto":
+            error = engine.chat(texto, session_id=sesion) in errores_texto
+        elif tipo == "stream":
+            partes = []
+            for delta in engine.chat_stream(texto, session_id=sesion):
+                if isinstance(delta, FalloStream):
+                    error = True
+                    continue
+                if not partes:
+                    with lock:
+                        primer_fragmento.append((time.perf_counter() - t0) * 1000)
+                partes.append(delta)
+        else:
+            transcrito = whisper_to_text(io.BytesIO(audio_de_prueba(texto)))
+            respuesta = engine.chat(transcrito, session_id=sesion)
+            ruta_mp3 = text_to_speech(respuesta)
+            error = ruta_mp3 is None or respuesta in errores_texto or transcrito != texto
+            if ruta_mp3:
+                os.remove(ruta_mp3)
+        ms = (time.perf_counter() - t0) * 1000
+        with lock:
+            latencias[tipo].append(ms)
+            errores[tipo] += error
+
+    def sesion(numero: int) -> None:
+        rng = random.Random(numero)
+        guion = guion_de_sesion(numero, rng)
+        barrera.wait()
+        for _ in range(opciones["rondas"]):
+            for tipo, texto in guion:
+                time.sleep(rng.uniform(0, opciones["pausa_ms"]) / 1000.0)
+                turno(f"w{indice}-s{numero}", tipo, texto)
+
+    hilos = [threading.Thread(target=sesion, args=(n,)) for n in sesiones]
+    for h in hilos:
+        h.start()
+    barrera.wait()
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    for h in hilos:
+        h.join()
+    duracion = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    cola.put(
+        {
+            "worker": indice,
+            "pid": os.getpid(),
+            "sesiones": len(sesiones),
+            "duracion_s": duracion,
+            "cpu_s": cpu,
+            "rss_mb": round(rss_proceso_bytes() / 2**20, 1),
+            "rss_pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "latencias": latencias,
+            "primer_fragmento": primer_fragmento,
+            "errores": errores,
+            "scheduler": engine.client.scheduler.metricas(),
+        }
+    )
+    store.cerrar()
+
+
+# =========================================================
+# Orquestación
+# =========================================================
+
+def iniciar_fake(args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "nutria_core.fake_openai", "--port", "0",
+        "--latencia-chat", args.latencia_chat,
+        "--latencia-transcripcion", args.latencia_transcripcion,
+        "--latencia-tts", args.latencia_tts,
+        "--tasa-error", str(args.tasa_error),
+        "--seed", str(args.seed),
+    ]
+    proc = subprocess.Popen(cmd, cwd=RAIZ, stdout=subprocess.PIPE, text=True)
+    linea = proc.stdout.readline()  # "Fake OpenAI escuchando en http://..."
+    proc.base_url = linea.strip().rsplit(" ", 1)[-1]
+    return proc
+
+
+def stats_fake(base_url: str) -> dict:
+    with urllib.request.urlopen(base_url.replace("/v1", "/_stats")) as r:
+        return json.loads(r.read())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prueba de carga de punta a punta de NutrIA.")
+    parser.add_argument("--sesiones", type=int, default=30, help="Sesiones concurrentes en total.")
+    parser.add_argument("--procesos", type=int, default=1, help="Workers (procesos).")
+    parser.add_argument("--rondas", type=int, default=2, help="Veces que cada sesión repite su guion.")
+    parser.add_argument("--pausa-ms", type=float, default=200.0, help="Pausa máxima entre turnos.")
+    parser.add_argument("--latencia-chat", default="lognormal:300:0.4")
+    parser.add_argument("--latencia-transcripcion", default="lognormal:200:0.3")
+    parser.add_argument("--latencia-tts", default="lognormal:250:0.3")
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--max-chat", type=int, default=16, help="Cupo de chat del scheduler por worker.")
+    parser.add_argument("--max-audio", type=int, default=4)
+    parser.add_argument("--especular", action="store_true")
+    parser.add_argument("--enrutar", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--salida", default="carga_resultados.json")
+    args = parser.parse_args()
+
+    fake = iniciar_fake(args)
+    try:
+        opciones = {
+            "rondas": args.rondas,
+            "pausa_ms": args.pausa_ms,
+            "max_chat": args.max_chat,
+            "max_audio": args.max_audio,
+            "especular": args.especular,
+            "enrutar": args.enrutar,
+        }
+        ctx = multiprocessing.get_context("spawn")
+        cola = ctx.Queue()
+        procesos = [
+            ctx.Process(
+                target=worker,
+                args=(i, list(range(i, args.sesiones, args.procesos)), opciones, fake.base_url, cola),
+            )
+            for i in range(args.procesos)
+        ]
+        for p in procesos:
+            p.start()
+        workers = [cola.get() for _ in procesos]
+        for p in procesos:
+            p.join()
+        servidor = stats_fake(fake.base_url)
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    workers.sort(key=lambda w: w["worker"])
+    todas = [ms for w in workers for lista in w["latencias"].values() for ms in lista]
+    duracion = max(w["duracion_s"] for w in workers)
+    por_tipo = {
+        tipo: resumen([ms for w in workers for ms in w["latencias"][tipo]])
+        for tipo in ("texto", "stream", "voz")
+    }
+    por_tipo["stream"]["primer_fragmento_p50_ms"] = percentil(
+        [ms for w in workers for ms in w["primer_fragmento"]], 0.50
+    )
+
+    resultado = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "turnos": len(todas),
+        "duracion_s": round(duracion, 2),
+        "throughput_turnos_s": round(len(todas) / duracion, 2),
+        "latencia_turno": resumen(todas),
+        "por_tipo": por_tipo,
+        "errores": {
+            tipo: sum(w["errores"][tipo] for w in workers) for tipo in ("texto", "stream", "voz")
+        },
+        "workers": [
+            {
+                "worker": w["worker"],
+                "pid": w["pid"],
+                "sesiones": w["sesiones"],
+                "turnos": sum(len(v) for v in w["latencias"].values()),
+                "cpu_pct": round(100 * w["cpu_s"] / w["duracion_s"], 1),
+                "rss_mb": w["rss_mb"],
+                "rss_pico_mb": w["rss_pico_mb"],
+                "scheduler_chat": w["scheduler"]["chat"],
+            }
+            for w in workers
+        ],
+        "servidor_falso": servidor,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(json.dumps({k: v for k, v in resultado.items() if k != "config"}, indent=2, ensure_ascii=False))
+    print(f"Resultados en {args.salida}")
+
+    tools = servidor["tools"]
+    assert {"get_food_info", "get_nutrition_recommendations", "generar_plan_nutricional"} <= set(tools), tools
+    assert servidor["por_endpoint"]["transcripcion"] and servidor["por_endpoint"]["tts"]
+
+
+if __name__ == "__main__":
+    main()
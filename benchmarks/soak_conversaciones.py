@@ -0,0 +1,122 @@
+"""
+Prueba de resistencia ("soak") del ConversationStore.
+
+Simula miles de sesiones concurrentes con conversaciones largas y verifica:
+
+- que la RAM del store queda acotada por `ventana` × sesiones activas,
+- que el desalojo por inactividad libera sesiones y las rehidrata bien,
+- que los pares de historial que recibe ChatEngine coinciden con la
+  conversación completa (venga de RAM o de disco).
+
+Uso:
+    python benchmarks/soak_conversaciones.py --sesiones 5000 --turnos 60
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutria_core.conversation_store import ConversationStore, rss_proceso_bytes  # noqa: E402
+
+
+def texto(sesion: int, turno: int, role: str, largo: int) -> str:
+    base = f"[{sesion}:{turno}:{role}] "
+    return base + "x" * max(0, largo - len(base))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sesiones", type=int, default=5000)
+    parser.add_argument("--turnos", type=int, default=60)
+    parser.add_argument("--ventana", type=int, default=40)
+    parser.add_argument("--max-history", type=int, default=6)
+    parser.add_argument("--largo", type=int, default=400, help="Caracteres por mensaje.")
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    tmp = tempfile.mkdtemp(prefix="nutria_soak_")
+    store = ConversationStore(
+        ruta_db=os.path.join(tmp, "soak.sqlite"),
+        ventana=args.ventana,
+        inactividad_s=0.5,
+        max_sesiones=args.sesiones,
+    )
+
+    rss_inicio = rss_proceso_bytes()
+    t0 = time.perf_counter()
+
+    # Los turnos se intercalan entre sesiones, como en tráfico real; cada
+    # sesión avanza un turno por ronda (una sesión no manda dos a la vez).
+    rondas = [[(s, t) for s in range(args.sesiones)] for t in range(args.turnos)]
+
+    def turno(par):
+        s, t = par
+        sid = f"s{s}"
+        pares = store.pares_recientes(sid, args.max_history)  # lo que leería ChatEngine
+        esperado = max(0, min(args.max_history, t))
+        assert len(pares) == esperado, (sid, t, len(pares))
+        if pares:
+            assert pares[-1][0] == texto(s, t - 1, "user", args.largo)
+        store.registrar_turno(
+            sid,
+            texto(s, t, "user", args.largo),
+            texto(s, t, "assistant", args.largo),
+        )
+
+    with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+        for ronda in rondas:
+            list(pool.map(turno, ronda))
+
+    t_escritura = time.perf_counter() - t0
+    m_lleno = store.metricas()
+
+    # Muestreo de sesiones: por RAM debe haber como máximo `ventana` mensajes
+    for sid in random.sample(range(args.sesiones), k=min(50, args.sesiones)):
+        m = store.metricas_sesion(f"s{sid}")
+        assert m["mensajes_ram"] <= args.ventana, m
+
+    # Desalojo por inactividad: todas vuelven a disco
+    time.sleep(0.6)
+    desalojadas = store.desalojar_inactivas()
+    m_vacio = store.metricas()
+    assert m_vacio["sesiones_en_memoria"] == 0, m_vacio
+
+    # Rehidratación: el historial completo sigue disponible desde disco
+    for s in random.sample(range(args.sesiones), k=min(50, args.sesiones)):
+        sid = f"s{s}"
+        assert store.total(sid) == 2 * args.turnos
+        primeros = store.rango(sid, 0, 2)
+        assert primeros[0]["content"] == texto(s, 0, "user", args.largo)
+        pares = store.pares_recientes(sid, args.max_history)
+        assert pares[-1][1] == texto(s, args.turnos - 1, "assistant", args.largo)
+
+    store.cerrar()
+
+    resultado = {
+        "sesiones": args.sesiones,
+        "turnos_por_sesion": args.turnos,
+        "ventana": args.ventana,
+        "turnos_por_segundo": round(args.sesiones * args.turnos / t_escritura, 1),
+        "bytes_ram_store_lleno": m_lleno["bytes_ram"],
+        "max_bytes_sesion": m_lleno["max_bytes_sesion"],
+        "cota_bytes_sesion": args.ventana * (args.largo + 100),
+        "sesiones_desalojadas": desalojadas,
+        "rss_inicio_mb": round(rss_inicio / 2**20, 1),
+        "rss_lleno_mb": round(m_lleno["rss_bytes"] / 2**20, 1),
+        "rss_final_mb": round(m_vacio["rss_bytes"] / 2**20, 1),
+    }
+    assert resultado["max_bytes_sesion"] <= resultado["cota_bytes_sesion"], resultado
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
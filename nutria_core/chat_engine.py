@@ -1,10 +1,47 @@
 import json
-from typing import List, Tuple
+import logging
+import threading
+from typing import Iterator, List, Optional, Tuple
 
-from openai import OpenAI
+from .contabilidad_prompt import (
+    COMPONENTES,
+    CuentaPrompt,
+    compactar_tools,
+    contar_tokens,
+    minificar_prompt,
+    recortar_resultado,
+    tokens_tools,
+)
+from .conversation_store import ConversationStore
+from .enrutador import EnrutadorIntenciones
+from .especulacion import detector_global, prefetch_mensajes
+from .openai_scheduler import ClienteProgramado, OpenAIScheduler, en_sesion, scheduler_global
+from .resiliencia import Plazo, PoliticaLlamadas, PresupuestoAgotado, con_plazo
 from .tools_handler import handle_tool_calls
 from .food_tools import tools
 
+logger = logging.getLogger(__name__)
+
+# Mensaje genérico cuando algo falla: en producción no mostramos detalles
+MENSAJE_ERROR_TECNICO = (
+    "😔 Ocurrió un problema técnico al procesar tu solicitud. "
+    "Intenta de nuevo en unos momentos o reformula tu mensaje."
+)
+
+# Cuando el turno se pasa de su presupuesto de tiempo
+MENSAJE_TIEMPO_AGOTADO = (
+    "⏳ La respuesta está tardando más de lo normal. "
+    "Intenta de nuevo en unos momentos."
+)
+
+
+class FalloStream(str):
+    """
+    Último elemento de `chat_stream` cuando el turno falla: el texto es el
+    mensaje de error, separado de los fragmentos de la respuesta para que
+    el cliente no lo muestre como continuación de una respuesta parcial.
+    """
+
 
 class ChatEngine:
     """
@@ -14,6 +51,26 @@ class ChatEngine:
     - Llama al modelo de OpenAI con las tools (function calling).
     - Si el modelo dispara tools, las ejecuta y hace una segunda llamada.
     - Devuelve una respuesta de texto lista para mostrar en la UI.
+
+    Si se pasa un `store` y un `session_id`, el historial se lee del
+    ConversationStore (RAM acotada + disco) y el turno se registra ahí.
+
+    Cada llamada al modelo pasa por una `PoliticaLlamadas` (timeout,
+    reintentos con backoff y hedging opcional) y todo el turno, tools
+    incluidas, respeta `presupuesto_turno_s`.
+
+    Con `especular=True` se detectan localmente los alimentos del mensaje
+    y su `get_food_info` se adjunta a la primera llamada, para ahorrar el
+    viaje de ida y vuelta de la tool cuando el modelo solo la iba a pedir.
+
+    Con un `enrutador`, las consultas simples (nutriente de un alimento,
+    TMB) se responden localmente con plantilla y no llegan al modelo.
+
+    Los tokens de cada componente del prompt (system, tools, historial,
+    usuario, resultados de tools) se cuentan localmente y se registran por
+    turno. Con `compacto=True` se envían el system message minificado,
+    esquemas de tools mínimos y resultados de tools recortados a
+    `max_tokens_tool` (ver contabilidad_prompt.py).
     """
 
     def __init__(
@@ -22,11 +79,52 @@ class ChatEngine:
         model_llm: str,
         system_message: str,
         max_history: int = 6,
+        base_url: Optional[str] = None,
+        store: Optional[ConversationStore] = None,
+        scheduler: Optional[OpenAIScheduler] = None,
+        politica: Optional[PoliticaLlamadas] = None,
+        presupuesto_turno_s: Optional[float] = 45.0,
+        especular: bool = False,
+        enrutador: Optional[EnrutadorIntenciones] = None,
+        compacto: bool = False,
+        max_tokens_tool: int = 600,
     ) -> None:
-        self.client = OpenAI(api_key=api_key)
+        # base_url permite apuntar a un servidor compatible (p. ej. el fake local).
+        # Todas las llamadas pasan por el scheduler compartido del proceso
+        # (cola justa, cupos y coalescencia de peticiones idénticas).
+        # Los reintentos los hace la política, no el SDK (max_retries=0).
+        # El SDK se importa aquí: importar chat_engine no lo carga.
+        from openai import OpenAI
+
+        self.client = ClienteProgramado(
+            OpenAI(api_key=api_key, base_url=base_url, max_retries=0),
+            scheduler or scheduler_global(),
+        )
+        self.politica = politica or PoliticaLlamadas()
+        self.presupuesto_turno_s = presupuesto_turno_s
+        self.especular = especular
+        self._lock = threading.Lock()
+        self.stats_especulacion = {
+            "turnos": 0,
+            "con_prefetch": 0,
+            "aciertos": 0,
+            "round_trips_ahorrados": 0,
+            "alimentos_prefetch": 0,
+        }
+        self.enrutador = enrutador
+        self.stats_enrutador = {"nutriente": 0, "tmb": 0, "al_llm": 0}
         self.model_llm = model_llm
-        self.system_message = system_message
+        self.compacto = compacto
+        self.max_tokens_tool = max_tokens_tool
+        self.system_message = minificar_prompt(system_message) if compacto else system_message
+        self.tools = compactar_tools(tools) if compacto else tools
+        # Tokens de las versiones completas, para informar el ahorro por turno
+        self._ref_prompt = (contar_tokens(system_message), tokens_tools(tools)) if compacto else (None, None)
+        self.stats_prompt = {
+            "turnos": 0, "llamadas": 0, **dict.fromkeys(COMPONENTES, 0), "total": 0, "ahorrados": 0,
+        }
         self.max_history = max_history  # limitar historial para rendimiento
+        self.store = store
 
     def _prepare_history(self, history: List[Tuple[str, str]]) -> List[dict]:
         """
@@ -39,7 +137,166 @@ class ChatEngine:
             compressed.append({"role": "assistant", "content": a})
         return compressed
 
-    def chat(self, user_message: str, history: List[Tuple[str, str]]) -> str:
+    def _resolve_history(
+        self,
+        history: Optional[List[Tuple[str, str]]],
+        session_id: Optional[str],
+    ) -> List[Tuple[str, str]]:
+        """
+        Historial explícito o, si hay sesión, los últimos pares del store.
+        """
+        if session_id is not None and self.store is not None:
+            return self.store.pares_recientes(session_id, self.max_history)
+        return history or []
+
+    def _record_turn(
+        self, session_id: Optional[str], user_message: str, answer: str
+    ) -> None:
+        if session_id is not None and self.store is not None:
+            self.store.registrar_turno(session_id, user_message, answer)
+
+    def _build_messages(
+        self, user_message: str, history: List[Tuple[str, str]]
+    ) -> List[dict]:
+        """
+        Arma la lista de mensajes: system + historial compacto + usuario.
+        """
+        messages: List[dict] = [
+            {"role": "system", "content": self.system_message}
+        ]
+        messages.extend(self._prepare_history(history))
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def _enrutar(self, user_message: str) -> Optional[str]:
+        """
+        Respuesta local si el enrutador reconoce una consulta simple;
+        None para seguir con el modelo.
+        """
+        if self.enrutador is None:
+            return None
+        intencion = self.enrutador.enrutar(user_message)
+        clave = intencion.nombre if intencion.respuesta is not None else "al_llm"
+        with self._lock:
+            self.stats_enrutador[clave] += 1
+        return intencion.respuesta
+
+    def _especular(self, messages: List[dict], user_message: str, cuenta: CuentaPrompt) -> List[str]:
+        """
+        Pre-paso local: detecta alimentos del dataset en el mensaje y añade
+        sus `get_food_info` a `messages`. Devuelve los nombres adjuntados.
+        """
+        if not self.especular:
+            return []
+        extra, adjuntados = prefetch_mensajes(detector_global().detectar(user_message))
+        self._compactar_resultados(extra, cuenta)
+        messages.extend(extra)
+        return adjuntados
+
+    def _compactar_resultados(self, tool_msgs: List[dict], cuenta: CuentaPrompt) -> None:
+        """
+        En modo compacto, recorta en su lugar el contenido de los mensajes
+        "tool" que pasen de `max_tokens_tool` (o que admitan JSON más corto).
+        """
+        if not self.compacto:
+            return
+        for m in tool_msgs:
+            if m.get("role") != "tool":
+                continue
+            original = m["content"]
+            m["content"] = recortar_resultado(original, self.max_tokens_tool)
+            if m["content"] != original:
+                cuenta.registrar_recorte(m["tool_call_id"], original)
+
+    def _registrar_prompt(self, cuenta: CuentaPrompt) -> None:
+        if not cuenta.llamadas:
+            return
+        resumen = cuenta.resumen()
+        with self._lock:
+            st = self.stats_prompt
+            st["turnos"] += 1
+            for clave in ("llamadas", *COMPONENTES, "total", "ahorrados"):
+                st[clave] += resumen[clave]
+        logger.info(
+            "prompt: modo=%s llamadas=%d %s total=%d ahorrados=%d (%.1f%%)",
+            "compacto" if self.compacto else "completo",
+            resumen["llamadas"],
+            " ".join(f"{c}={resumen[c]}" for c in COMPONENTES),
+            resumen["total"], resumen["ahorrados"], resumen["ahorro_pct"],
+        )
+
+    def metricas_prompt(self) -> dict:
+        """
+        Tokens de prompt acumulados por componente y promedio por turno.
+        """
+        with self._lock:
+            st = dict(self.stats_prompt)
+        st["modo"] = "compacto" if self.compacto else "completo"
+        st["total_por_turno"] = round(st["total"] / st["turnos"], 1) if st["turnos"] else None
+        enviados_sin_compactar = st["total"] + st["ahorrados"]
+        st["ahorro_pct"] = round(100 * st["ahorrados"] / enviados_sin_compactar, 1) if st["ahorrados"] else 0.0
+        return st
+
+    def _registrar_especulacion(self, adjuntados: List[str], msg) -> None:
+        """
+        Acierto: el modelo no volvió a pedir `get_food_info`. Se ahorra un
+        viaje de ida y vuelta si además respondió sin pedir ninguna tool.
+        """
+        if not self.especular:
+            return
+        calls = msg.tool_calls or []
+        acierto = bool(adjuntados) and not any(
+            c.function.name == "get_food_info" for c in calls
+        )
+        ahorrados = int(bool(adjuntados) and not calls)
+        with self._lock:
+            st = self.stats_especulacion
+            st["turnos"] += 1
+            st["con_prefetch"] += bool(adjuntados)
+            st["aciertos"] += acierto
+            st["round_trips_ahorrados"] += ahorrados
+            st["alimentos_prefetch"] += len(adjuntados)
+        logger.info(
+            "especulación: adjuntados=%s acierto=%s round_trips_ahorrados=%d",
+            adjuntados, acierto, ahorrados,
+        )
+
+    def metricas_especulacion(self) -> dict:
+        with self._lock:
+            st = dict(self.stats_especulacion)
+        st["tasa_acierto"] = round(st["aciertos"] / st["con_prefetch"], 3) if st["con_prefetch"] else None
+        return st
+
+    def _completion(
+        self, plazo: Plazo, cuenta: CuentaPrompt, hedge: Optional[bool] = None, **kwargs
+    ):
+        """
+        Llamada al modelo con timeout, reintentos y hedging según la política.
+        Los tokens del prompt se suman a la cuenta del turno.
+        """
+        cuenta.sumar(kwargs["messages"], kwargs.get("tools"))
+        return self.politica.ejecutar(
+            self.client.chat.completions.create, plazo=plazo, hedge=hedge,
+            model=self.model_llm, **kwargs,
+        )
+
+    def chat(
+        self,
+        user_message: str,
+        history: Optional[List[Tuple[str, str]]] = None,
+        session_id: Optional[str] = None,
+    ) -> str:
+        """
+        Responde un turno y, si hay sesión, lo registra en el store.
+        """
+        answer = self._enrutar(user_message)
+        if answer is None:
+            with en_sesion(session_id):
+                answer = self._chat(user_message, self._resolve_history(history, session_id))
+        self._record_turn(session_id, user_message, answer)
+        return answer
+
+    def _chat(self, user_message: str, history: List[Tuple[str, str]]) -> str:
         """
         Flujo principal de conversación:
 
@@ -51,48 +308,131 @@ class ChatEngine:
 
         Maneja errores para no tumbar la app.
         """
+        plazo = Plazo(self.presupuesto_turno_s)
+        cuenta = CuentaPrompt(*self._ref_prompt)
         try:
-            # 1) Historial compacto
-            prepared = self._prepare_history(history)
-
-            # 2) Construir mensajes
-            messages: List[dict] = [
-                {"role": "system", "content": self.system_message}
-            ]
-            messages.extend(prepared)
-            messages.append({"role": "user", "content": user_message})
+            # 1-2) Historial compacto + mensajes (+ alimentos adelantados)
+            messages = self._build_messages(user_message, history)
+            adjuntados = self._especular(messages, user_message, cuenta)
 
             # 3) Primera llamada al modelo
-            response = self.client.chat.completions.create(
-                model=self.model_llm,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
+            response = self._completion(
+                plazo, cuenta, messages=messages, tools=self.tools, tool_choice="auto"
             )
 
             msg = response.choices[0].message
+            self._registrar_especulacion(adjuntados, msg)
 
             # 4) Si NO hay tool-calls → responder directo
             if not msg.tool_calls:
                 return msg.content or "Lo siento, no pude generar una respuesta."
 
-            # 5) Ejecutar tools
-            tool_msgs = handle_tool_calls(msg.tool_calls, self.client)
+            # 5) Ejecutar tools (también cuentan para el plazo del turno)
+            tool_msgs = con_plazo(handle_tool_calls, plazo, msg.tool_calls, self.client)
+            self._compactar_resultados(tool_msgs, cuenta)
 
             # 6) Añadir al contexto y segunda llamada
             messages.append(msg)
             messages.extend(tool_msgs)
 
-            final = self.client.chat.completions.create(
-                model=self.model_llm,
-                messages=messages,
-            )
+            final = self._completion(plazo, cuenta, messages=messages)
 
             return final.choices[0].message.content or "No pude generar respuesta final."
 
+        except PresupuestoAgotado:
+            return MENSAJE_TIEMPO_AGOTADO
         except Exception as e:
             # En producción no mostramos detalles, solo un mensaje amable
-            return (
-                "😔 Ocurrió un problema técnico al procesar tu solicitud. "
-                "Intenta de nuevo en unos momentos o reformula tu mensaje."
+            return MENSAJE_ERROR_TECNICO
+        finally:
+            self._registrar_prompt(cuenta)
+
+    def chat_stream(
+        self,
+        user_message: str,
+        history: Optional[List[Tuple[str, str]]] = None,
+        session_id: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Igual que `chat`, pero entrega la respuesta final por fragmentos.
+        El turno completo se registra en el store al terminar.
+
+        Si el turno falla, el último elemento es un `FalloStream`. Si ya se
+        habían enviado fragmentos, el turno no se registra (la respuesta
+        quedó a medias); si no, se registra el mensaje de error, como en
+        `chat`.
+        """
+        local = self._enrutar(user_message)
+        if local is not None:
+            yield local
+            self._record_turn(session_id, user_message, local)
+            return
+
+        parts: List[str] = []
+        fallo: Optional[FalloStream] = None
+        with en_sesion(session_id):
+            for delta in self._chat_stream(
+                user_message, self._resolve_history(history, session_id)
+            ):
+                if isinstance(delta, FalloStream):
+                    fallo = delta
+                else:
+                    parts.append(delta)
+                yield delta
+        if fallo is None:
+            self._record_turn(session_id, user_message, "".join(parts))
+        elif not parts:
+            self._record_turn(session_id, user_message, str(fallo))
+
+    def _chat_stream(
+        self, user_message: str, history: List[Tuple[str, str]]
+    ) -> Iterator[str]:
+        """
+        Flujo de `chat` con la respuesta final por fragmentos.
+
+        La primera llamada (la que decide las tools) no se transmite; la
+        segunda llamada, con los resultados de las tools, se pide con
+        stream=True y se va reenviando tal cual llega. Esa segunda llamada
+        se reintenta solo mientras se abre (sin hedging: no se puede
+        duplicar un stream ya iniciado).
+        """
+        plazo = Plazo(self.presupuesto_turno_s)
+        cuenta = CuentaPrompt(*self._ref_prompt)
+        try:
+            messages = self._build_messages(user_message, history)
+            adjuntados = self._especular(messages, user_message, cuenta)
+
+            response = self._completion(
+                plazo, cuenta, messages=messages, tools=self.tools, tool_choice="auto"
             )
+            msg = response.choices[0].message
+            self._registrar_especulacion(adjuntados, msg)
+
+            if not msg.tool_calls:
+                yield msg.content or "Lo siento, no pude generar una respuesta."
+                return
+
+            tool_msgs = con_plazo(handle_tool_calls, plazo, msg.tool_calls, self.client)
+            self._compactar_resultados(tool_msgs, cuenta)
+            messages.append(msg)
+            messages.extend(tool_msgs)
+
+            stream = self._completion(plazo, cuenta, hedge=False, messages=messages, stream=True)
+            emitted = False
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    emitted = True
+                    yield delta
+
+            if not emitted:
+                yield "No pude generar respuesta final."
+
+        except PresupuestoAgotado:
+            yield FalloStream(MENSAJE_TIEMPO_AGOTADO)
+        except Exception:
+            yield FalloStream(MENSAJE_ERROR_TECNICO)
+        finally:
+            self._registrar_prompt(cuenta)
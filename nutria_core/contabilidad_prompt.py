@@ -0,0 +1,319 @@
+"""
+Contabilidad de tokens del prompt y modo compacto.
+
+Cada llamada al modelo manda el system message (~8 KB), el esquema de las
+tools (incluido el de DatosPaciente que genera pydantic), el historial y,
+en la segunda llamada, los resultados de las tools. Aquí se cuentan los
+tokens de cada componente, localmente y sin llamar a la API:
+
+- con `tiktoken` instalado se usa el tokenizador de gpt-4o (o200k_base);
+- si no, una aproximación (~4 caracteres por token en palabras, 1 por
+  signo), suficiente para ver qué pesa más y cuánto se ahorra.
+
+Modo compacto (ChatEngine(compacto=True)):
+
+- `minificar_prompt`: quita del system message el andamiaje de Python del
+  archivo (las asignaciones de cada sección y el join final), los emojis
+  que abren secciones, los `**`, los espacios de sobra y las líneas
+  vacías, sin tocar las instrucciones;
+- `compactar_tools`: esquemas sin `title`/`default`/`nullable`, sin
+  `anyOf` con null y con descripciones de una sola frase;
+- `recortar_resultado`: JSON de las tools sin nulos, con floats
+  redondeados, listas de objetos como tabla (columnas + filas) y, si aún
+  pasa de `max_tokens`, listas acortadas indicando cuántos se omitieron.
+"""
+
+import copy
+import functools
+import json
+import re
+from typing import Dict, List, Optional
+
+COMPONENTES = ("system", "tools", "historial", "usuario", "resultados_tools")
+
+# Tokens fijos por mensaje y para cebar la respuesta (formato chat de OpenAI)
+TOKENS_POR_MENSAJE = 3
+TOKENS_RESPUESTA = 3
+# Costo fijo por imagen de un mensaje multimodal (el base de OpenAI; en
+# detalle alto se suman teselas según la resolución, que aquí no se mide)
+TOKENS_POR_IMAGEN = 85
+
+_PIEZA = re.compile(r"\w+|[^\w\s]")
+
+
+# =========================================================
+# Conteo
+# =========================================================
+
+@functools.lru_cache(maxsize=1)
+def _codificador():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("o200k_base")
+
+
+@functools.lru_cache(maxsize=2048)
+def contar_tokens(texto: str) -> int:
+    """
+    Tokens de `texto` (exactos con tiktoken, aproximados sin él). Con caché:
+    el system message y el historial se repiten en cada llamada.
+    """
+    if not texto:
+        return 0
+    codificador = _codificador()
+    if codificador is not None:
+        return len(codificador.encode(texto))
+    return sum((len(p) + 3) // 4 if p[0].isalnum() or p[0] == "_" else 1 for p in _PIEZA.findall(texto))
+
+
+def _campo(obj, nombre: str):
+    # Los mensajes son dicts o, el del assistant, objetos del SDK
+    return obj.get(nombre) if isinstance(obj, dict) else getattr(obj, nombre, None)
+
+
+def tokens_contenido(contenido) -> int:
+    """
+    Tokens del `content` de un mensaje: texto o lista de partes
+    (multimodal), donde cuentan las de texto más TOKENS_POR_IMAGEN por
+    imagen.
+    """
+    if not contenido:
+        return 0
+    if isinstance(contenido, str):
+        return contar_tokens(contenido)
+    n = 0
+    for parte in contenido:
+        tipo = _campo(parte, "type")
+        if tipo == "text":
+            n += contar_tokens(_campo(parte, "text") or "")
+        elif tipo == "image_url":
+            n += TOKENS_POR_IMAGEN
+    return n
+
+
+def tokens_mensaje(mensaje) -> int:
+    n = TOKENS_POR_MENSAJE + tokens_contenido(_campo(mensaje, "content"))
+    if _campo(mensaje, "name"):
+        n += 1 + contar_tokens(_campo(mensaje, "name"))
+    for call in _campo(mensaje, "tool_calls") or []:
+        funcion = _campo(call, "function")
+        n += TOKENS_POR_MENSAJE + contar_tokens(_campo(funcion, "name") or "")
+        n += contar_tokens(_campo(funcion, "arguments") or "")
+    return n
+
+
+def tokens_tools(tools: List[dict]) -> int:
+    """
+    Aproximación: el JSON compacto de los esquemas (OpenAI los reescribe en
+    otro formato, de tamaño parecido).
+    """
+    return contar_tokens(json.dumps(tools, ensure_ascii=False, separators=(",", ":")))
+
+
+def medir_prompt(messages: List, tools: Optional[List[dict]] = None) -> Dict[str, int]:
+    """
+    Tokens por componente de una llamada. "usuario" es el último mensaje
+    del usuario; los anteriores (y sus respuestas) son "historial"; los
+    tool_calls del assistant y los mensajes "tool" son "resultados_tools".
+    """
+    tokens = dict.fromkeys(COMPONENTES, 0)
+    ultimo_usuario = max(
+        (i for i, m in enumerate(messages) if _campo(m, "role") == "user"), default=-1
+    )
+    for i, m in enumerate(messages):
+        rol = _campo(m, "role")
+        if rol == "system":
+            componente = "system"
+        elif rol == "tool" or _campo(m, "tool_calls"):
+            componente = "resultados_tools"
+        elif i == ultimo_usuario:
+            componente = "usuario"
+        else:
+            componente = "historial"
+        tokens[componente] += tokens_mensaje(m)
+    if tools:
+        tokens["tools"] = tokens_tools(tools)
+    return tokens
+
+
+class CuentaPrompt:
+    """
+    Acumula los tokens de las llamadas de un turno.
+
+    En modo compacto recibe los tokens de la versión completa del system
+    message y de las tools, y los de cada resultado de tool antes de
+    recortarlo (`registrar_recorte`), para informar el ahorro del turno.
+    """
+
+    def __init__(self, ref_system: Optional[int] = None, ref_tools: Optional[int] = None) -> None:
+        self.ref_system = ref_system
+        self.ref_tools = ref_tools
+        self.llamadas = 0
+        self.tokens = dict.fromkeys(COMPONENTES, 0)
+        self.ahorro = dict.fromkeys(COMPONENTES, 0)
+        self._originales: Dict[str, int] = {}  # tool_call_id → tokens sin recortar
+
+    def registrar_recorte(self, tool_call_id: str, original: str) -> None:
+        self._originales[tool_call_id] = contar_tokens(original)
+
+    def sumar(self, messages: List, tools: Optional[List[dict]] = None) -> None:
+        medidos = medir_prompt(messages, tools)
+        self.llamadas += 1
+        for componente, n in medidos.items():
+            self.tokens[componente] += n
+        if self.ref_system is not None and medidos["system"]:
+            self.ahorro["system"] += self.ref_system + TOKENS_POR_MENSAJE - medidos["system"]
+        if self.ref_tools is not None and tools:
+            self.ahorro["tools"] += self.ref_tools - medidos["tools"]
+        for m in messages:
+            original = self._originales.get(_campo(m, "tool_call_id"))
+            if original is not None:
+                self.ahorro["resultados_tools"] += original - tokens_contenido(_campo(m, "content"))
+
+    @property
+    def total(self) -> int:
+        return sum(self.tokens.values()) + TOKENS_RESPUESTA * self.llamadas
+
+    def resumen(self) -> dict:
+        ahorrado = sum(self.ahorro.values())
+        return {
+            "llamadas": self.llamadas,
+            **self.tokens,
+            "total": self.total,
+            "ahorrados": ahorrado,
+            "ahorro_pct": round(100 * ahorrado / (self.total + ahorrado), 1) if ahorrado else 0.0,
+        }
+
+
+# =========================================================
+# Modo compacto
+# =========================================================
+
+_RE_ASIGNACION = re.compile(r'^\s*\w+\s*=\s*r?"""\s*$')
+_RE_CIERRE = re.compile(r'^\s*"""\s*$')
+_RE_JOIN = re.compile(r'^\w+\s*=\s*"\\n"\.join\(\[.*?\]\)\s*', re.S | re.M)
+_RE_COMENTARIO = re.compile(r"^\s*#.*$")
+# Emojis al inicio de línea (marcadores de sección: "🥑✨ Rol principal")
+_RE_EMOJI_INICIAL = re.compile(r"^[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D\s]+")
+
+
+def minificar_prompt(texto: str) -> str:
+    """
+    Versión mínima del system message con las mismas instrucciones.
+    """
+    texto = _RE_JOIN.sub("", texto)
+    lineas = []
+    for linea in texto.splitlines():
+        if _RE_ASIGNACION.match(linea) or _RE_CIERRE.match(linea) or _RE_COMENTARIO.match(linea):
+            continue
+        linea = _RE_EMOJI_INICIAL.sub("", linea)
+        linea = " ".join(linea.replace("**", "").split())
+        if linea:
+            lineas.append(linea)
+    return "\n".join(lineas)
+
+
+def _primera_frase(texto: str) -> str:
+    return re.split(r"(?<=\.)\s", texto.strip(), maxsplit=1)[0]
+
+
+def _compactar_schema(nodo, en_propiedades: bool = False):
+    if isinstance(nodo, list):
+        return [_compactar_schema(n) for n in nodo]
+    if not isinstance(nodo, dict):
+        return nodo
+    if en_propiedades:  # claves = nombres de parámetros, no palabras clave
+        return {k: _compactar_schema(v) for k, v in nodo.items()}
+
+    nodo = {k: v for k, v in nodo.items() if k not in ("title", "default", "nullable")}
+    opciones = nodo.get("anyOf")
+    if opciones:
+        no_nulas = [o for o in opciones if o.get("type") != "null"]
+        if len(no_nulas) == 1:
+            del nodo["anyOf"]
+            nodo.update(no_nulas[0])
+    if isinstance(nodo.get("description"), str):
+        nodo["description"] = _primera_frase(nodo["description"])
+    return {k: _compactar_schema(v, en_propiedades=k == "properties") for k, v in nodo.items()}
+
+
+def compactar_tools(tools: List[dict]) -> List[dict]:
+    """
+    Copia de `tools` con esquemas mínimos (mismos nombres, tipos, enums y
+    requeridos).
+    """
+    return [_compactar_schema(copy.deepcopy(t)) for t in tools]
+
+
+def _compactar_valor(valor):
+    if isinstance(valor, bool) or valor is None:
+        return valor
+    if isinstance(valor, float):
+        if valor.is_integer():
+            return int(valor)
+        return round(valor, 2) if abs(valor) >= 1 else float(f"{valor:.2g}")
+    if isinstance(valor, dict):
+        return {k: _compactar_valor(v) for k, v in valor.items() if v is not None}
+    if isinstance(valor, list):
+        valores = [_compactar_valor(v) for v in valor]
+        # Lista de objetos homogéneos → tabla (las claves se escriben una vez)
+        if len(valores) >= 3 and all(isinstance(v, dict) for v in valores):
+            columnas = list(valores[0])
+            if all(list(v) == columnas for v in valores):
+                return {"columnas": columnas, "filas": [list(v.values()) for v in valores]}
+        return valores
+    return valor
+
+
+def _lista_mas_larga(nodo, mejor=None):
+    """
+    (contenedor, clave) de la lista más larga dentro de dicts anidados.
+    """
+    if isinstance(nodo, dict):
+        for clave, valor in nodo.items():
+            if isinstance(valor, list) and len(valor) > 1 and clave != "columnas":
+                if mejor is None or len(valor) > len(mejor[0][mejor[1]]):
+                    mejor = (nodo, clave)
+            mejor = _lista_mas_larga(valor, mejor)
+    elif isinstance(nodo, list):
+        for valor in nodo:
+            mejor = _lista_mas_larga(valor, mejor)
+    return mejor
+
+
+def _json(datos) -> str:
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":"))
+
+
+def recortar_resultado(contenido: str, max_tokens: int = 600) -> str:
+    """
+    Resultado de una tool listo para la segunda llamada en modo compacto.
+    """
+    try:
+        datos = json.loads(contenido)
+    except ValueError:
+        datos = None
+    if not isinstance(datos, (dict, list)):
+        texto = contenido
+    else:
+        datos = {"_": _compactar_valor(datos)}  # contenedor para acortar también listas sueltas
+        texto = _json(datos["_"])
+        while contar_tokens(texto) > max_tokens:
+            encontrada = _lista_mas_larga(datos)
+            if encontrada is None:
+                break
+            contenedor, clave = encontrada
+            valores = contenedor[clave]
+            quedan = len(valores) // 2
+            contenedor[clave] = valores[:quedan]
+            if contenedor is not datos:
+                omitidos = f"{clave}_omitidos"
+                contenedor[omitidos] = contenedor.get(omitidos, 0) + len(valores) - quedan
+            texto = _json(datos["_"])
+
+    if contar_tokens(texto) > max_tokens:
+        # Último recurso: cortar el texto (deja de ser JSON válido)
+        texto = texto[: max_tokens * 4] + "…[recortado]"
+    return texto
@@ -0,0 +1,291 @@
+"""
+Almacén de conversaciones con memoria acotada por sesión.
+
+- Cada sesión guarda en RAM solo sus últimos `ventana` mensajes.
+- Los mensajes que salen de la ventana se escriben ("spill") en SQLite.
+- Las sesiones inactivas más de `inactividad_s` (o que exceden
+  `max_sesiones`, por LRU) se vuelcan completas a disco y se liberan de RAM;
+  si vuelven, se rehidrata solo su ventana reciente.
+
+Cada mensaje tiene un índice absoluto dentro de su sesión, así que la
+paginación de mensajes antiguos funciona igual venga de RAM o de disco.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+# =========================================================
+# Métricas de proceso
+# =========================================================
+
+def rss_proceso_bytes() -> int:
+    """
+    RSS actual del proceso. Usa /proc en Linux y, si no existe,
+    el pico de `resource` (aproximación en macOS).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+# =========================================================
+# Sesión en memoria
+# =========================================================
+
+class _Sesion:
+    __slots__ = ("mensajes", "total", "persistidos", "ultimo_acceso", "bytes")
+
+    def __init__(self) -> None:
+        # mensajes: [(indice, role, content)] en orden, solo la ventana
+        self.mensajes: List[Tuple[int, str, str]] = []
+        self.total = 0            # mensajes totales de la sesión (RAM + disco)
+        self.persistidos = 0      # índices < persistidos ya están en disco
+        self.ultimo_acceso = time.monotonic()
+        self.bytes = 0            # tamaño aproximado de los textos en RAM
+
+
+def _tam(content: str) -> int:
+    return sys.getsizeof(content)
+
+
+class ConversationStore:
+    """
+    Historial de todas las sesiones de un proceso, con RAM acotada.
+
+    Es seguro usarlo desde varios hilos (un solo lock por almacén).
+    """
+
+    def __init__(
+        self,
+        ruta_db: str = "conversaciones.sqlite",
+        ventana: int = 40,
+        inactividad_s: float = 1800.0,
+        max_sesiones: int = 10_000,
+    ) -> None:
+        self.ventana = ventana
+        self.inactividad_s = inactividad_s
+        self.max_sesiones = max_sesiones
+
+        self._lock = threading.Lock()
+        self._sesiones: "OrderedDict[str, _Sesion]" = OrderedDict()
+        self.desalojadas = 0
+
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mensajes (
+                sesion  TEXT    NOT NULL,
+                indice  INTEGER NOT NULL,
+                role    TEXT    NOT NULL,
+                content TEXT    NOT NULL,
+                PRIMARY KEY (sesion, indice)
+            ) WITHOUT ROWID
+            """
+        )
+        self._db.commit()
+
+    # ---------------------------
+    # Internos (llamar con el lock tomado)
+    # ---------------------------
+    def _obtener(self, sesion: str) -> _Sesion:
+        s = self._sesiones.get(sesion)
+        if s is None:
+            s = self._rehidratar(sesion)
+            self._sesiones[sesion] = s
+            self._limitar_sesiones()
+        else:
+            self._sesiones.move_to_end(sesion)
+        s.ultimo_acceso = time.monotonic()
+        return s
+
+    def _rehidratar(self, sesion: str) -> _Sesion:
+        s = _Sesion()
+        (total,) = self._db.execute(
+            "SELECT COUNT(*) FROM mensajes WHERE sesion = ?", (sesion,)
+        ).fetchone()
+        if total:
+            filas = self._db.execute(
+                "SELECT indice, role, content FROM mensajes "
+                "WHERE sesion = ? AND indice >= ? ORDER BY indice",
+                (sesion, max(0, total - self.ventana)),
+            ).fetchall()
+            s.mensajes = [tuple(f) for f in filas]
+            s.bytes = sum(_tam(c) for _, _, c in s.mensajes)
+        s.total = total
+        s.persistidos = total
+        return s
+
+    def _volcar(self, sesion: str, mensajes: List[Tuple[int, str, str]]) -> None:
+        if mensajes:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO mensajes (sesion, indice, role, content) "
+                "VALUES (?, ?, ?, ?)",
+                [(sesion, i, r, c) for i, r, c in mensajes],
+            )
+            self._db.commit()
+
+    def _spill(self, sesion: str, s: _Sesion) -> None:
+        exceso = len(s.mensajes) - self.ventana
+        if exceso <= 0:
+            return
+        salientes = s.mensajes[:exceso]
+        del s.mensajes[:exceso]
+        s.bytes -= sum(_tam(c) for _, _, c in salientes)
+
+        pendientes = [m for m in salientes if m[0] >= s.persistidos]
+        self._volcar(sesion, pendientes)
+        s.persistidos = max(s.persistidos, salientes[-1][0] + 1)
+
+    def _desalojar(self, sesion: str) -> None:
+        s = self._sesiones.pop(sesion)
+        self._volcar(sesion, [m for m in s.mensajes if m[0] >= s.persistidos])
+        self.desalojadas += 1
+
+    def _limitar_sesiones(self) -> None:
+        while len(self._sesiones) > self.max_sesiones:
+            sesion = next(iter(self._sesiones))  # la menos reciente (LRU)
+            self._desalojar(sesion)
+
+    # ---------------------------
+    # Escritura
+    # ---------------------------
+    def agregar(self, sesion: str, role: str, content: str) -> None:
+        with self._lock:
+            s = self._obtener(sesion)
+            s.mensajes.append((s.total, role, content))
+            s.total += 1
+            s.bytes += _tam(content)
+            self._spill(sesion, s)
+
+    def registrar_turno(self, sesion: str, usuario: str, respuesta: str) -> None:
+        with self._lock:
+            s = self._obtener(sesion)
+            for role, content in (("user", usuario), ("assistant", respuesta)):
+                s.mensajes.append((s.total, role, content))
+                s.total += 1
+                s.bytes += _tam(content)
+            self._spill(sesion, s)
+
+    # ---------------------------
+    # Lectura
+    # ---------------------------
+    def total(self, sesion: str) -> int:
+        with self._lock:
+            return self._obtener(sesion).total
+
+    def rango(self, sesion: str, inicio: int, fin: int) -> List[dict]:
+        """
+        Mensajes con índice en [inicio, fin), leyendo de RAM lo que esté en
+        la ventana y de SQLite lo anterior.
+        """
+        with self._lock:
+            s = self._obtener(sesion)
+            inicio, fin = max(0, inicio), min(fin, s.total)
+            if inicio >= fin:
+                return []
+
+            primero_ram = s.mensajes[0][0] if s.mensajes else s.total
+            filas: List[Tuple[int, str, str]] = []
+            if inicio < primero_ram:
+                filas.extend(
+                    self._db.execute(
+                        "SELECT indice, role, content FROM mensajes "
+                        "WHERE sesion = ? AND indice >= ? AND indice < ? ORDER BY indice",
+                        (sesion, inicio, min(fin, primero_ram)),
+                    ).fetchall()
+                )
+            filas.extend(m for m in s.mensajes if inicio <= m[0] < fin)
+
+        return [{"role": r, "content": c} for _, r, c in filas]
+
+    def recientes(self, sesion: str, n: int) -> List[dict]:
+        total = self.total(sesion)
+        return self.rango(sesion, total - n, total) if n > 0 else []
+
+    def pares_recientes(self, sesion: str, n: int) -> List[Tuple[str, str]]:
+        """
+        Últimos `n` pares (usuario, asistente), listos para ChatEngine.
+        Normalmente salen de RAM; solo si la ventana no alcanza se lee disco.
+        """
+        if n <= 0:
+            return []
+        # 2 mensajes por par + holgura por mensajes sueltos (p. ej. bienvenida)
+        mensajes = self.recientes(sesion, 2 * n + 1)
+        pares: List[Tuple[str, str]] = []
+        pendiente: Optional[str] = None
+        for m in mensajes:
+            if m["role"] == "user":
+                pendiente = m["content"]
+            elif m["role"] == "assistant" and pendiente is not None:
+                pares.append((pendiente, m["content"]))
+                pendiente = None
+        return pares[-n:]
+
+    # ---------------------------
+    # Mantenimiento y métricas
+    # ---------------------------
+    def desalojar_inactivas(self, ahora: Optional[float] = None) -> int:
+        """
+        Vuelca a disco y libera de RAM las sesiones sin actividad reciente.
+        Devuelve cuántas se desalojaron.
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        n = 0
+        with self._lock:
+            # El OrderedDict está en orden LRU: basta recorrer desde el frente
+            # hasta la primera sesión activa, así que la revisión es barata.
+            while self._sesiones:
+                sid, s = next(iter(self._sesiones.items()))
+                if ahora - s.ultimo_acceso <= self.inactividad_s:
+                    break
+                self._desalojar(sid)
+                n += 1
+        return n
+
+    def metricas_sesion(self, sesion: str) -> Dict[str, int]:
+        with self._lock:
+            s = self._sesiones.get(sesion)
+            if s is None:
+                return {"en_memoria": 0, "mensajes_ram": 0, "bytes_ram": 0}
+            return {
+                "en_memoria": 1,
+                "mensajes_ram": len(s.mensajes),
+                "mensajes_total": s.total,
+                "bytes_ram": s.bytes,
+            }
+
+    def metricas(self) -> Dict[str, int]:
+        with self._lock:
+            sesiones = list(self._sesiones.values())
+            desalojadas = self.desalojadas
+        return {
+            "sesiones_en_memoria": len(sesiones),
+            "mensajes_ram": sum(len(s.mensajes) for s in sesiones),
+            "bytes_ram": sum(s.bytes for s in sesiones),
+            "max_bytes_sesion": max((s.bytes for s in sesiones), default=0),
+            "sesiones_desalojadas": desalojadas,
+            "rss_bytes": rss_proceso_bytes(),
+        }
+
+    def cerrar(self) -> None:
+        """
+        Vuelca todo lo pendiente y cierra la base de datos.
+        """
+        with self._lock:
+            for sid in list(self._sesiones):
+                self._desalojar(sid)
+            self._db.close()
@@ -1,12 +1,16 @@
-import pandas as pd
-from pydantic import BaseModel, Field
-from typing import Optional
+import os
+import threading
 
-# =========================================================
-# Carga de datos
-# =========================================================
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Sequence
+
+# pandas/numpy y el dataset se cargan en la primera consulta (ver vista()):
+# importar este módulo solo define los modelos.
+if TYPE_CHECKING:
+    import pandas as pd
 
-df = pd.read_csv("dataset_limpio.csv")
+    from .dataset_compartido import DatasetCompartido
+    from .distribuciones import Distribuciones
 
 # Garantizamos que las columnas críticas existan y sean numéricas
 NUMERIC_COLS = [
@@ -19,10 +23,8 @@ NUMERIC_COLS = [
     "fibra_g",
 ]
 
-for col in NUMERIC_COLS:
-    if col not in df.columns:
-        df[col] = 0
-    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+# Columnas con percentiles/ranks por categoría (ver distribuciones.py)
+COLUMNAS_COMPARABLES = ["nutria_score"] + NUMERIC_COLS
 
 
 # =========================================================
@@ -51,12 +53,29 @@ class FoodInfoScore(FoodInfo):
 # Helpers
 # =========================================================
 
-def buscar_alimento_por_nombre(nombre: str):
+def _texto_opcional(valor) -> Optional[str]:
     """
-    Busca el primer alimento cuyo nombre contenga el string dado (case-insensitive).
+    Convierte NaN/None de pandas en None (pydantic no acepta NaN como str).
+    """
+    import pandas as pd
+
+    return None if valor is None or pd.isna(valor) else str(valor)
+
+
+def buscar_alimento_por_nombre(nombre: str, data: Optional["pd.DataFrame"] = None):
+    """
+    Busca el alimento que se llame exactamente así o, si no hay, el primero
+    cuyo nombre contenga el string dado (case-insensitive). Sin la
+    preferencia por el exacto, "Manzana" daría "Jugo de manzana…".
     Devuelve una fila (pd.Series) o None si no hay coincidencias.
+
+    `data` permite buscar en el df de una Vista concreta (por defecto, la vigente).
     """
-    candidatos = df[df["alimento"].str.contains(nombre, case=False, na=False)]
+    data = vista().df if data is None else data
+    exactos = data[data["alimento"].str.lower() == nombre.strip().lower()]
+    if not exactos.empty:
+        return exactos.iloc[0]
+    candidatos = data[data["alimento"].str.contains(nombre, case=False, na=False)]
     return candidatos.iloc[0] if not candidatos.empty else None
 
 
@@ -74,7 +93,7 @@ def construir_foodinfo(fila) -> FoodInfo:
         azucar_g=float(fila.get("azucar_g", 0) or 0),
         sodio_g=float(fila.get("sodio_g", 0) or 0),
         fibra_g=float(fila.get("fibra_g", 0) or 0),
-        medida=fila.get("medida"),
+        medida=_texto_opcional(fila.get("medida")),
         cantidad=float(fila.get("cantidad", 0) or 0)
         if "cantidad" in fila else None,
     )
@@ -129,3 +148,178 @@ def construir_foodinfo_score(fila) -> FoodInfoScore:
     base = construir_foodinfo(fila)
     score = calcular_nutria_score(fila)
     return FoodInfoScore(**base.model_dump(), nutria_score=score)
+
+
+# =========================================================
+# Precomputado al cargar
+# =========================================================
+# Los alimentos no cambian entre recargas: el NutrIA Score y el JSON de
+# cada FoodInfoScore se calculan una sola vez aquí, y las tools arman sus
+# respuestas concatenando esos fragmentos.
+
+_foodinfo_score_list = TypeAdapter(List[FoodInfoScore])
+
+
+def _registro_foodinfo_score(fila: dict) -> dict:
+    """
+    Mismos campos que construir_foodinfo_score, como dict plano para
+    validarlos todos juntos con un TypeAdapter.
+    """
+    return {
+        "alimento": str(fila.get("alimento", "")),
+        "categoria": str(fila.get("categoria", "")),
+        "energia_kcal": float(fila.get("energia_kcal", 0) or 0),
+        "proteina_g": float(fila.get("proteina_g", 0) or 0),
+        "lipidos_g": float(fila.get("lipidos_g", 0) or 0),
+        "hidratos_carbono_g": float(fila.get("hidratos_carbono_g", 0) or 0),
+        "azucar_g": float(fila.get("azucar_g", 0) or 0),
+        "sodio_g": float(fila.get("sodio_g", 0) or 0),
+        "fibra_g": float(fila.get("fibra_g", 0) or 0),
+        "medida": _texto_opcional(fila.get("medida")),
+        "cantidad": float(fila.get("cantidad", 0) or 0) if "cantidad" in fila else None,
+        "nutria_score": calcular_nutria_score(fila),
+    }
+
+
+def _precomputar(data: "pd.DataFrame"):
+    registros = [_registro_foodinfo_score(r) for r in data.to_dict("records")]
+    foods = _foodinfo_score_list.validate_python(registros)  # validación en bloque
+    scores = [f.nutria_score for f in foods]
+    fragmentos = [f.model_dump_json(ensure_ascii=False) for f in foods]
+    return scores, fragmentos
+
+
+def cargar_csv(ruta: str = "dataset_limpio.csv"):
+    """
+    Lee el CSV, limpia las columnas numéricas y precomputa NutrIA Score y
+    JSON de cada alimento. Devuelve (df, fragmentos).
+    """
+    import pandas as pd
+
+    data = pd.read_csv(ruta)
+    for col in NUMERIC_COLS:
+        if col not in data.columns:
+            data[col] = 0
+        data[col] = pd.to_numeric(data[col], errors="coerce").fillna(0)
+
+    data = data.reset_index(drop=True)  # la posición de cada fila indexa los fragmentos
+    scores, fragmentos = _precomputar(data)
+    data["nutria_score"] = scores
+    return data, fragmentos
+
+
+# =========================================================
+# Carga de datos
+# =========================================================
+# Con NUTRIA_DATASET_COMPARTIDO=<dir> y una generación publicada por
+# `python -m nutria_core.dataset_compartido`, el proceso mapea el dataset
+# en memoria compartida en vez de leer el CSV (ver dataset_compartido.py).
+#
+# La carga es perezosa: ocurre en la primera llamada a vista() (o al leer
+# `df`/`FOOD_JSON`), no al importar. Así un proceso que no toca el dataset
+# no paga pandas ni el CSV, y el servidor pre-fork lo carga explícitamente
+# en el padre antes de crear los hijos.
+
+class Vista(NamedTuple):
+    """
+    df y fragmentos JSON de una misma generación del dataset. Quien lee
+    los dos (buscar una fila y devolver su JSON) debe tomarlos de la misma
+    Vista, para no mezclar generaciones durante una recarga.
+    """
+    generacion: int  # 0 = CSV leído por este proceso
+    df: "pd.DataFrame"
+    food_json: Sequence[str]
+    distribuciones: "Distribuciones"
+    compartido: Optional["DatasetCompartido"] = None
+
+
+def _adjuntar() -> Optional[Vista]:
+    directorio = os.getenv("NUTRIA_DATASET_COMPARTIDO")
+    if not directorio:
+        return None
+    from .dataset_compartido import DatasetCompartido
+
+    try:
+        compartido = DatasetCompartido(directorio)
+    except (FileNotFoundError, ValueError):
+        return None  # nada publicado todavía (o de otra versión del formato): carga local
+    return Vista(
+        compartido.generacion,
+        compartido.dataframe(),
+        compartido.textos("food_json"),
+        compartido.distribuciones(),
+        compartido,
+    )
+
+
+def _cargar_local() -> Vista:
+    from .distribuciones import Distribuciones
+
+    data, fragmentos = cargar_csv()
+    return Vista(0, data, fragmentos, Distribuciones.calcular(data, COLUMNAS_COMPARABLES))
+
+
+_VISTA: Optional[Vista] = None
+_recarga_lock = threading.Lock()
+
+
+def vista() -> Vista:
+    """
+    Vista vigente del dataset; la primera llamada la carga (memoria
+    compartida si hay una generación publicada, si no el CSV).
+    """
+    global _VISTA
+    actual = _VISTA
+    if actual is None:
+        with _recarga_lock:
+            if _VISTA is None:
+                _VISTA = _adjuntar() or _cargar_local()
+            actual = _VISTA
+    return actual
+
+
+def __getattr__(nombre: str):
+    # `df` y `FOOD_JSON` siguen disponibles como atributos del módulo,
+    # siempre los de la Vista vigente
+    if nombre == "df":
+        return vista().df
+    if nombre == "FOOD_JSON":
+        return vista().food_json
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+def recargar_compartido() -> bool:
+    """
+    Adopta la generación vigente si el cargador publicó otra (o la primera,
+    si el proceso arrancó leyendo el CSV). Barato si no cambió nada: solo
+    lee el archivo puntero. Devuelve True si cambió la Vista.
+
+    Si el dataset aún no se cargó no hace nada: la primera vista() ya
+    tomará la generación vigente.
+    """
+    global _VISTA
+    actual = _VISTA
+    if actual is None or (actual.compartido is not None and actual.compartido.vigente()):
+        return False
+    with _recarga_lock:
+        actual = _VISTA
+        if actual is None or (actual.compartido is not None and actual.compartido.vigente()):
+            return False
+        nueva = _adjuntar()
+        if nueva is None or nueva.generacion == actual.generacion:
+            return False
+        _VISTA = nueva
+    return True
+
+
+def foodinfo_score_json(indice: int, generacion: Optional[int] = None) -> str:
+    """
+    JSON ya serializado del FoodInfoScore de la fila `indice` de df.
+
+    Con `generacion`, falla (LookupError) si la Vista vigente es otra: la
+    fila venía de un índice construido sobre otra versión del dataset.
+    """
+    actual = vista()
+    if generacion is not None and generacion != actual.generacion:
+        raise LookupError(f"La fila {indice} es de la generación {generacion}, vigente {actual.generacion}")
+    return actual.food_json[indice]
@@ -0,0 +1,427 @@
+"""
+Dataset e índices en memoria compartida entre procesos.
+
+Con varios procesos (pre-fork del servidor, varias instancias de
+Streamlit, workers del test de carga) cada uno leía el CSV, validaba los
+FoodInfoScore y armaba el índice de nombres por su cuenta: la memoria
+crecía con el número de procesos y cada arranque pagaba la carga completa.
+
+Aquí un proceso cargador publica una sola vez, en un archivo mapeado en
+memoria (por defecto bajo /dev/shm), las columnas numéricas, el NutrIA
+Score, los nombres y categorías, el JSON de cada alimento, el índice de
+nombres del detector de alimentos y las distribuciones por categoría.
+Los workers lo mapean en solo lectura: los arreglos de numpy (y las
+columnas de texto, vía Arrow) apuntan directo a esas páginas, que el
+kernel comparte entre todos los procesos.
+
+Publicación y recarga:
+
+- Cada publicación es una generación nueva, en su propio archivo
+  `dataset.<generacion>.bin`, que no se modifica después de escrito.
+- El archivo `generacion` apunta a la vigente y se reemplaza con un
+  rename atómico cuando el archivo de datos ya está completo.
+- Un worker sigue leyendo su generación (el mapeo sigue siendo válido
+  aunque el cargador borre el archivo) hasta que llama a
+  `data_processing.recargar_compartido()`, que cambia de generación de
+  una sola vez.
+
+Uso:
+    python -m nutria_core.dataset_compartido --dir /dev/shm/nutria
+    NUTRIA_DATASET_COMPARTIDO=/dev/shm/nutria python -m nutria_core.server --procesos 4
+"""
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .distribuciones import Distribuciones
+
+DIRECTORIO_DEFAULT = "/dev/shm/nutria"
+
+MAGIA = b"NUTRIASH"
+VERSION_FORMATO = 2
+# magia, versión, bytes de metadatos, generación
+_CABECERA = struct.Struct("<8sIIQ")
+ALINEACION = 64
+
+
+def _alinear(n: int) -> int:
+    return (n + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+def _ruta_datos(directorio: str, generacion: int) -> str:
+    return os.path.join(directorio, f"dataset.{generacion}.bin")
+
+
+def leer_generacion(directorio: str) -> Optional[int]:
+    """
+    Generación vigente publicada en `directorio` (None si no hay ninguna).
+    """
+    try:
+        with open(os.path.join(directorio, "generacion"), "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# =========================================================
+# Escritura (proceso cargador)
+# =========================================================
+
+def _tabla_hash(claves: List[bytes]) -> np.ndarray:
+    """
+    Direccionamiento abierto con sondeo lineal: slot → número de clave
+    (-1 vacío). El hash es crc32, igual en todos los procesos (el hash()
+    de Python cambia por proceso).
+    """
+    n_slots = 1 << max(3, (2 * len(claves) - 1).bit_length())
+    mascara = n_slots - 1
+    slots = np.full(n_slots, -1, dtype=np.int32)
+    for k, clave in enumerate(claves):
+        h = zlib.crc32(clave) & mascara
+        while slots[h] != -1:
+            h = (h + 1) & mascara
+        slots[h] = k
+    return slots
+
+
+class _Escritor:
+    """
+    Acumula arreglos con su offset (alineado) dentro de la sección de datos.
+    """
+
+    def __init__(self) -> None:
+        self.arreglos: Dict[str, list] = {}
+        self.partes: List[Tuple[int, bytes]] = []
+        self.tamano = 0
+
+    def arreglo(self, nombre: str, valores: np.ndarray) -> None:
+        valores = np.ascontiguousarray(valores)
+        offset = _alinear(self.tamano)
+        self.partes.append((offset, valores.tobytes()))
+        self.arreglos[nombre] = [offset, valores.dtype.str, len(valores)]
+        self.tamano = offset + valores.nbytes
+
+    def textos(self, nombre: str, textos: Iterable[str]) -> None:
+        """
+        Lista de str como offsets int64 + bytes UTF-8 (el layout de
+        `large_string` de Arrow).
+        """
+        codificados = [str(t).encode("utf-8") for t in textos]
+        offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in codificados], out=offsets[1:])
+        self.arreglo(f"{nombre}.offsets", offsets)
+        self.arreglo(f"{nombre}.datos", np.frombuffer(b"".join(codificados) or b"\0", dtype=np.uint8))
+
+
+def publicar(
+    directorio: str,
+    data: pd.DataFrame,
+    fragmentos: Sequence,
+    indice: Dict[str, str],
+    filas: Dict[str, int],
+    numericas: List[str],
+    conservar: int = 2,
+) -> int:
+    """
+    Escribe una generación nueva y la marca como vigente.
+
+    - `data`: df ya limpio (posición de fila = índice de `fragmentos`).
+    - `fragmentos`: JSON de cada FoodInfoScore.
+    - `indice` / `filas`: los del DetectorAlimentos (frase → nombre / fila).
+    - `numericas`: columnas float a publicar; también las de las
+      distribuciones (percentiles y ranks por categoría).
+    - `conservar`: generaciones que se dejan en disco (la vigente y la
+      anterior, para quien esté adjuntándose justo durante la publicación).
+
+    Devuelve el número de la generación publicada.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, ".lock"), "w") as cerrojo:
+        fcntl.flock(cerrojo, fcntl.LOCK_EX)  # un solo cargador publica a la vez
+        generacion = (leer_generacion(directorio) or 0) + 1
+
+        escritor = _Escritor()
+        for col in numericas:
+            escritor.arreglo(col, data[col].to_numpy(dtype=np.float64))
+        escritor.textos("alimento", data["alimento"])
+        escritor.textos("categoria", data["categoria"])
+        escritor.textos("food_json", fragmentos)
+
+        claves = list(indice)
+        escritor.arreglo("indice.slots", _tabla_hash([c.encode("utf-8") for c in claves]))
+        escritor.textos("indice.claves", claves)
+        escritor.textos("indice.nombres", (indice[c] for c in claves))
+        escritor.arreglo("indice.filas", np.array([filas[c] for c in claves], dtype=np.int32))
+
+        distribuciones = Distribuciones.calcular(data, numericas)
+        escritor.textos("dist.categorias", distribuciones.categorias)
+        for nombre, valores in distribuciones.arreglos().items():
+            escritor.arreglo(f"dist.{nombre}", valores)
+
+        meta = json.dumps(
+            {
+                "generacion": generacion,
+                "filas": len(data),
+                "numericas": list(numericas),
+                "arreglos": escritor.arreglos,
+                "publicado": time.time(),
+            }
+        ).encode("utf-8")
+        base = _alinear(_CABECERA.size + len(meta))
+
+        ruta = _ruta_datos(directorio, generacion)
+        with open(ruta + ".tmp", "wb") as f:
+            f.write(_CABECERA.pack(MAGIA, VERSION_FORMATO, len(meta), generacion))
+            f.write(meta)
+            for offset, datos in escritor.partes:
+                f.seek(base + offset)
+                f.write(datos)
+            f.truncate(base + escritor.tamano)
+        os.replace(ruta + ".tmp", ruta)
+
+        # El puntero cambia solo cuando el archivo de datos ya está completo
+        puntero = os.path.join(directorio, "generacion")
+        with open(puntero + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(generacion))
+        os.replace(puntero + ".tmp", puntero)
+
+        for nombre in os.listdir(directorio):
+            partes = nombre.split(".")
+            if len(partes) == 3 and partes[0] == "dataset" and partes[2] == "bin" and partes[1].isdigit():
+                if int(partes[1]) <= generacion - conservar:
+                    os.unlink(os.path.join(directorio, nombre))
+        return generacion
+
+
+def publicar_csv(directorio: str, ruta_csv: str = "dataset_limpio.csv") -> int:
+    """
+    Carga el CSV como lo hace data_processing y publica el resultado.
+    """
+    from .data_processing import COLUMNAS_COMPARABLES, cargar_csv
+    from .especulacion import DetectorAlimentos
+
+    data, fragmentos = cargar_csv(ruta_csv)
+    detector = DetectorAlimentos(data["alimento"])
+    return publicar(
+        directorio, data, fragmentos, detector.indice, detector.filas,
+        numericas=COLUMNAS_COMPARABLES,
+    )
+
+
+# =========================================================
+# Lectura (workers)
+# =========================================================
+
+class TextosCompartidos(Sequence):
+    """
+    Lista de str de solo lectura sobre offsets + bytes UTF-8 compartidos.
+    Cada acceso decodifica solo el elemento pedido.
+    """
+
+    def __init__(self, offsets: np.ndarray, datos: np.ndarray) -> None:
+        self.offsets = offsets
+        self.datos = datos
+        self._bytes = memoryview(datos)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def crudo(self, i: int) -> memoryview:
+        return self._bytes[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.crudo(i), "utf-8")
+
+
+class IndiceCompartido(Mapping):
+    """
+    Mapping frase → valor sobre la tabla hash compartida. Con los mismos
+    métodos que usa DetectorAlimentos de un dict (`in`, `[]`, `get`, `len`).
+    """
+
+    def __init__(self, slots: np.ndarray, claves: TextosCompartidos, valores: Sequence) -> None:
+        self.slots = slots
+        self.claves = claves
+        self.valores = valores
+        self._mascara = len(slots) - 1
+
+    def posicion(self, clave: str) -> int:
+        """
+        Número de la clave en la tabla, o -1 si no está.
+        """
+        buscada = clave.encode("utf-8")
+        h = zlib.crc32(buscada) & self._mascara
+        while True:
+            k = int(self.slots[h])
+            if k < 0:
+                return -1
+            if self.claves.crudo(k) == buscada:
+                return k
+            h = (h + 1) & self._mascara
+
+    def __getitem__(self, clave: str):
+        k = self.posicion(clave) if isinstance(clave, str) else -1
+        if k < 0:
+            raise KeyError(clave)
+        valor = self.valores[k]
+        return int(valor) if isinstance(valor, np.integer) else valor
+
+    def __contains__(self, clave) -> bool:
+        return isinstance(clave, str) and self.posicion(clave) >= 0
+
+    def __len__(self) -> int:
+        return len(self.claves)
+
+    def __iter__(self):
+        return iter(self.claves)
+
+
+def _abrir(directorio: str) -> mmap.mmap:
+    # Si el cargador publica y borra la generación leída entre leer el
+    # puntero y abrir el archivo, se vuelve a leer el puntero.
+    for _ in range(3):
+        generacion = leer_generacion(directorio)
+        if generacion is None:
+            break
+        try:
+            with open(_ruta_datos(directorio, generacion), "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"No hay dataset publicado en {directorio}")
+
+
+class DatasetCompartido:
+    """
+    Una generación del dataset mapeada en solo lectura.
+
+    El mapeo se libera solo cuando ya nadie usa sus arreglos (los numpy
+    creados con frombuffer mantienen viva la referencia).
+    """
+
+    def __init__(self, directorio: str) -> None:
+        self.directorio = directorio
+        self._mm = _abrir(directorio)
+        magia, version, n_meta, generacion = _CABECERA.unpack_from(self._mm, 0)
+        if magia != MAGIA or version != VERSION_FORMATO:
+            raise ValueError(f"Formato de dataset compartido no reconocido en {directorio}")
+        self.meta = json.loads(self._mm[_CABECERA.size:_CABECERA.size + n_meta])
+        self._base = _alinear(_CABECERA.size + n_meta)
+        self.generacion: int = generacion
+        self.filas: int = self.meta["filas"]
+
+    def vigente(self) -> bool:
+        """
+        True mientras el cargador no haya publicado otra generación.
+        """
+        return leer_generacion(self.directorio) in (None, self.generacion)
+
+    def arreglo(self, nombre: str) -> np.ndarray:
+        """
+        Vista numpy de solo lectura, sin copia.
+        """
+        offset, dtype, n = self.meta["arreglos"][nombre]
+        return np.frombuffer(self._mm, dtype=np.dtype(dtype), count=n, offset=self._base + offset)
+
+    def textos(self, nombre: str) -> TextosCompartidos:
+        return TextosCompartidos(self.arreglo(f"{nombre}.offsets"), self.arreglo(f"{nombre}.datos"))
+
+    def indice_nombres(self) -> Tuple[IndiceCompartido, IndiceCompartido]:
+        """
+        (frase → nombre original, frase → fila), como DetectorAlimentos.
+        """
+        slots, claves = self.arreglo("indice.slots"), self.textos("indice.claves")
+        return (
+            IndiceCompartido(slots, claves, self.textos("indice.nombres")),
+            IndiceCompartido(slots, claves, self.arreglo("indice.filas")),
+        )
+
+    def distribuciones(self) -> Distribuciones:
+        arreglos = {
+            nombre[len("dist."):]: self.arreglo(nombre)
+            for nombre in self.meta["arreglos"]
+            if nombre.startswith("dist.") and not nombre.startswith("dist.categorias.")
+        }
+        return Distribuciones(list(self.textos("dist.categorias")), arreglos)
+
+    def _columna_texto(self, nombre: str) -> pd.Series:
+        textos = self.textos(nombre)
+        try:
+            import pyarrow as pa
+            from pandas.arrays import ArrowStringArray
+        except ImportError:
+            return pd.Series(list(textos), dtype="str")  # sin pyarrow: copia por proceso
+        arreglo = pa.LargeStringArray.from_buffers(
+            len(textos), pa.py_buffer(textos.offsets), pa.py_buffer(textos.datos)
+        )
+        dtype = pd.StringDtype("pyarrow", na_value=np.nan)  # el mismo dtype "str" de read_csv
+        return pd.Series(ArrowStringArray(pa.chunked_array([arreglo]), dtype=dtype))
+
+    def dataframe(self) -> pd.DataFrame:
+        """
+        df con las columnas que usan las tools (alimento, categoría,
+        NUMERIC_COLS y nutria_score), todas sobre la memoria compartida.
+        """
+        columnas = {
+            "alimento": self._columna_texto("alimento"),
+            "categoria": self._columna_texto("categoria"),
+        }
+        for col in self.meta["numericas"]:
+            columnas[col] = self.arreglo(col)
+        return pd.DataFrame(columnas, copy=False)
+
+
+# =========================================================
+# CLI del cargador
+# =========================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publica el dataset en memoria compartida.")
+    parser.add_argument(
+        "--dir", default=os.getenv("NUTRIA_DATASET_COMPARTIDO", DIRECTORIO_DEFAULT),
+        help="Directorio de publicación (idealmente en tmpfs, p. ej. /dev/shm).",
+    )
+    parser.add_argument("--csv", default="dataset_limpio.csv")
+    parser.add_argument(
+        "--vigilar-s", type=float, default=0.0,
+        help="Si > 0, revisa el CSV cada N segundos y publica otra generación cuando cambia.",
+    )
+    args = parser.parse_args()
+
+    mtime = None
+    while True:
+        actual = os.stat(args.csv).st_mtime
+        if actual != mtime:
+            mtime = actual
+            t0 = time.perf_counter()
+            generacion = publicar_csv(args.dir, args.csv)
+            tamano = os.path.getsize(_ruta_datos(args.dir, generacion))
+            print(
+                f"Generación {generacion} publicada en {args.dir} "
+                f"({tamano / 1e6:.1f} MB, {(time.perf_counter() - t0) * 1000:.0f} ms)",
+                flush=True,
+            )
+        if args.vigilar_s <= 0:
+            break
+        time.sleep(args.vigilar_s)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Distribución del NutrIA Score y de cada nutriente, global y por categoría.
+
+Se calcula una vez al cargar el dataset: por columna, los valores ordenados
+de todo el dataset y, en un segundo arreglo, ordenados dentro de cada
+categoría (categorías contiguas, con sus offsets), más las medias. Con eso
+el percentil y el lugar de un alimento salen de dos búsquedas binarias
+(O(log n)), sin recorrer el df en cada consulta.
+
+- percentil: % de alimentos con menor valor (los empates cuentan la mitad);
+- rank: 1 = mayor valor (para el NutrIA Score, el mejor); los empates
+  comparten lugar.
+
+Son solo arreglos de numpy, de modo que se publican tal cual en la memoria
+compartida (ver dataset_compartido.py).
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class Distribuciones:
+    def __init__(self, categorias: List[str], arreglos: Dict[str, np.ndarray]) -> None:
+        self.categorias = list(categorias)
+        self._posicion_categoria = {c: i for i, c in enumerate(self.categorias)}
+        self.inicio = arreglos["inicio"]
+        self.columnas = [n[: -len(".global")] for n in arreglos if n.endswith(".global")]
+        self._arreglos = arreglos
+
+    @classmethod
+    def calcular(cls, data, columnas: List[str]) -> "Distribuciones":
+        """
+        A partir del df (columna `categoria` + `columnas` numéricas).
+        """
+        categorias = sorted(data["categoria"].astype(str).unique())
+        codigos = np.searchsorted(categorias, data["categoria"].astype(str).to_numpy())
+        orden = np.argsort(codigos, kind="stable")
+        conteos = np.bincount(codigos, minlength=len(categorias))
+        inicio = np.zeros(len(categorias) + 1, dtype=np.int64)
+        np.cumsum(conteos, out=inicio[1:])
+
+        arreglos = {"inicio": inicio}
+        for col in columnas:
+            valores = data[col].to_numpy(dtype=np.float64)
+            por_categoria = valores[orden]
+            medias = np.empty(len(categorias) + 1)
+            for i in range(len(categorias)):
+                segmento = por_categoria[inicio[i]:inicio[i + 1]]
+                segmento.sort()
+                medias[i] = segmento.mean() if len(segmento) else np.nan
+            medias[-1] = valores.mean() if len(valores) else np.nan
+            arreglos[f"{col}.global"] = np.sort(valores)
+            arreglos[f"{col}.categorias"] = por_categoria
+            arreglos[f"{col}.medias"] = medias
+        return cls(categorias, arreglos)
+
+    def arreglos(self) -> Dict[str, np.ndarray]:
+        return dict(self._arreglos)
+
+    def _segmento(self, columna: str, categoria: Optional[str]) -> np.ndarray:
+        if categoria is None:
+            return self._arreglos[f"{columna}.global"]
+        i = self._posicion_categoria[categoria]
+        return self._arreglos[f"{columna}.categorias"][self.inicio[i]:self.inicio[i + 1]]
+
+    def posicion(self, columna: str, valor: float, categoria: Optional[str] = None) -> dict:
+        """
+        {"percentil", "rank", "n"} de `valor` en la categoría (o global).
+        """
+        ordenados = self._segmento(columna, categoria)
+        n = len(ordenados)
+        menores = int(np.searchsorted(ordenados, valor, side="left"))
+        hasta = int(np.searchsorted(ordenados, valor, side="right"))
+        return {
+            "percentil": round(100.0 * (menores + 0.5 * (hasta - menores)) / n, 1) if n else None,
+            "rank": n - hasta + 1,
+            "n": n,
+        }
+
+    def media(self, columna: str, categoria: Optional[str] = None) -> float:
+        i = -1 if categoria is None else self._posicion_categoria[categoria]
+        return float(self._arreglos[f"{columna}.medias"][i])
+
+    def comparativa(self, fila) -> dict:
+        """
+        Contexto comparativo de un alimento (fila del df) para las tools:
+        lugar del NutrIA Score en su categoría y global, percentil de cada
+        columna dentro de la categoría y medias de la categoría.
+        """
+        categoria = str(fila["categoria"])
+        if categoria not in self._posicion_categoria:
+            return {}
+        score = self.posicion("nutria_score", float(fila["nutria_score"]), categoria)
+        global_ = self.posicion("nutria_score", float(fila["nutria_score"]))
+        return {
+            "n_categoria": score["n"],
+            "rank_categoria": score["rank"],
+            "rank_global": global_["rank"],
+            "percentil_global": global_["percentil"],
+            "percentil_categoria": {
+                col: self.posicion(col, float(fila[col]), categoria)["percentil"]
+                for col in self.columnas
+            },
+            "media_categoria": {col: round(self.media(col, categoria), 2) for col in self.columnas},
+        }
+
+    def lugar_en_categoria(self, categoria: str, score: float) -> dict:
+        """
+        Versión corta para listas (recomendaciones): rank y percentil del
+        NutrIA Score dentro de la categoría.
+        """
+        if categoria not in self._posicion_categoria:
+            return {}
+        pos = self.posicion("nutria_score", score, categoria)
+        return {"rank_categoria": pos["rank"], "n_categoria": pos["n"], "percentil_categoria": pos["percentil"]}
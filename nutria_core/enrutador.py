@@ -0,0 +1,453 @@
+"""
+Enrutador local de intenciones delante de ChatEngine.chat.
+
+Buena parte del tráfico son consultas simples que el dataset y
+`generar_plan_nutricional` resuelven de forma determinista:
+
+- "¿Cuántas calorías tiene la manzana?"          → intención "nutriente"
+- "Calcula mi TMB: hombre, 30 años, 80 kg, 180 cm" → intención "tmb"
+
+Para esas se extraen los slots con expresiones regulares (y el detector
+de alimentos del prefetch) y se responde con una plantilla en español,
+sin llamar al LLM. Todo lo demás ("otro") sigue al modelo, igual que las
+preguntas por un alimento ambiguo ("huevo": varios en el dataset y
+ninguno se llama exactamente así) y las que traen algo más que la
+pregunta: negaciones, condiciones ("si tengo diabetes"), otros pedidos
+("dime una receta") o texto que la plantilla ignoraría.
+
+Opcionalmente, un clasificador pequeño de scikit-learn entrenado offline
+con consultas etiquetadas confirma la intención: si no la respalda con
+probabilidad suficiente, la consulta también va al LLM.
+
+Entrenar el clasificador:
+    python -m nutria_core.enrutador --datos consultas.jsonl --salida intenciones.pkl
+
+donde cada línea es {"texto": "...", "intencion": "nutriente" | "tmb" | "otro"}.
+Para etiquetar consultas reales, exportar los mensajes de usuario del
+ConversationStore con la intención que proponen las reglas y revisarlos:
+    python -m nutria_core.enrutador --exportar-sqlite conversaciones.sqlite --salida consultas.jsonl
+"""
+
+import argparse
+import json
+import math
+import pickle
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .data_processing import foodinfo_score_json
+from .especulacion import DetectorAlimentos, detector_global, normalizar
+from .nutritional_plan import DatosPaciente, generar_plan_nutricional
+
+INTENCIONES = ("nutriente", "tmb", "otro")
+
+
+@dataclass
+class Intencion:
+    nombre: str
+    slots: Dict[str, object] = field(default_factory=dict)
+    confianza: float = 0.0
+    respuesta: Optional[str] = None  # None → pasar al LLM
+
+
+# =========================================================
+# Patrones y slots (sobre texto normalizado: minúsculas, sin acentos)
+# =========================================================
+
+# palabra del usuario → (columna, etiqueta, unidad, factor)
+NUTRIENTES = {
+    "calorias": ("energia_kcal", "energía", "kcal", 1),
+    "kcal": ("energia_kcal", "energía", "kcal", 1),
+    "energia": ("energia_kcal", "energía", "kcal", 1),
+    "proteina": ("proteina_g", "proteína", "g", 1),
+    "proteinas": ("proteina_g", "proteína", "g", 1),
+    "grasa": ("lipidos_g", "grasa", "g", 1),
+    "grasas": ("lipidos_g", "grasa", "g", 1),
+    "lipidos": ("lipidos_g", "grasa", "g", 1),
+    "carbohidratos": ("hidratos_carbono_g", "carbohidratos", "g", 1),
+    "hidratos": ("hidratos_carbono_g", "carbohidratos", "g", 1),
+    "azucar": ("azucar_g", "azúcar", "g", 1),
+    "azucares": ("azucar_g", "azúcar", "g", 1),
+    "fibra": ("fibra_g", "fibra", "g", 1),
+    "sodio": ("sodio_g", "sodio", "mg", 1000),
+}
+
+_RE_NUTRIENTE = re.compile(r"\b(" + "|".join(NUTRIENTES) + r")\b")
+_RE_PREGUNTA_CANTIDAD = re.compile(
+    r"\b(cuant[ao]s?|que tant[ao]s?|aporta|contiene|tiene|informacion nutricional)\b"
+    r"|\b(" + "|".join(NUTRIENTES) + r") (de|del|en)\b"  # "calorías del plátano"
+)
+# Comparaciones, consejos o dudas abiertas: mejor que responda el modelo
+_RE_ABIERTA = re.compile(
+    r"\b(mas|menos|mejor|peor|comparad[oa]|vs|versus|o|engorda|bueno|buena|"
+    r"recomiend\w*|sustitu\w*|deberia|puedo|dieta|plan)\b"
+)
+# Negaciones, condiciones, salud y pedidos extra: la plantilla no los atiende
+_RE_CONTEXTO = re.compile(
+    r"\b(no|nunca|si|sin|diabet\w*|hipertens\w*|presion|colesterol|triglicerid\w*|"
+    r"embaraz\w*|lactan\w*|renal|rinon\w*|alergi\w*|intoleran\w*|celiac\w*|gastritis|"
+    r"enferm\w*|receta\w*|menu|debo|bajar|subir|perder|ganar|adelgazar|objetivo)\b"
+)
+
+_RE_TMB = re.compile(r"\b(tmb|metabolismo basal|tasa metabolica(?: basal)?)\b")
+_RE_SEXO = re.compile(r"\b(hombre|mujer|masculino|femenino|varon)\b")
+_RE_EDAD = re.compile(r"\b(\d{1,3})\s*(?:anos|ano)\b")
+_RE_PESO = re.compile(r"\b(\d{2,3}(?:[.,]\d+)?)\s*(?:kg|kilos?|kilogramos?)\b")
+_RE_ESTATURA_CM = re.compile(r"\b(\d{3}(?:[.,]\d+)?)\s*(?:cm|centimetros?)\b")
+_RE_ESTATURA_M = re.compile(r"\b([12][.,]\d{1,2})\s*(?:m|mts?|metros?)\b")
+_RE_ACTIVIDAD = re.compile(r"\b(sedentari[oa]|ligero|ligera|moderad[oa]|alto|alta|atleta)\b")
+
+_SEXO = {"hombre": "hombre", "masculino": "hombre", "varon": "hombre", "mujer": "mujer", "femenino": "mujer"}
+_ACTIVIDAD = {
+    "sedentario": "sedentario", "sedentaria": "sedentario",
+    "ligero": "ligero", "ligera": "ligero",
+    "moderado": "moderado", "moderada": "moderado",
+    "alto": "alto", "alta": "alto",
+    "atleta": "atleta",
+}
+
+MAX_CARACTERES = 160  # mensajes largos suelen traer contexto que la plantilla ignoraría
+
+# Palabras propias de las preguntas simples; lo demás (fuera de slots,
+# alimento y nutrientes) es contexto que la plantilla ignoraría
+_PALABRAS_CONSULTA = {
+    "a", "al", "de", "del", "el", "en", "la", "las", "lo", "los", "un", "una", "unos", "unas", "y",
+    "cuanto", "cuanta", "cuantos", "cuantas", "que", "tanto", "tanta", "tantos", "tantas",
+    "tiene", "tienen", "aporta", "aportan", "contiene", "contienen", "hay",
+    "informacion", "nutricional", "me", "mi", "dime", "dame", "quiero", "saber",
+    "cual", "es", "calcula", "calcular", "soy", "tengo", "peso", "mido", "actividad",
+}
+_RE_PALABRA = re.compile(r"\w+")
+_RE_SLOTS_TMB = (_RE_TMB, _RE_SEXO, _RE_EDAD, _RE_PESO, _RE_ESTATURA_CM, _RE_ESTATURA_M, _RE_ACTIVIDAD)
+MAX_RESIDUO = 1  # palabras sueltas toleradas ("porfa", "hola")
+
+
+def _numero(texto: str) -> float:
+    return float(texto.replace(",", "."))
+
+
+def _residuo(texto: str, conocidas=(), patrones=()) -> List[str]:
+    """
+    Palabras de `texto` que no son de la pregunta simple: ni de los
+    patrones de slots, ni `conocidas` (alimento, nutrientes), ni de
+    _PALABRAS_CONSULTA.
+    """
+    for patron in patrones:
+        texto = patron.sub(" ", texto)
+    return [
+        p for p in _RE_PALABRA.findall(texto)
+        if p not in _PALABRAS_CONSULTA and p not in conocidas
+    ]
+
+
+def _simple(texto: str, conocidas=(), patrones=()) -> bool:
+    return (
+        not _RE_ABIERTA.search(texto)
+        and not _RE_CONTEXTO.search(texto)
+        and len(_residuo(texto, conocidas, patrones)) <= MAX_RESIDUO
+    )
+
+
+def _slots_tmb(texto: str) -> Dict[str, object]:
+    slots: Dict[str, object] = {}
+    if m := _RE_SEXO.search(texto):
+        slots["sexo"] = _SEXO[m.group(1)]
+    if m := _RE_EDAD.search(texto):
+        slots["edad"] = int(m.group(1))
+    if m := _RE_PESO.search(texto):
+        slots["peso_kg"] = _numero(m.group(1))
+    if m := _RE_ESTATURA_CM.search(texto):
+        slots["estatura_cm"] = _numero(m.group(1))
+    elif m := _RE_ESTATURA_M.search(texto):
+        slots["estatura_cm"] = round(_numero(m.group(1)) * 100, 1)
+    if m := _RE_ACTIVIDAD.search(texto):
+        slots["nivel_actividad"] = _ACTIVIDAD[m.group(1)]
+    return slots
+
+
+# =========================================================
+# Plantillas
+# =========================================================
+
+def _fmt(valor: float) -> str:
+    return f"{valor:.1f}".rstrip("0").rstrip(".")
+
+
+def _fmt_cantidad(valor: float) -> str:
+    # Porciones como 0.25 taza o 0.33 pieza: un decimal no alcanza
+    return f"{valor:.2f}".rstrip("0").rstrip(".")
+
+
+def responder_nutriente(fila: int, columnas: List[tuple], generacion: Optional[int] = None) -> str:
+    info = json.loads(foodinfo_score_json(fila, generacion))
+    porcion = f"{_fmt_cantidad(info['cantidad'])} {info['medida']}" if info.get("medida") else "una porción"
+    partes = [
+        f"**{_fmt(info[col] * factor)} {unidad}** de {etiqueta}"
+        for col, etiqueta, unidad, factor in columnas
+    ]
+    detalle = partes[0] if len(partes) == 1 else ", ".join(partes[:-1]) + " y " + partes[-1]
+    return (
+        f"🍽️ **{info['alimento']}** ({porcion}) aporta {detalle}.\n\n"
+        f"Su NutrIA Score es de **{_fmt(info['nutria_score'])}/100**."
+    )
+
+
+def responder_tmb(slots: Dict[str, object]) -> str:
+    datos = DatosPaciente(
+        sexo=slots["sexo"],
+        edad=slots["edad"],
+        peso_kg=slots["peso_kg"],
+        estatura_cm=slots["estatura_cm"],
+        nivel_actividad=slots.get("nivel_actividad", "sedentario"),
+        objetivo="mantener",
+    )
+    plan = generar_plan_nutricional(datos)
+    texto = (
+        f"🔥 Con tus datos ({datos.sexo}, {datos.edad} años, {_fmt(datos.peso_kg)} kg, "
+        f"{_fmt(datos.estatura_cm)} cm) tu **TMB** estimada con Mifflin-St Jeor es de "
+        f"**{_fmt(plan.tmb)} kcal/día**."
+    )
+    if "nivel_actividad" in slots:
+        texto += (
+            f"\n\nCon actividad **{datos.nivel_actividad}**, tu gasto total (TDEE) ronda "
+            f"**{_fmt(plan.tdee)} kcal/día**."
+        )
+    return texto + "\n\nSi me dices tu objetivo, te armo un plan con macronutrientes."
+
+
+# =========================================================
+# Clasificador compilado
+# =========================================================
+
+class ClasificadorCompilado:
+    """
+    Misma predicción que el pipeline TF-IDF + regresión logística, sin
+    matrices dispersas: n-grama → (idf, pesos por clase) en un dict.
+    El pipeline de scikit-learn tarda ~0.8 ms por mensaje; esto, decenas
+    de microsegundos.
+    """
+
+    def __init__(self, modelo) -> None:
+        vectorizador, regresion = modelo.steps[0][1], modelo.steps[-1][1]
+        self.analizador = vectorizador.build_analyzer()
+        self.sublineal = vectorizador.sublinear_tf
+        self.classes_ = [str(c) for c in regresion.classes_]
+        idf = vectorizador.idf_
+        coef = regresion.coef_
+        binario = coef.shape[0] == 1  # con 2 clases sklearn guarda un solo vector
+        self.sesgo = [float(b) for b in regresion.intercept_]
+        self.pesos = {
+            ngrama: (float(idf[j]), [float(w) for w in coef[:, j]])
+            for ngrama, j in vectorizador.vocabulary_.items()
+        }
+        self.binario = binario
+
+    def predict_proba(self, textos: List[str]) -> List[List[float]]:
+        return [self._proba(t) for t in textos]
+
+    def _proba(self, texto: str) -> List[float]:
+        conteos: Dict[str, int] = {}
+        for ngrama in self.analizador(texto):
+            if ngrama in self.pesos:
+                conteos[ngrama] = conteos.get(ngrama, 0) + 1
+
+        valores = []
+        for ngrama, n in conteos.items():
+            tf = 1.0 + math.log(n) if self.sublineal else float(n)
+            valores.append((ngrama, tf * self.pesos[ngrama][0]))
+        norma = math.sqrt(sum(v * v for _, v in valores)) or 1.0
+
+        z = list(self.sesgo)
+        for ngrama, v in valores:
+            for c, w in enumerate(self.pesos[ngrama][1]):
+                z[c] += w * v / norma
+
+        if self.binario:
+            p = 1.0 / (1.0 + math.exp(-z[0]))
+            return [1.0 - p, p]
+        maximo = max(z)
+        exps = [math.exp(x - maximo) for x in z]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+
+# =========================================================
+# Enrutador
+# =========================================================
+
+class EnrutadorIntenciones:
+    """
+    Reglas + slots y, si se carga, un clasificador que confirma la intención.
+    """
+
+    def __init__(self, clasificador=None, umbral: float = 0.7) -> None:
+        self.clasificador = ClasificadorCompilado(clasificador) if clasificador is not None else None
+        self.umbral = umbral
+        detector_global()  # construirlo ahora y no en la primera consulta
+
+    @property
+    def detector(self) -> DetectorAlimentos:
+        # El de la generación vigente del dataset (cambia tras una recarga)
+        return detector_global()
+
+    @classmethod
+    def desde_archivo(cls, ruta: Optional[str], umbral: float = 0.7) -> "EnrutadorIntenciones":
+        """
+        Carga el clasificador entrenado offline si existe la ruta.
+        """
+        clasificador = None
+        if ruta:
+            with open(ruta, "rb") as f:
+                clasificador = pickle.load(f)
+        return cls(clasificador, umbral)
+
+    def clasificar(self, mensaje: str) -> Intencion:
+        """
+        Reglas, slots y confirmación del clasificador (sin tocar el
+        dataset). Es la parte que debe tardar menos de un milisegundo.
+        """
+        intencion = self._reglas(mensaje)
+        if intencion.confianza >= 1.0 and not self._confirmar(mensaje, intencion):
+            intencion.confianza = 0.0
+        return intencion
+
+    def _reglas(self, mensaje: str) -> Intencion:
+        texto = normalizar(mensaje)
+        if len(texto) > MAX_CARACTERES:
+            return Intencion("otro")
+
+        if _RE_TMB.search(texto):
+            slots = _slots_tmb(texto)
+            completos = all(k in slots for k in ("sexo", "edad", "peso_kg", "estatura_cm"))
+            simple = _simple(texto, patrones=_RE_SLOTS_TMB)
+            return Intencion("tmb", slots, 1.0 if completos and simple else 0.0)
+
+        nutrientes = _RE_NUTRIENTE.findall(texto)
+        if nutrientes and _RE_PREGUNTA_CANTIDAD.search(texto) and not _RE_ABIERTA.search(texto):
+            detector = self.detector
+            claves = detector.claves(mensaje, max_alimentos=2)
+            columnas = list(dict.fromkeys(NUTRIENTES[n] for n in nutrientes))
+            slots = {
+                "alimentos": [detector.indice[c] for c in claves],
+                "filas": [detector.filas[c] for c in claves],
+                "nutrientes": columnas,
+                "generacion": detector.generacion,
+            }
+            conocidas = set(NUTRIENTES).union(*(c.split() for c in claves))
+            if len(claves) != 1 or not _simple(texto, conocidas):
+                confianza = 0.0
+            elif detector.resuelta(claves[0]):
+                confianza = 1.0
+            else:
+                # "huevo" → varios alimentos y ninguno se llama así: que elija el modelo
+                confianza = 0.5
+            return Intencion("nutriente", slots, confianza)
+
+        return Intencion("otro")
+
+    def _confirmar(self, mensaje: str, intencion: Intencion) -> bool:
+        if self.clasificador is None:
+            return True
+        probas = self.clasificador.predict_proba([normalizar(mensaje)])[0]
+        clases = self.clasificador.classes_
+        if intencion.nombre not in clases:
+            return False
+        return probas[clases.index(intencion.nombre)] >= self.umbral
+
+    def enrutar(self, mensaje: str) -> Intencion:
+        """
+        Clasifica y, si la intención es simple y de alta confianza,
+        genera la respuesta con plantilla. `respuesta=None` → usar el LLM.
+        """
+        intencion = self.clasificar(mensaje)
+        if intencion.nombre == "otro" or intencion.confianza < 1.0:
+            return intencion
+
+        try:
+            if intencion.nombre == "nutriente":
+                intencion.respuesta = responder_nutriente(
+                    intencion.slots["filas"][0], intencion.slots["nutrientes"],
+                    intencion.slots["generacion"],
+                )
+            elif intencion.nombre == "tmb":
+                intencion.respuesta = responder_tmb(intencion.slots)
+        except Exception:
+            intencion.respuesta = None  # datos raros: que lo resuelva el modelo
+        return intencion
+
+
+# =========================================================
+# Entrenamiento offline del clasificador
+# =========================================================
+
+def leer_consultas(ruta: str) -> List[dict]:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def entrenar_clasificador(consultas: List[dict]):
+    """
+    TF-IDF de n-gramas de caracteres + regresión logística. Pequeño y
+    tolerante a faltas de ortografía; se entrena en segundos.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    modelo = make_pipeline(
+        TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), min_df=1, sublinear_tf=True),
+        LogisticRegression(max_iter=1000, C=10.0),
+    )
+    modelo.fit(
+        [normalizar(c["texto"]) for c in consultas],
+        [c["intencion"] for c in consultas],
+    )
+    return modelo
+
+
+def exportar_consultas(ruta_db: str, ruta_salida: str) -> int:
+    """
+    Escribe los mensajes de usuario registrados (sin repetir) como JSONL,
+    con la intención propuesta por las reglas para revisarla a mano.
+    """
+    enrutador = EnrutadorIntenciones()
+    conn = sqlite3.connect(ruta_db)
+    try:
+        filas = conn.execute(
+            "SELECT DISTINCT content FROM mensajes WHERE role = 'user'"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    with open(ruta_salida, "w", encoding="utf-8") as f:
+        for (texto,) in filas:
+            intencion = enrutador.clasificar(texto)
+            nombre = intencion.nombre if intencion.confianza >= 1.0 else "otro"
+            f.write(json.dumps({"texto": texto, "intencion": nombre}, ensure_ascii=False) + "\n")
+    return len(filas)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Entrena el clasificador de intenciones.")
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument("--datos", help="JSONL con texto e intencion.")
+    origen.add_argument("--exportar-sqlite", help="Exportar consultas del ConversationStore.")
+    parser.add_argument("--salida", default="intenciones.pkl")
+    args = parser.parse_args()
+
+    if args.exportar_sqlite:
+        n = exportar_consultas(args.exportar_sqlite, args.salida)
+        print(f"{n} consultas exportadas → {args.salida} (revisar la columna intencion)")
+        return
+
+    consultas = [c for c in leer_consultas(args.datos) if c.get("intencion") in INTENCIONES]
+    modelo = entrenar_clasificador(consultas)
+    with open(args.salida, "wb") as f:
+        pickle.dump(modelo, f)
+    print(f"Clasificador entrenado con {len(consultas)} consultas → {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Detección local de alimentos para adelantar `get_food_info`.
+
+En la mayoría de las preguntas sobre un alimento, la primera llamada al
+modelo solo sirve para pedir `get_food_info(nombre_alimento=...)`. Aquí se
+detectan en el mensaje del usuario nombres del dataset (columna
+`alimento`) y se ejecuta la tool antes de llamar al modelo; los resultados
+se adjuntan como si el modelo ya la hubiera pedido, de modo que casi
+siempre puede responder en una sola llamada.
+
+El detector es un índice de frases normalizadas (minúsculas y sin
+acentos) con los prefijos de 1 a 3 palabras de cada nombre; el mensaje se
+recorre una vez buscando la coincidencia más larga en cada posición.
+"""
+
+import json
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+from .food_tools import get_food_info
+
+_PALABRA = re.compile(r"\w+")
+
+# Palabras que no deben iniciar ni cerrar una frase del índice
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "los",
+    "para", "por", "sin", "tipo", "y",
+    # Primeras palabras del dataset que también son palabras comunes
+    "base", "diet", "hot", "m", "mini", "pop", "red", "t", "te",
+    # Nutrientes: aparecen en las preguntas, no son el alimento buscado
+    "azucar", "calcio", "calorias", "carbohidratos", "energia", "fibra",
+    "grasa", "grasas", "hierro", "proteina", "proteinas", "sodio", "vitamina",
+}
+
+MAX_PALABRAS = 3
+
+# Fila de una frase que coincide con varios alimentos sin que ninguno se
+# llame exactamente así ("huevo" → "Huevo de iguana", "Huevo de tortuga"…)
+AMBIGUA = -1
+
+
+def normalizar(texto: str) -> str:
+    """
+    Minúsculas y sin acentos ("Plátano" → "platano").
+    """
+    descompuesto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in descompuesto if unicodedata.category(c) != "Mn")
+
+
+# =========================================================
+# Detector
+# =========================================================
+
+class DetectorAlimentos:
+    """
+    Índice frase normalizada → texto original del dataset.
+
+    Cada frase se resuelve a una fila: la del alimento que se llama
+    exactamente así ("manzana" → "Manzana", aunque haya "Manzana roja") o,
+    si no lo hay, la única cuyo nombre empieza con la frase. Si varias
+    empiezan con la frase y ninguna se llama así, la fila es AMBIGUA y el
+    texto es la frase tal cual aparece en el dataset.
+
+    Para las frases resueltas el texto es el nombre completo de la fila:
+    es el que se pasa a `get_food_info` (que prefiere la coincidencia
+    exacta), así el prefetch devuelve la misma fila que el enrutador.
+
+    `generacion` es la del dataset sobre el que se construyó (las filas
+    solo valen para esa generación).
+    """
+
+    def __init__(self, nombres: Iterable[str], generacion: int = 0) -> None:
+        self.generacion = generacion
+        self.indice: Dict[str, str] = {}
+        self.filas: Dict[str, int] = {}
+        exactas: Dict[str, int] = {}
+        candidatas: Dict[str, int] = {}  # frase → filas cuyo nombre empieza con ella
+        nombres = [str(n) for n in nombres]
+        for fila, nombre in enumerate(nombres):
+            tokens = list(_PALABRA.finditer(nombre))
+            for n in range(1, min(MAX_PALABRAS, len(tokens)) + 1):
+                primero, ultimo = tokens[0], tokens[n - 1]
+                if normalizar(ultimo.group()) in STOPWORDS:
+                    continue
+                clave = " ".join(normalizar(t.group()) for t in tokens[:n])
+                if clave in STOPWORDS or len(clave) < 3:
+                    continue
+                self.indice.setdefault(clave, nombre[primero.start():ultimo.end()])
+                self.filas.setdefault(clave, fila)
+                candidatas[clave] = candidatas.get(clave, 0) + 1
+                if n == len(tokens):
+                    exactas.setdefault(clave, fila)  # la primera, como buscar_alimento_por_nombre
+
+        for clave, n in candidatas.items():
+            fila = exactas.get(clave, self.filas[clave] if n == 1 else AMBIGUA)
+            self.filas[clave] = fila
+            if fila != AMBIGUA:
+                self.indice[clave] = nombres[fila]
+
+    def resuelta(self, clave: str) -> bool:
+        """
+        La frase corresponde a un solo alimento (no AMBIGUA).
+        """
+        return self.filas[clave] != AMBIGUA
+
+    @classmethod
+    def desde_indice(
+        cls, indice: Mapping[str, str], filas: Mapping[str, int], generacion: int
+    ) -> "DetectorAlimentos":
+        """
+        Detector sobre un índice ya construido (el de la memoria compartida).
+        """
+        detector = cls((), generacion)
+        detector.indice, detector.filas = indice, filas
+        return detector
+
+    def claves(self, texto: str, max_alimentos: int = 3) -> List[str]:
+        """
+        Frases del índice mencionadas en `texto` (sin repetir, en orden
+        de aparición), prefiriendo la coincidencia más larga.
+        """
+        palabras = _PALABRA.findall(normalizar(texto))
+        encontradas: List[str] = []
+        i = 0
+        while i < len(palabras) and len(encontradas) < max_alimentos:
+            for n in range(min(MAX_PALABRAS, len(palabras) - i), 0, -1):
+                clave = " ".join(palabras[i:i + n])
+                if clave in self.indice:
+                    if clave not in encontradas:
+                        encontradas.append(clave)
+                    i += n
+                    break
+            else:
+                i += 1
+        return encontradas
+
+    def detectar(self, texto: str, max_alimentos: int = 3) -> List[str]:
+        """
+        Nombres completos de los alimentos mencionados en `texto`, sin las
+        frases ambiguas (se dejan al modelo).
+        """
+        return list(
+            dict.fromkeys(
+                self.indice[c] for c in self.claves(texto, max_alimentos) if self.resuelta(c)
+            )
+        )
+
+
+_detector = None
+_lock = threading.Lock()
+
+
+def detector_global() -> DetectorAlimentos:
+    """
+    Detector de la Vista vigente del dataset: se construye una vez por
+    generación, o se toma tal cual de la memoria compartida.
+    """
+    global _detector
+    from .data_processing import vista
+
+    datos = vista()
+    with _lock:
+        if _detector is None or _detector.generacion != datos.generacion:
+            if datos.compartido is not None:
+                _detector = DetectorAlimentos.desde_indice(
+                    *datos.compartido.indice_nombres(), generacion=datos.generacion
+                )
+            else:
+                _detector = DetectorAlimentos(datos.df["alimento"], datos.generacion)
+        return _detector
+
+
+# =========================================================
+# Prefetch
+# =========================================================
+
+def prefetch_mensajes(nombres: List[str]) -> Tuple[List[dict], List[str]]:
+    """
+    Ejecuta `get_food_info` para cada nombre y arma los mensajes
+    (assistant con tool_calls + resultados con rol "tool") a añadir antes
+    de la primera llamada. Los nombres sin resultado no se adjuntan.
+
+    Devuelve (mensajes, nombres_adjuntados).
+    """
+    calls, resultados, adjuntados = [], [], []
+    for i, nombre in enumerate(nombres):
+        try:
+            resultado = get_food_info(nombre)
+        except Exception:
+            continue
+        if '"error"' in resultado[:12]:
+            continue
+
+        call_id = f"prefetch_{i}"
+        calls.append(
+            {
+                "id": call_id,
+                "type": "function",
+                "function": {
+                    "name": "get_food_info",
+                    "arguments": json.dumps({"nombre_alimento": nombre}, ensure_ascii=False),
+                },
+            }
+        )
+        resultados.append(
+            {"role": "tool", "tool_call_id": call_id, "name": "get_food_info", "content": resultado}
+        )
+        adjuntados.append(nombre)
+
+    if not calls:
+        return [], []
+    return [{"role": "assistant", "content": None, "tool_calls": calls}, *resultados], adjuntados
@@ -0,0 +1,501 @@
+"""
+Servidor local que imita la API de OpenAI para pruebas de carga sin red.
+
+Implementa lo mínimo que usa NutrIA:
+
+- POST /v1/chat/completions      (con tools, con stream=True y con
+  response_format=json_object para la ingesta del SMAE)
+- POST /v1/audio/transcriptions  (el texto va incrustado en el audio
+  de prueba, ver `audio_de_prueba`)
+- POST /v1/audio/speech          (bytes "MP3" proporcionales al texto)
+
+La latencia de cada endpoint sigue una distribución configurable
+(--latencia-chat, --latencia-transcripcion, --latencia-tts), p. ej.
+"const:300", "uniforme:100:500", "normal:300:50" o "lognormal:300:0.5"
+(mediana en ms y sigma).
+
+Con --tasa-error se responde 500/429 a una fracción de las peticiones,
+para probar reintentos. Con --tasa-lenta una fracción de las respuestas
+tarda --latencia-lenta-ms (cola lenta, para probar timeouts y hedging).
+Con --max-concurrencia se simula el límite de peticiones simultáneas del
+proveedor: lo que lo excede recibe 429.
+GET /_stats devuelve contadores (peticiones por endpoint, tools pedidas,
+429, pico de concurrencia, tokens de prompt recibidos). El `usage` de cada
+respuesta trae los prompt_tokens contados con contabilidad_prompt.
+
+Uso:
+    python -m nutria_core.fake_openai --port 8700 --latencia-ms 300
+
+Y luego apuntar el cliente con base_url="http://127.0.0.1:8700/v1".
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Union
+
+from .contabilidad_prompt import TOKENS_RESPUESTA, medir_prompt
+
+# Marca con la que el audio de prueba lleva su "transcripción"
+MARCA_AUDIO = b"NUTRIA-TEXTO:"
+BYTES_AUDIO_POR_CARACTER = 1000  # ~ MP3 de voz a 128 kbps
+
+
+# =========================================================
+# Distribuciones de latencia
+# =========================================================
+
+class DistribucionLatencia:
+    """
+    Latencia simulada a partir de una especificación de texto:
+
+    - "const:300"           → siempre 300 ms
+    - "uniforme:100:500"    → uniforme entre 100 y 500 ms
+    - "normal:300:50"       → media 300 ms, desviación 50 ms (mínimo 0)
+    - "lognormal:300:0.5"   → mediana 300 ms, sigma 0.5 (cola larga)
+    """
+
+    TIPOS = {"const": 1, "uniforme": 2, "normal": 2, "lognormal": 2}
+
+    def __init__(self, spec: str) -> None:
+        tipo, *params = spec.split(":")
+        if tipo not in self.TIPOS or len(params) != self.TIPOS[tipo]:
+            raise ValueError(f"Distribución de latencia inválida: {spec!r}")
+        self.spec = spec
+        self.tipo = tipo
+        self.params = [float(p) for p in params]
+
+    def muestrear(self, rng: random.Random) -> float:
+        """
+        Segundos de espera para una petición.
+        """
+        p = self.params
+        if self.tipo == "const":
+            ms = p[0]
+        elif self.tipo == "uniforme":
+            ms = rng.uniform(p[0], p[1])
+        elif self.tipo == "normal":
+            ms = rng.gauss(p[0], p[1])
+        else:
+            ms = rng.lognormvariate(math.log(max(p[0], 1e-3)), p[1])
+        return max(0.0, ms) / 1000.0
+
+
+def audio_de_prueba(texto: str, relleno_bytes: int = 32000) -> bytes:
+    """
+    "Grabación" para pruebas: cabecera WAV, la marca con el texto que el
+    servidor falso devolverá como transcripción y relleno para que el
+    tamaño de la subida sea realista.
+    """
+    return b"RIFF\x00\x00\x00\x00WAVE" + MARCA_AUDIO + texto.encode("utf-8") + b"\x00" * (relleno_bytes + 1)
+
+
+# =========================================================
+# Lógica "del modelo"
+# =========================================================
+
+def _ultimo_mensaje_usuario(messages: List[dict]) -> str:
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            return str(m.get("content") or "")
+    return ""
+
+
+def decidir_tool_call(messages: List[dict]) -> Optional[dict]:
+    """
+    Decide de forma determinista qué tool "pediría" el modelo.
+
+    - "plan"        → generar_plan_nutricional con datos fijos
+    - "recomienda"  → get_nutrition_recommendations
+    - cualquier otra cosa → get_food_info con la última palabra del mensaje
+    """
+    texto = _ultimo_mensaje_usuario(messages).lower()
+
+    if "plan" in texto:
+        return {
+            "name": "generar_plan_nutricional",
+            "arguments": {
+                "sexo": "hombre",
+                "edad": 30,
+                "peso_kg": 80,
+                "estatura_cm": 180,
+                "nivel_actividad": "moderado",
+                "objetivo": "mantener",
+            },
+        }
+
+    if "recomienda" in texto:
+        return {
+            "name": "get_nutrition_recommendations",
+            "arguments": {"objetivo": "subir proteína", "top_k": 5},
+        }
+
+    palabras = [p.strip("¿?¡!.,") for p in texto.split()]
+    palabras = [p for p in palabras if p]
+    nombre = palabras[-1] if palabras else "manzana"
+    return {"name": "get_food_info", "arguments": {"nombre_alimento": nombre}}
+
+
+def generar_tabla_smae(messages: List[dict]) -> dict:
+    """
+    Tabla SMAE simulada y determinista: depende solo del contenido enviado
+    (la imagen en base64), igual que lo haría una extracción real.
+    """
+    digest = hashlib.sha256(
+        json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    n = int(digest[:6], 16)
+    return {
+        "categoria": ["verduras", "frutas", "cereales sin grasa", "leguminosas"][n % 4],
+        "alimentos": [
+            {
+                "alimento": f"Alimento {digest[:6]} {i}",
+                "unidad": ["1/2 taza", "1 pieza", "30 g"][(n + i) % 3],
+                "peso_neto_g": 50 + (n + i) % 100,
+                "energia_kcal": 20 + (n * (i + 1)) % 300,
+                "proteina_g": (n + i) % 20,
+                "lipidos_g": (n + 2 * i) % 15,
+                "hidratos_carbono_g": (n + 3 * i) % 40,
+                "fibra_g": (n + i) % 7,
+                "azucar_g": "ND",
+                "sodio_mg": (n + i) % 500,
+            }
+            for i in range(3)
+        ],
+    }
+
+
+def generar_respuesta(
+    messages: List[dict], tools: Optional[list], response_format: Optional[dict] = None
+) -> dict:
+    """
+    Devuelve el `message` del assistant: una tool-call si hay tools y el
+    último mensaje es del usuario; texto plano en cualquier otro caso.
+    """
+    ultimo = messages[-1] if messages else {}
+
+    if (response_format or {}).get("type") == "json_object":
+        return {
+            "role": "assistant",
+            "content": json.dumps(generar_tabla_smae(messages), ensure_ascii=False),
+        }
+
+    if tools and ultimo.get("role") == "user":
+        call = decidir_tool_call(messages)
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {
+                        "name": call["name"],
+                        "arguments": json.dumps(call["arguments"], ensure_ascii=False),
+                    },
+                }
+            ],
+        }
+
+    n_tools = sum(1 for m in messages if m.get("role") == "tool")
+    return {
+        "role": "assistant",
+        "content": (
+            f"Respuesta simulada de NutrIA a «{_ultimo_mensaje_usuario(messages)[:80]}» "
+            f"({n_tools} resultados de tools). "
+            "Recuerda acompañar tu alimentación con agua y verduras."
+        ),
+    }
+
+
+# =========================================================
+# Servidor HTTP
+# =========================================================
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/0.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - firma de la stdlib
+        pass
+
+    def _enviar_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            return self._enviar_json(200, self.server.stats())
+        self._enviar_json(404, {"error": {"message": f"Ruta desconocida: {self.path}"}})
+
+    def _leer_cuerpo(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_POST(self):
+        ruta = self.path.rstrip("/")
+        endpoint = next((e for s, e in RUTAS.items() if ruta.endswith(s)), None)
+        if endpoint is None:
+            return self._enviar_json(404, {"error": {"message": f"Ruta desconocida: {self.path}"}})
+
+        # Leer siempre el cuerpo, aunque se rechace (si no, el cliente ve un reset)
+        cuerpo = self._leer_cuerpo()
+        srv = self.server
+        if not srv.entrar(endpoint):
+            return self._enviar_json(
+                429, {"error": {"message": "Rate limit simulado", "type": "rate_limit", "code": 429}}
+            )
+        try:
+            time.sleep(srv.latencia_simulada(endpoint))
+            if srv.error_simulado():
+                status = srv.rng.choice([429, 500])
+                return self._enviar_json(
+                    status, {"error": {"message": "Error simulado", "type": "fake", "code": status}}
+                )
+            if endpoint == "chat":
+                self._chat_completions(json.loads(cuerpo or b"{}"))
+            elif endpoint == "transcripcion":
+                self._transcripcion(cuerpo)
+            else:
+                self._speech(json.loads(cuerpo or b"{}"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente se rindió (timeout o hedge ganado por la copia)
+        finally:
+            srv.salir()
+
+    def _transcripcion(self, cuerpo: bytes) -> None:
+        # El multipart no se parsea: basta con encontrar la marca del audio de prueba
+        inicio = cuerpo.find(MARCA_AUDIO)
+        if inicio < 0:
+            texto = "¿Cuántas calorías tiene la manzana?"
+        else:
+            inicio += len(MARCA_AUDIO)
+            texto = cuerpo[inicio:cuerpo.index(b"\x00", inicio)].decode("utf-8", "replace")
+        self._enviar_json(200, {"text": texto})
+
+    def _speech(self, req: dict) -> None:
+        texto = str(req.get("input") or "")
+        body = b"ID3" + b"\x00" * (BYTES_AUDIO_POR_CARACTER * max(1, len(texto)))
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chat_completions(self, req: dict) -> None:
+        message = generar_respuesta(
+            req.get("messages") or [], req.get("tools"), req.get("response_format")
+        )
+        for call in message.get("tool_calls") or []:
+            self.server.contar_tool(call["function"]["name"])
+        prompt_tokens = sum(medir_prompt(req.get("messages") or [], req.get("tools")).values()) + TOKENS_RESPUESTA
+        self.server.contar_prompt(prompt_tokens)
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "created": int(time.time()),
+            "model": req.get("model", "fake"),
+        }
+        finish = "tool_calls" if message.get("tool_calls") else "stop"
+
+        if not req.get("stream"):
+            self._enviar_json(
+                200,
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {"index": 0, "message": message, "finish_reason": finish}
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": 0,
+                        "total_tokens": prompt_tokens,
+                    },
+                },
+            )
+            return
+
+        # Streaming SSE: un chunk por palabra y luego [DONE]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        palabras = (message.get("content") or "").split(" ")
+        for i, palabra in enumerate(palabras):
+            delta = {"content": palabra if i == 0 else " " + palabra}
+            if i == 0:
+                delta["role"] = "assistant"
+            self._enviar_chunk(base, delta, None)
+        self._enviar_chunk(base, {}, finish)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _enviar_chunk(self, base: dict, delta: dict, finish: Optional[str]) -> None:
+        chunk = {
+            **base,
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+        data = json.dumps(chunk, ensure_ascii=False)
+        self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+RUTAS = {
+    "/chat/completions": "chat",
+    "/audio/transcriptions": "transcripcion",
+    "/audio/speech": "tts",
+}
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # ráfagas de pruebas de carga
+
+    def __init__(
+        self,
+        address,
+        latencia_ms: float = 0.0,
+        tasa_error: float = 0.0,
+        max_concurrencia: int = 0,
+        seed: int = 0,
+        tasa_lenta: float = 0.0,
+        latencia_lenta_ms: float = 5000.0,
+        latencias: Optional[Dict[str, Union[str, DistribucionLatencia]]] = None,
+    ):
+        super().__init__(address, FakeOpenAIHandler)
+        # Por endpoint; los no indicados usan latencia_ms constante
+        self.latencias = {e: DistribucionLatencia(f"const:{latencia_ms}") for e in RUTAS.values()}
+        for endpoint, dist in (latencias or {}).items():
+            if dist:
+                self.latencias[endpoint] = (
+                    dist if isinstance(dist, DistribucionLatencia) else DistribucionLatencia(dist)
+                )
+        self.tasa_error = tasa_error
+        self.tasa_lenta = tasa_lenta
+        self.latencia_lenta_s = latencia_lenta_ms / 1000.0
+        self.max_concurrencia = max_concurrencia
+        self.rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self.en_vuelo = 0
+        self.pico = 0
+        self.peticiones = 0
+        self.rechazadas = 0
+        self.por_endpoint = {e: 0 for e in RUTAS.values()}
+        self.tools: Dict[str, int] = {}
+        self.prompt_tokens = 0
+
+    def entrar(self, endpoint: str = "chat") -> bool:
+        with self._lock:
+            self.peticiones += 1
+            self.por_endpoint[endpoint] += 1
+            if self.max_concurrencia and self.en_vuelo >= self.max_concurrencia:
+                self.rechazadas += 1
+                return False
+            self.en_vuelo += 1
+            self.pico = max(self.pico, self.en_vuelo)
+            return True
+
+    def salir(self) -> None:
+        with self._lock:
+            self.en_vuelo -= 1
+
+    def error_simulado(self) -> bool:
+        with self._lock:
+            return self.rng.random() < self.tasa_error
+
+    def latencia_simulada(self, endpoint: str = "chat") -> float:
+        with self._lock:
+            if self.tasa_lenta and self.rng.random() < self.tasa_lenta:
+                return self.latencia_lenta_s
+            return self.latencias[endpoint].muestrear(self.rng)
+
+    def contar_tool(self, nombre: str) -> None:
+        with self._lock:
+            self.tools[nombre] = self.tools.get(nombre, 0) + 1
+
+    def contar_prompt(self, tokens: int) -> None:
+        with self._lock:
+            self.prompt_tokens += tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "peticiones": self.peticiones,
+                "por_endpoint": dict(self.por_endpoint),
+                "tools": dict(self.tools),
+                "rechazadas_429": self.rechazadas,
+                "pico_concurrencia": self.pico,
+                "en_vuelo": self.en_vuelo,
+                "prompt_tokens": self.prompt_tokens,
+            }
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def iniciar_en_hilo(
+    host: str = "127.0.0.1", port: int = 0, **opciones
+) -> FakeOpenAIServer:
+    """
+    Arranca el servidor falso en un hilo daemon y lo devuelve.
+    Con port=0 el sistema asigna un puerto libre (ver `server.base_url`).
+    """
+    server = FakeOpenAIServer((host, port), **opciones)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor falso compatible con OpenAI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Fracción de respuestas 429/500.")
+    parser.add_argument("--max-concurrencia", type=int, default=0, help="0 = sin límite.")
+    parser.add_argument("--tasa-lenta", type=float, default=0.0, help="Fracción de respuestas lentas.")
+    parser.add_argument("--latencia-lenta-ms", type=float, default=5000.0)
+    parser.add_argument("--latencia-chat", default=None, help='Distribución, p. ej. "lognormal:300:0.5".')
+    parser.add_argument("--latencia-transcripcion", default=None)
+    parser.add_argument("--latencia-tts", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        (args.host, args.port),
+        latencia_ms=args.latencia_ms,
+        tasa_error=args.tasa_error,
+        max_concurrencia=args.max_concurrencia,
+        tasa_lenta=args.tasa_lenta,
+        latencia_lenta_ms=args.latencia_lenta_ms,
+        seed=args.seed,
+        latencias={
+            "chat": args.latencia_chat,
+            "transcripcion": args.latencia_transcripcion,
+            "tts": args.latencia_tts,
+        },
+    )
+    print(f"Fake OpenAI escuchando en {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,42 @@
 import json
-import pandas as pd
-
-from .data_processing import (
-    df,
-    buscar_alimento_por_nombre,
-    construir_foodinfo,
-    construir_foodinfo_score,
-    calcular_nutria_score,
-)
+
+from .data_processing import buscar_alimento_por_nombre, vista
 from .nutritional_plan import DatosPaciente, generar_plan_nutricional
 
 
+def _anexar(fragmento: str, campos: dict) -> str:
+    """
+    Agrega `campos` al final de un fragmento JSON ya serializado.
+    """
+    if not campos:
+        return fragmento
+    extra = json.dumps(campos, ensure_ascii=False, separators=(",", ":"))
+    return f"{fragmento[:-1]},{extra[1:]}"
+
+
 # ======================================================
 #  TOOL: get_food_info
 # ======================================================
 
 def get_food_info(nombre_alimento: str):
     """
-    Devuelve información nutricional + NutrIA Score de un alimento.
+    Devuelve información nutricional + NutrIA Score de un alimento, con su
+    lugar dentro de la categoría (rank, percentiles y medias).
     """
-    fila = buscar_alimento_por_nombre(nombre_alimento)
+    # df y JSON de la misma generación aunque haya una recarga en curso
+    datos = vista()
+    fila = buscar_alimento_por_nombre(nombre_alimento, datos.df)
     if fila is None:
         return json.dumps(
             {"error": f"No encontré '{nombre_alimento}' en el dataset."},
             ensure_ascii=False,
         )
 
-    info = construir_foodinfo_score(fila)
-    return info.model_dump_json(ensure_ascii=False)
+    # Fragmento serializado una sola vez al cargar el dataset + comparativa
+    # (búsquedas binarias sobre las distribuciones precalculadas)
+    return _anexar(
+        datos.food_json[fila.name], {"comparativa": datos.distribuciones.comparativa(fila)}
+    )
 
 
 # ======================================================
@@ -56,7 +65,9 @@ def get_nutrition_recommendations(
     if objetivo == "":
         objetivo = "mejorar alimentación general"
 
-    data = df.copy()
+    # Solo se filtra; el NutrIA Score ya viene precomputado en df
+    datos = vista()
+    data = datos.df
 
     # ------------------------------------------------------
     # 1) Filtrar por categoría (solo si realmente existe)
@@ -85,79 +96,30 @@ def get_nutrition_recommendations(
         )
 
     # ------------------------------------------------------
-    # 4) Garantizar todas las columnas del score
-    # ------------------------------------------------------
-    required = [
-        "proteina_g",
-        "fibra_g",
-        "azucar_g",
-        "sodio_g",
-        "energia_kcal",
-        "lipidos_g",
-        "hidratos_carbono_g",
-    ]
-
-    for col in required:
-        if col not in data.columns:
-            data[col] = 0
-        data[col] = pd.to_numeric(data[col], errors="coerce").fillna(0)
-
-    # ------------------------------------------------------
-    # 5) Cálculo del NutrIA Score (a prueba de todo)
+    # 4) Tomar top K alimentos por NutrIA Score
     # ------------------------------------------------------
     try:
-        data["nutria_score"] = data.apply(
-            lambda fila: calcular_nutria_score(fila),
-            axis=1,
-        )
-    except Exception as e:
-        # FALLBACK PARA QUE NUNCA TRUENE LA APP
-        return json.dumps(
-            {
-                "objetivo": objetivo,
-                "alimento_base": alimento_base,
-                "error": f"No se pudo calcular el NutrIA Score: {str(e)}",
-                "recomendaciones": [],
-            },
-            ensure_ascii=False,
-        )
-
-    # ------------------------------------------------------
-    # 6) Tomar top K alimentos
-    # ------------------------------------------------------
-    data = data.sort_values("nutria_score", ascending=False)
-    top = data.head(top_k)
-
-    recomendaciones = []
-    for _, row in top.iterrows():
-        try:
-            recomendaciones.append(construir_foodinfo_score(row).model_dump())
-        except Exception:
-            continue
-
-    # Último check para evitar listas vacías
-    if not recomendaciones:
-        return json.dumps(
-            {
-                "objetivo": objetivo,
-                "alimento_base": alimento_base,
-                "recomendaciones": [],
-                "warning": "No se pudieron construir las recomendaciones.",
-            },
-            ensure_ascii=False,
-        )
+        top_k = max(1, int(top_k))
+    except (TypeError, ValueError):
+        top_k = 5
+    top = data["nutria_score"].nlargest(top_k)
 
     # ------------------------------------------------------
-    # 7) Respuesta final robusta
+    # 5) Respuesta final: cabecera + fragmentos ya serializados
     # ------------------------------------------------------
-    return json.dumps(
-        {
-            "objetivo": objetivo,
-            "alimento_base": alimento_base,
-            "recomendaciones": recomendaciones,
-        },
+    cabecera = json.dumps(
+        {"objetivo": objetivo, "alimento_base": alimento_base},
         ensure_ascii=False,
     )
+    categorias = data["categoria"]
+    recomendaciones = ", ".join(
+        _anexar(
+            datos.food_json[i],
+            datos.distribuciones.lugar_en_categoria(categorias.at[i], score),
+        )
+        for i, score in top.items()
+    )
+    return f'{cabecera[:-1]}, "recomendaciones": [{recomendaciones}]}}'
 
 
 # ======================================================
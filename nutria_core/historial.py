@@ -0,0 +1,76 @@
+from typing import List, Optional
+
+from .conversation_store import ConversationStore
+
+
+# =========================================================
+# Render de burbujas
+# =========================================================
+
+def burbuja_html(role: str, content: str) -> str:
+    """
+    HTML de una burbuja de chat (mismas clases CSS que define app.py).
+    """
+    etiqueta = "Usuario" if role == "user" else "NutrIA"
+    css_class = "chat-user" if role == "user" else "chat-bot"
+    return (
+        f"<div class='{css_class}'>"
+        f"<div class='chat-role'><b>{etiqueta}</b></div>"
+        f"{content}</div>"
+    )
+
+
+# =========================================================
+# Conversación de una sesión
+# =========================================================
+
+class Conversacion:
+    """
+    Vista de una sesión de chat sobre el ConversationStore.
+
+    La sesión de Streamlit solo guarda esta vista (un id); los mensajes
+    viven en el store, con la ventana reciente en RAM y lo antiguo en disco.
+    """
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        sesion: str,
+        bienvenida: Optional[str] = None,
+    ) -> None:
+        self.store = store
+        self.sesion = sesion
+
+        if bienvenida and store.total(sesion) == 0:
+            store.agregar(sesion, "assistant", bienvenida)
+
+    def __len__(self) -> int:
+        return self.store.total(self.sesion)
+
+    def agregar(self, role: str, content: str) -> None:
+        self.store.agregar(self.sesion, role, content)
+
+    def registrar_turno(self, usuario: str, respuesta: str) -> None:
+        self.store.registrar_turno(self.sesion, usuario, respuesta)
+
+    def recientes(self, n: int) -> List[dict]:
+        """
+        Últimos `n` mensajes (la ventana que se vuelve a dibujar siempre).
+        """
+        return self.store.recientes(self.sesion, n)
+
+    def n_anteriores(self, ventana: int) -> int:
+        """
+        Cantidad de mensajes que quedan fuera de la ventana reciente.
+        """
+        return max(0, len(self) - ventana)
+
+    def pagina_anterior(self, pagina: int, tam: int, ventana: int) -> List[dict]:
+        """
+        Página `pagina` (0 = la más reciente) de los mensajes anteriores a la
+        ventana, en orden cronológico.
+        """
+        fin = self.n_anteriores(ventana) - pagina * tam
+        if fin <= 0:
+            return []
+        return self.store.rango(self.sesion, max(0, fin - tam), fin)
@@ -0,0 +1,331 @@
+"""
+Planificador compartido para las llamadas a OpenAI de todo el proceso.
+
+Se coloca delante del cliente que usan ChatEngine y voice_utils y aplica:
+
+- Single-flight: si llega una petición idéntica a otra que ya está en
+  vuelo, no se repite; se espera el mismo resultado.
+- Concurrencia máxima por endpoint ("chat", "transcripcion", "tts").
+- Presupuesto de tokens por minuto por endpoint (token bucket).
+- Cola justa entre sesiones: cuando se libera un cupo se atiende a la
+  siguiente sesión en round-robin, así una sesión con muchas peticiones
+  no deja sin turno a las demás.
+- Métricas: profundidad de cola, en vuelo, coalescidas y tiempos de espera.
+
+El id de sesión se toma del contexto (`en_sesion`), para no tener que
+pasarlo por todas las firmas. Las llamadas sin sesión (endpoints sin
+estado del servidor, voz) cuentan cada una como su propia sesión, en vez
+de compartir entre todas un solo turno del round-robin.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Optional
+
+_sesion_actual: contextvars.ContextVar = contextvars.ContextVar("nutria_sesion", default=None)
+
+
+@contextlib.contextmanager
+def en_sesion(sesion: Optional[str]):
+    """
+    Marca las llamadas a OpenAI hechas dentro del bloque como de `sesion`.
+    """
+    token = _sesion_actual.set(sesion)
+    try:
+        yield
+    finally:
+        _sesion_actual.reset(token)
+
+
+# =========================================================
+# Estimación de tokens y claves de coalescencia
+# =========================================================
+
+def estimar_tokens(endpoint: str, kwargs: dict) -> int:
+    """
+    Estimación barata (≈ 4 caracteres por token) para el presupuesto por minuto.
+    """
+    if endpoint == "chat":
+        chars = len(json.dumps(kwargs.get("messages", []), default=str, ensure_ascii=False))
+        return chars // 4 + 500  # + margen para la respuesta
+    if endpoint == "tts":
+        return len(kwargs.get("input", "")) // 4 + 1
+    return 1
+
+
+def _serializable(obj: Any) -> Any:
+    if isinstance(obj, (bytes, bytearray)):
+        return "sha256:" + hashlib.sha256(obj).hexdigest()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, tuple):
+        return list(obj)
+    # Archivos abiertos u otros objetos: no se puede saber si son idénticos
+    raise TypeError(type(obj).__name__)
+
+
+def clave_peticion(endpoint: str, kwargs: dict) -> Optional[str]:
+    """
+    Hash estable de la petición, o None si no se puede coalescer
+    (streaming o argumentos no serializables).
+    """
+    if kwargs.get("stream"):
+        return None
+    # El timeout cambia con el plazo restante de cada turno; no distingue peticiones
+    kwargs = {k: v for k, v in kwargs.items() if k != "timeout"}
+    try:
+        payload = json.dumps(
+            {"endpoint": endpoint, **kwargs}, sort_keys=True, default=_serializable
+        )
+    except TypeError:
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# =========================================================
+# Cola por endpoint
+# =========================================================
+
+class _Ticket:
+    __slots__ = ("tokens", "concedido", "creado")
+
+    def __init__(self, tokens: int) -> None:
+        self.tokens = tokens
+        self.concedido = False
+        self.creado = time.monotonic()
+
+
+class _Endpoint:
+    def __init__(self, limite: int, tokens_por_minuto: Optional[int]) -> None:
+        self.limite = limite
+        self.tpm = tokens_por_minuto
+        self.tokens = float(tokens_por_minuto or 0)
+        self.ultimo_recarga = time.monotonic()
+
+        self.colas: "OrderedDict[Any, Deque[_Ticket]]" = OrderedDict()
+        self.en_cola = 0
+        self.activos = 0
+
+        self.atendidas = 0
+        self.coalescidas = 0
+        self.esperas_ms: Deque[float] = deque(maxlen=1000)
+
+    def recargar(self, ahora: float) -> None:
+        if self.tpm:
+            self.tokens = min(
+                float(self.tpm), self.tokens + (ahora - self.ultimo_recarga) * self.tpm / 60.0
+            )
+        self.ultimo_recarga = ahora
+
+    def segundos_para(self, tokens: int) -> float:
+        if not self.tpm:
+            return 0.0
+        return max(0.0, (tokens - self.tokens) * 60.0 / self.tpm)
+
+
+class OpenAIScheduler:
+    """
+    Cola justa con cupos y presupuesto por endpoint, más single-flight.
+    """
+
+    def __init__(
+        self,
+        limites: Optional[Dict[str, int]] = None,
+        tokens_por_minuto: Optional[Dict[str, int]] = None,
+        coalescer: bool = True,
+    ) -> None:
+        limites = {"chat": 16, "transcripcion": 4, "tts": 4, **(limites or {})}
+        tpm = tokens_por_minuto or {}
+        self._endpoints = {
+            nombre: _Endpoint(limite, tpm.get(nombre)) for nombre, limite in limites.items()
+        }
+        self.coalescer = coalescer
+
+        self._cond = threading.Condition()
+        self._en_vuelo: Dict[str, Future] = {}
+
+    # ---------------------------
+    # Cola justa
+    # ---------------------------
+    def _despachar(self, ep: _Endpoint) -> float:
+        """
+        Concede cupos en round-robin entre sesiones mientras haya cupo y
+        presupuesto. Devuelve cuánto falta para que alcance el presupuesto
+        (0 si no se está esperando tokens). Llamar con el lock tomado.
+        """
+        ep.recargar(time.monotonic())
+        while ep.colas and ep.activos < ep.limite:
+            sesion, cola = next(iter(ep.colas.items()))
+            ticket = cola[0]
+            # Un ticket mayor que todo el presupuesto pasaría a deuda en vez de bloquear
+            necesarios = min(ticket.tokens, ep.tpm or 0)
+            if ep.tpm and ep.tokens < necesarios:
+                return ep.segundos_para(necesarios)
+
+            cola.popleft()
+            ep.colas.pop(sesion)
+            if cola:
+                ep.colas[sesion] = cola  # al final: turno de la siguiente sesión
+
+            if ep.tpm:
+                ep.tokens -= ticket.tokens
+            ep.en_cola -= 1
+            ep.activos += 1
+            ticket.concedido = True
+            ep.esperas_ms.append((time.monotonic() - ticket.creado) * 1000)
+            self._cond.notify_all()
+        return 0.0
+
+    def _adquirir(self, ep: _Endpoint, sesion: Any, tokens: int) -> None:
+        ticket = _Ticket(tokens)
+        with self._cond:
+            ep.colas.setdefault(sesion, deque()).append(ticket)
+            ep.en_cola += 1
+            while True:
+                espera = self._despachar(ep)
+                if ticket.concedido:
+                    return
+                self._cond.wait(timeout=espera or None)
+
+    def _liberar(self, ep: _Endpoint) -> None:
+        with self._cond:
+            ep.activos -= 1
+            ep.atendidas += 1
+            self._despachar(ep)
+            self._cond.notify_all()
+
+    # ---------------------------
+    # API pública
+    # ---------------------------
+    def ejecutar(self, endpoint: str, fn: Callable[..., Any], **kwargs) -> Any:
+        """
+        Ejecuta `fn(**kwargs)` respetando cola, cupos y presupuesto del
+        endpoint. Peticiones idénticas en vuelo comparten un solo resultado.
+        """
+        ep = self._endpoints[endpoint]
+        clave = clave_peticion(endpoint, kwargs) if self.coalescer else None
+
+        if clave is not None:
+            with self._cond:
+                lider = self._en_vuelo.get(clave)
+                if lider is not None:
+                    ep.coalescidas += 1
+                else:
+                    futuro = Future()
+                    self._en_vuelo[clave] = futuro
+            if lider is not None:
+                return lider.result()
+
+        try:
+            sesion = _sesion_actual.get()
+            if sesion is None:
+                sesion = object()  # clave propia de esta petición
+            self._adquirir(ep, sesion, estimar_tokens(endpoint, kwargs))
+            try:
+                resultado = fn(**kwargs)
+            finally:
+                self._liberar(ep)
+        except BaseException as e:
+            if clave is not None:
+                with self._cond:
+                    self._en_vuelo.pop(clave, None)
+                futuro.set_exception(e)
+            raise
+
+        if clave is not None:
+            with self._cond:
+                self._en_vuelo.pop(clave, None)
+            futuro.set_result(resultado)
+        return resultado
+
+    def metricas(self) -> Dict[str, dict]:
+        with self._cond:
+            salida = {}
+            for nombre, ep in self._endpoints.items():
+                esperas = sorted(ep.esperas_ms)
+                salida[nombre] = {
+                    "en_cola": ep.en_cola,
+                    "sesiones_en_cola": len(ep.colas),
+                    "en_vuelo": ep.activos,
+                    "limite": ep.limite,
+                    "atendidas": ep.atendidas,
+                    "coalescidas": ep.coalescidas,
+                    "espera_ms_p50": round(esperas[len(esperas) // 2], 2) if esperas else 0.0,
+                    "espera_ms_p95": round(esperas[int(len(esperas) * 0.95)], 2) if esperas else 0.0,
+                    "espera_ms_max": round(esperas[-1], 2) if esperas else 0.0,
+                    "tokens_disponibles": round(ep.tokens) if ep.tpm else None,
+                }
+            return salida
+
+
+# =========================================================
+# Cliente envuelto
+# =========================================================
+
+class _Recurso:
+    def __init__(self, scheduler: OpenAIScheduler, endpoint: str, fn: Callable) -> None:
+        self._scheduler = scheduler
+        self._endpoint = endpoint
+        self._fn = fn
+
+    def create(self, **kwargs):
+        return self._scheduler.ejecutar(self._endpoint, self._fn, **kwargs)
+
+
+class _Namespace:
+    pass
+
+
+class ClienteProgramado:
+    """
+    Envuelve un cliente OpenAI para que `chat.completions.create`,
+    `audio.transcriptions.create` y `audio.speech.create` pasen por el
+    scheduler. Tiene la misma forma que el cliente original para esas rutas.
+
+    Con stream=True el cupo se ocupa solo mientras se abre la respuesta,
+    no mientras se consume el stream.
+    """
+
+    def __init__(self, client, scheduler: OpenAIScheduler) -> None:
+        self.raw = client
+        self.scheduler = scheduler
+
+        self.chat = _Namespace()
+        self.chat.completions = _Recurso(scheduler, "chat", client.chat.completions.create)
+        self.audio = _Namespace()
+        self.audio.transcriptions = _Recurso(
+            scheduler, "transcripcion", client.audio.transcriptions.create
+        )
+        self.audio.speech = _Recurso(scheduler, "tts", client.audio.speech.create)
+
+
+_scheduler_global: Optional[OpenAIScheduler] = None
+_lock_global = threading.Lock()
+
+
+def scheduler_global() -> OpenAIScheduler:
+    """
+    Scheduler único del proceso, compartido por todas las sesiones.
+    Se configura con NUTRIA_MAX_CHAT, NUTRIA_MAX_AUDIO y NUTRIA_TPM_CHAT.
+    """
+    global _scheduler_global
+    with _lock_global:
+        if _scheduler_global is None:
+            tpm = os.getenv("NUTRIA_TPM_CHAT")
+            audio = int(os.getenv("NUTRIA_MAX_AUDIO", "4"))
+            _scheduler_global = OpenAIScheduler(
+                limites={
+                    "chat": int(os.getenv("NUTRIA_MAX_CHAT", "16")),
+                    "transcripcion": audio,
+                    "tts": audio,
+                },
+                tokens_por_minuto={"chat": int(tpm)} if tpm else None,
+            )
+        return _scheduler_global
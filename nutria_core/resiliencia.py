@@ -0,0 +1,246 @@
+"""
+Plazos, reintentos y peticiones "hedged" para las llamadas al LLM.
+
+- Cada llamada lleva su propio timeout, recortado al presupuesto que le
+  queda al turno completo (`Plazo`).
+- Los errores transitorios (429, 5xx, timeouts, conexión) se reintentan
+  con backoff exponencial y jitter completo, sin pasarse del plazo.
+- Hedging opcional: si la respuesta no llega tras el p95 observado, se
+  lanza una copia de la petición y se usa la primera que responda.
+"""
+
+import contextvars
+import functools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturoTimeout
+from typing import Any, Callable, Deque, Optional, Tuple
+
+
+@functools.lru_cache(maxsize=1)
+def errores_reintentables() -> Tuple[type, ...]:
+    """
+    Errores que vale la pena reintentar (APITimeoutError hereda de
+    APIConnectionError). El SDK de OpenAI se importa aquí, en el primer
+    reintento posible, y no al importar el módulo.
+    """
+    from openai import (
+        APIConnectionError,
+        APITimeoutError,
+        InternalServerError,
+        RateLimitError,
+    )
+
+    return (
+        RateLimitError, APITimeoutError, APIConnectionError, InternalServerError, LlamadaSinRespuesta,
+    )
+
+# Hilos para hedging y tools con plazo (compartidos por todos los motores del proceso)
+_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="nutria-plazo")
+
+
+def _lanzar(fn: Callable[..., Any], *args):
+    # Copia el contexto para que el hilo conserve la sesión (`en_sesion`)
+    return _pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+class PresupuestoAgotado(Exception):
+    """
+    El turno se quedó sin tiempo antes de obtener respuesta.
+    """
+
+
+class LlamadaSinRespuesta(Exception):
+    """
+    Una llamada con hedging no respondió dentro de su timeout (incluida la
+    espera por un hilo libre del pool). Se reintenta como un timeout del SDK.
+    """
+
+
+# =========================================================
+# Plazo del turno
+# =========================================================
+
+class Plazo:
+    """
+    Presupuesto de tiempo de un turno completo (completions + tools).
+    """
+
+    def __init__(self, segundos: Optional[float]) -> None:
+        self.limite = None if segundos is None else time.monotonic() + segundos
+
+    def restante(self) -> float:
+        if self.limite is None:
+            return float("inf")
+        return max(0.0, self.limite - time.monotonic())
+
+    def vencido(self) -> bool:
+        return self.restante() <= 0.0
+
+    def recortar(self, timeout_s: float) -> float:
+        """
+        Timeout de una llamada: el suyo o lo que quede del turno, lo menor.
+        """
+        restante = self.restante()
+        if restante <= 0.0:
+            raise PresupuestoAgotado("Se agotó el tiempo del turno.")
+        return min(timeout_s, restante)
+
+
+def con_plazo(fn: Callable[..., Any], plazo: Plazo, *args) -> Any:
+    """
+    Ejecuta `fn(*args)` y espera como mucho lo que quede del turno
+    (p. ej. las tools locales). Si no termina a tiempo lanza
+    PresupuestoAgotado; el hilo sigue hasta acabar, pero nadie lo espera.
+    """
+    if plazo.limite is None:
+        return fn(*args)
+    futuro = _lanzar(fn, *args)
+    try:
+        return futuro.result(timeout=plazo.recortar(float("inf")))
+    except FuturoTimeout:
+        raise PresupuestoAgotado("Las tools no terminaron a tiempo.") from None
+
+
+# =========================================================
+# Latencias observadas
+# =========================================================
+
+class RegistroLatencias:
+    """
+    Ventana deslizante de latencias exitosas para estimar el p95.
+    """
+
+    def __init__(self, ventana: int = 200) -> None:
+        self._datos: Deque[float] = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+
+    def agregar(self, segundos: float) -> None:
+        with self._lock:
+            self._datos.append(segundos)
+
+    def percentil(self, p: float) -> Optional[float]:
+        with self._lock:
+            datos = sorted(self._datos)
+        if len(datos) < 20:  # muy pocos datos para un percentil fiable
+            return None
+        return datos[min(len(datos) - 1, int(len(datos) * p))]
+
+
+# =========================================================
+# Política de llamadas
+# =========================================================
+
+class PoliticaLlamadas:
+    """
+    Envuelve `create(**kwargs)` con timeout por llamada, reintentos y hedging.
+    """
+
+    def __init__(
+        self,
+        timeout_s: float = 20.0,
+        reintentos: int = 3,
+        backoff_s: float = 0.5,
+        backoff_max_s: float = 8.0,
+        hedge: bool = False,
+        hedge_delay_s: float = 2.0,
+        hedge_delay_min_s: float = 0.2,
+    ) -> None:
+        self.timeout_s = timeout_s
+        self.reintentos = reintentos
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.hedge = hedge
+        self.hedge_delay_s = hedge_delay_s        # mientras no haya datos para el p95
+        self.hedge_delay_min_s = hedge_delay_min_s
+        self.latencias = RegistroLatencias()
+
+        self._lock = threading.Lock()
+        self.stats = {"llamadas": 0, "reintentos": 0, "hedges": 0, "hedges_ganados": 0}
+
+    def _sumar(self, clave: str) -> None:
+        with self._lock:
+            self.stats[clave] += 1
+
+    def delay_hedge(self) -> float:
+        p95 = self.latencias.percentil(0.95)
+        if p95 is None:
+            return self.hedge_delay_s
+        return max(self.hedge_delay_min_s, p95)
+
+    def _una(self, create: Callable[..., Any], kwargs: dict, timeout: float) -> Any:
+        t0 = time.monotonic()
+        resultado = create(**kwargs, timeout=timeout)
+        self.latencias.agregar(time.monotonic() - t0)
+        return resultado
+
+    def _hedged(self, create: Callable[..., Any], kwargs: dict, timeout: float) -> Any:
+        """
+        Lanza la petición y, si no respondió tras el p95, una copia.
+        Devuelve la primera respuesta exitosa; si ambas fallan, el error
+        de la primera. Todo, incluida la espera por un hilo del pool,
+        respeta `timeout` (LlamadaSinRespuesta si se agota).
+        """
+        limite = time.monotonic() + timeout
+        primero = _lanzar(self._una, create, kwargs, timeout)
+        delay = min(self.delay_hedge(), timeout)
+        hecho, _ = wait([primero], timeout=delay)
+        if hecho:
+            return primero.result()
+
+        self._sumar("hedges")
+        # Cabecera distinta para que el scheduler no la coalesca con la original
+        copia_kwargs = {**kwargs, "extra_headers": {"X-NutrIA-Hedge": "1"}}
+        copia = _lanzar(self._una, create, copia_kwargs, max(0.001, timeout - delay))
+
+        pendientes = {primero, copia}
+        error = None
+        while pendientes:
+            restante = limite - time.monotonic()
+            hechos, pendientes = wait(
+                pendientes, timeout=max(0.0, restante), return_when=FIRST_COMPLETED
+            )
+            if not hechos:
+                for fut in pendientes:
+                    fut.cancel()  # si sigue en la cola del pool, ya no corre
+                raise LlamadaSinRespuesta(f"Sin respuesta tras {timeout:.1f} s (con hedge).")
+            for fut in hechos:
+                if fut.exception() is None:
+                    if fut is copia:
+                        self._sumar("hedges_ganados")
+                    return fut.result()
+                error = error or fut.exception()
+        raise error
+
+    def ejecutar(
+        self,
+        create: Callable[..., Any],
+        plazo: Optional[Plazo] = None,
+        hedge: Optional[bool] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Llama a `create(**kwargs)` aplicando la política. Lanza
+        PresupuestoAgotado si el plazo del turno se acaba.
+        """
+        plazo = plazo or Plazo(None)
+        hedge = self.hedge if hedge is None else hedge
+        self._sumar("llamadas")
+
+        for intento in range(self.reintentos + 1):
+            timeout = plazo.recortar(self.timeout_s)
+            try:
+                if hedge:
+                    return self._hedged(create, kwargs, timeout)
+                return self._una(create, kwargs, timeout)
+            except errores_reintentables():
+                if intento == self.reintentos:
+                    raise
+                self._sumar("reintentos")
+                pausa = random.uniform(0, min(self.backoff_max_s, self.backoff_s * 2 ** intento))
+                if pausa >= plazo.restante():
+                    raise PresupuestoAgotado("Sin tiempo para reintentar.")
+                time.sleep(pausa)
@@ -0,0 +1,470 @@
+"""
+Servidor HTTP "headless" de NutrIA (sin Streamlit).
+
+Expone el mismo ChatEngine y las tres tools para clientes móviles:
+
+- GET  /health              → estado del proceso (200 ok / 503 drenando)
+- POST /chat                → {"mensaje": str, "sesion": str | "historial": [[u, a], ...], "stream": bool}
+- POST /tools/<nombre>      → argumentos de la tool como JSON
+- POST /plan                → DatosPaciente como JSON
+
+Modelo de ejecución:
+
+- Cada proceso tiene un pool fijo de hilos (--workers) que atiende conexiones.
+- Un semáforo limita cuántas llamadas al LLM hay en vuelo (--max-inflight);
+  si no hay cupo en --espera-ms se responde 503 en lugar de encolar sin fin.
+- Con --procesos N > 1 el proceso padre carga el dataset, abre el socket y
+  hace fork: los hijos comparten el socket y las páginas del dataset (COW).
+- Con NUTRIA_DATASET_COMPARTIDO=<dir> el dataset se mapea desde la memoria
+  compartida publicada por `python -m nutria_core.dataset_compartido`; el
+  hilo de mantenimiento adopta cada generación nueva que se publique.
+
+Si la petición de /chat trae "sesion", el historial vive en el
+ConversationStore del proceso (ventana en RAM + SQLite) en vez de
+viajar completo en cada petición.
+
+Uso local contra el servidor falso de OpenAI:
+    python -m nutria_core.fake_openai --port 8700 &
+    python -m nutria_core.server --port 8080 --base-url http://127.0.0.1:8700/v1
+"""
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+# data_processing carga el dataset en la primera vista(); main() la llama
+# antes del fork para que los hijos lo hereden sin volver a leer el CSV.
+from .data_processing import recargar_compartido, vista
+from .chat_engine import ChatEngine, FalloStream
+from .conversation_store import ConversationStore
+from .enrutador import EnrutadorIntenciones
+from .food_tools import tools
+from .nutritional_plan import DatosPaciente, generar_plan_nutricional
+from .resiliencia import PoliticaLlamadas
+from .tools_handler import ejecutar_tool
+
+TOOL_NAMES = {t["function"]["name"] for t in tools}
+
+
+# =========================================================
+# Handler
+# =========================================================
+
+class NutriaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "NutrIA/0.1"
+    # Conexiones keep-alive inactivas no deben retener un worker para siempre
+    timeout = 30
+
+    def log_message(self, format, *args):  # noqa: A002 - firma de la stdlib
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # ---------------------------
+    # Utilidades de E/S
+    # ---------------------------
+    def _leer_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        data = json.loads(self.rfile.read(length))
+        if not isinstance(data, dict):
+            raise ValueError("El cuerpo debe ser un objeto JSON.")
+        return data
+
+    def _enviar(self, status: int, body: str) -> None:
+        raw = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _enviar_json(self, status: int, payload: dict) -> None:
+        self._enviar(status, json.dumps(payload, ensure_ascii=False))
+
+    def _escribir_chunk(self, texto: str) -> None:
+        raw = texto.encode("utf-8")
+        self.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+        self.wfile.flush()
+
+    # ---------------------------
+    # Rutas
+    # ---------------------------
+    def do_GET(self):
+        if self.path == "/health":
+            srv = self.server
+            status = 503 if srv.drenando.is_set() else 200
+            return self._enviar_json(
+                status,
+                {
+                    "status": "draining" if status == 503 else "ok",
+                    "pid": os.getpid(),
+                    "workers": srv.workers,
+                    "max_inflight": srv.max_inflight,
+                    "inflight": srv.inflight,
+                    "atendidas": srv.atendidas,
+                    "alimentos": len(vista().df),
+                    "dataset": {
+                        "generacion": vista().generacion,
+                        "compartido": vista().compartido is not None,
+                    },
+                    "memoria": srv.engine.store.metricas() if srv.engine.store else None,
+                    "openai": srv.engine.client.scheduler.metricas(),
+                    "llamadas": dict(srv.engine.politica.stats),
+                    "especulacion": srv.engine.metricas_especulacion(),
+                    "enrutador": dict(srv.engine.stats_enrutador),
+                    "prompt": srv.engine.metricas_prompt(),
+                },
+            )
+        self._enviar_json(404, {"error": f"Ruta desconocida: {self.path}"})
+
+    def do_POST(self):
+        try:
+            body = self._leer_json()
+        except ValueError as e:
+            return self._enviar_json(400, {"error": f"JSON inválido: {e}"})
+
+        if self.path == "/chat":
+            return self._chat(body)
+        if self.path == "/plan":
+            return self._plan(body)
+        if self.path.startswith("/tools/"):
+            return self._tool(self.path[len("/tools/"):], body)
+        self._enviar_json(404, {"error": f"Ruta desconocida: {self.path}"})
+
+    def _tool(self, nombre: str, args: dict) -> None:
+        if nombre not in TOOL_NAMES:
+            return self._enviar_json(404, {"error": f"Función desconocida: {nombre}"})
+        self._enviar(200, ejecutar_tool(nombre, args))
+
+    def _plan(self, body: dict) -> None:
+        try:
+            datos = DatosPaciente(**body)
+        except ValidationError as e:
+            return self._enviar_json(
+                422, {"error": "Datos del paciente inválidos.", "detalle": e.errors(include_url=False)}
+            )
+        plan = generar_plan_nutricional(datos)
+        self._enviar(200, plan.model_dump_json(ensure_ascii=False))
+
+    def _chat(self, body: dict) -> None:
+        mensaje = str(body.get("mensaje") or "").strip()
+        if not mensaje:
+            return self._enviar_json(400, {"error": "Falta 'mensaje'."})
+
+        try:
+            historial: List[Tuple[str, str]] = [
+                (str(u), str(a)) for u, a in body.get("historial") or []
+            ]
+        except (TypeError, ValueError):
+            return self._enviar_json(400, {"error": "'historial' debe ser una lista de pares [usuario, asistente]."})
+
+        sesion = body.get("sesion")
+        sesion = str(sesion) if sesion else None
+
+        srv = self.server
+        if not srv.cupo_llm.acquire(timeout=srv.espera_s):
+            return self._enviar_json(503, {"error": "Servidor saturado, intenta de nuevo."})
+
+        try:
+            srv.sumar_inflight(1)
+            if body.get("stream"):
+                self._chat_stream(mensaje, historial, sesion)
+            else:
+                respuesta = srv.engine.chat(mensaje, historial, session_id=sesion)
+                self._enviar_json(200, {"respuesta": respuesta})
+        finally:
+            srv.sumar_inflight(-1)
+            srv.cupo_llm.release()
+
+    def _chat_stream(
+        self, mensaje: str, historial: List[Tuple[str, str]], sesion: Optional[str]
+    ) -> None:
+        """
+        Respuesta tipo Server-Sent Events con Transfer-Encoding: chunked.
+        Cada evento es {"delta": "..."} y se cierra con "data: [DONE]".
+        Si el turno falla, el último evento antes de [DONE] es {"error": "..."}
+        (aparte de los deltas ya enviados).
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for delta in self.server.engine.chat_stream(mensaje, historial, session_id=sesion):
+            clave = "error" if isinstance(delta, FalloStream) else "delta"
+            evento = json.dumps({clave: delta}, ensure_ascii=False)
+            self._escribir_chunk(f"data: {evento}\n\n")
+        self._escribir_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+# =========================================================
+# Servidor con pool de workers
+# =========================================================
+
+class NutriaServer(HTTPServer):
+    """
+    HTTPServer cuyas conexiones las atiende un ThreadPoolExecutor de
+    tamaño fijo, en lugar de crear un hilo nuevo por conexión.
+    """
+
+    allow_reuse_address = True
+    request_queue_size = 1024  # backlog del socket para ráfagas de conexiones
+
+    def __init__(
+        self,
+        address,
+        engine: ChatEngine,
+        workers: int = 16,
+        max_inflight: int = 8,
+        espera_ms: float = 2000.0,
+        verbose: bool = False,
+        bind_and_activate: bool = True,
+    ):
+        super().__init__(address, NutriaHandler, bind_and_activate=bind_and_activate)
+        self.engine = engine
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.espera_s = espera_ms / 1000.0
+        self.verbose = verbose
+
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nutria")
+        self.cupo_llm = threading.BoundedSemaphore(max_inflight)
+        self.drenando = threading.Event()
+
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.atendidas = 0
+
+    def sumar_inflight(self, delta: int) -> None:
+        with self._lock:
+            self.inflight += delta
+            if delta < 0:
+                self.atendidas += 1
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def apagar(self, gracia_s: float = 30.0) -> None:
+        """
+        Apagado ordenado: deja de aceptar conexiones, marca /health como
+        "draining" y espera (hasta `gracia_s`) a que terminen las peticiones
+        en curso. Debe llamarse desde un hilo distinto al de serve_forever.
+        """
+        self.drenando.set()
+        self.shutdown()
+
+        limite = time.monotonic() + gracia_s
+        while self.inflight and time.monotonic() < limite:
+            time.sleep(0.05)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.server_close()
+
+
+def _instalar_senales(server: NutriaServer, gracia_s: float) -> None:
+    def _handler(signum, frame):
+        # shutdown() bloquea hasta que serve_forever termina: usar otro hilo
+        threading.Thread(target=server.apagar, args=(gracia_s,), daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _handler)
+    signal.signal(signal.SIGINT, _handler)
+
+
+def _mantenimiento(server: NutriaServer, intervalo_s: float = 60.0, recarga_s: float = 5.0) -> None:
+    """
+    Hilo que desaloja periódicamente las sesiones inactivas del store y
+    adopta las generaciones nuevas del dataset compartido.
+    """
+    store = server.engine.store
+    ultimo_desalojo = time.monotonic()
+    while not server.drenando.wait(recarga_s):
+        recargar_compartido()
+        if store is not None and time.monotonic() - ultimo_desalojo >= intervalo_s:
+            store.desalojar_inactivas()
+            ultimo_desalojo = time.monotonic()
+
+
+def _servir(
+    server: NutriaServer,
+    gracia_s: float,
+    crear_store: Optional[Callable[[], ConversationStore]] = None,
+) -> None:
+    # El store (conexión SQLite) se crea después del fork, uno por proceso
+    if crear_store is not None:
+        server.engine.store = crear_store()
+    _instalar_senales(server, gracia_s)
+    threading.Thread(target=_mantenimiento, args=(server,), daemon=True).start()
+    server.serve_forever()
+    # Esperar a que el hilo de apagado termine de drenar
+    server.pool.shutdown(wait=True)
+    if server.engine.store is not None:
+        server.engine.store.cerrar()
+
+
+def _servir_multiproceso(
+    server: NutriaServer,
+    procesos: int,
+    gracia_s: float,
+    crear_store: Optional[Callable[[], ConversationStore]] = None,
+) -> None:
+    """
+    Pre-fork: el padre ya tiene el socket abierto y el dataset cargado.
+    Cada hijo corre su propio pool de hilos sobre el mismo socket.
+
+    Todos los hijos comparten el archivo SQLite, pero la ventana en RAM es
+    por proceso: para historiales coherentes el balanceador debe mantener
+    cada sesión en el mismo proceso, o usar un solo proceso con más workers.
+    """
+    hijos = []
+    for _ in range(procesos):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # Cada hijo necesita su propio pool (los hilos no sobreviven al fork)
+                server.pool = ThreadPoolExecutor(
+                    max_workers=server.workers, thread_name_prefix="nutria"
+                )
+                _servir(server, gracia_s, crear_store)
+            finally:
+                os._exit(0)
+        hijos.append(pid)
+
+    def _reenviar(signum, frame):
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _reenviar)
+    signal.signal(signal.SIGINT, _reenviar)
+
+    for pid in hijos:
+        os.waitpid(pid, 0)
+    server.server_close()
+
+
+def crear_engine(
+    base_url: Optional[str],
+    modelo: str,
+    system_path: str,
+    store: Optional[ConversationStore] = None,
+    politica: Optional[PoliticaLlamadas] = None,
+    presupuesto_turno_s: Optional[float] = 45.0,
+    especular: bool = False,
+    enrutador: Optional[EnrutadorIntenciones] = None,
+    compacto: bool = False,
+    max_tokens_tool: int = 600,
+) -> ChatEngine:
+    api_key = os.getenv("OPENAI_API_KEY") or ("fake" if base_url else None)
+    with open(system_path, "r", encoding="utf-8") as f:
+        system_message = f.read()
+    return ChatEngine(
+        api_key=api_key,
+        model_llm=modelo,
+        system_message=system_message,
+        base_url=base_url,
+        store=store,
+        politica=politica,
+        presupuesto_turno_s=presupuesto_turno_s,
+        especular=especular,
+        enrutador=enrutador,
+        compacto=compacto,
+        max_tokens_tool=max_tokens_tool,
+    )
+
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Servidor HTTP de NutrIA.")
+    parser.add_argument("--host", default=os.getenv("NUTRIA_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("NUTRIA_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=16, help="Hilos por proceso.")
+    parser.add_argument("--max-inflight", type=int, default=8, help="Chats al LLM en vuelo por proceso.")
+    parser.add_argument("--espera-ms", type=float, default=2000.0, help="Espera máxima por cupo antes de 503.")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos pre-fork (Linux/macOS).")
+    parser.add_argument("--gracia-s", type=float, default=30.0, help="Tiempo para drenar al apagar.")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"))
+    parser.add_argument("--modelo", default="gpt-4o-mini")
+    parser.add_argument("--system-message", default="system_message.txt")
+    parser.add_argument("--db-conversaciones", default="conversaciones.sqlite")
+    parser.add_argument("--ventana-ram", type=int, default=40, help="Mensajes en RAM por sesión.")
+    parser.add_argument("--inactividad-s", type=float, default=1800.0)
+    parser.add_argument("--timeout-s", type=float, default=20.0, help="Timeout por llamada al LLM.")
+    parser.add_argument("--reintentos", type=int, default=3, help="Reintentos ante 429/5xx/timeouts.")
+    parser.add_argument("--hedge", action="store_true", help="Duplicar llamadas que pasan del p95.")
+    parser.add_argument("--presupuesto-turno-s", type=float, default=45.0, help="Tiempo máximo por turno.")
+    parser.add_argument("--especular", action="store_true", help="Adelantar get_food_info detectando alimentos.")
+    parser.add_argument("--enrutar", action="store_true", help="Responder consultas simples sin LLM.")
+    parser.add_argument("--modelo-intenciones", default=None, help="Clasificador entrenado (.pkl).")
+    parser.add_argument("--compacto", action="store_true", help="System message, tools y resultados compactos.")
+    parser.add_argument("--max-tokens-tool", type=int, default=600, help="Tope por resultado de tool (compacto).")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    politica = PoliticaLlamadas(
+        timeout_s=args.timeout_s, reintentos=args.reintentos, hedge=args.hedge
+    )
+    engine = crear_engine(
+        args.base_url, args.modelo, args.system_message,
+        politica=politica, presupuesto_turno_s=args.presupuesto_turno_s,
+        especular=args.especular,
+        compacto=args.compacto,
+        max_tokens_tool=args.max_tokens_tool,
+        enrutador=(
+            EnrutadorIntenciones.desde_archivo(args.modelo_intenciones) if args.enrutar else None
+        ),
+    )
+    server = NutriaServer(
+        (args.host, args.port),
+        engine,
+        workers=args.workers,
+        max_inflight=args.max_inflight,
+        espera_ms=args.espera_ms,
+        verbose=args.verbose,
+    )
+    # Cargar el dataset ya (es perezoso): antes del fork, para que los hijos
+    # compartan sus páginas, y antes de aceptar la primera petición
+    datos = vista()
+    print(
+        f"NutrIA escuchando en http://{args.host}:{server.server_address[1]} "
+        f"({args.procesos} proceso(s) × {args.workers} workers, {len(datos.df)} alimentos)"
+    )
+
+    def crear_store() -> ConversationStore:
+        return ConversationStore(
+            ruta_db=args.db_conversaciones,
+            ventana=args.ventana_ram,
+            inactividad_s=args.inactividad_s,
+        )
+
+    if args.procesos > 1:
+        _servir_multiproceso(server, args.procesos, args.gracia_s, crear_store)
+    else:
+        _servir(server, args.gracia_s, crear_store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+Ingesta del libro SMAE: PDF → PNG → tablas (modelo de visión) → CSV limpio.
+
+Reemplaza el loop de `Extras/Ingesta de libro SMAE.ipynb`:
+
+- Convierte páginas del PDF en paralelo (acotado) y omite las que ya existen.
+- Extrae cada página con concurrencia acotada, límite de peticiones por
+  minuto y reintentos con backoff exponencial.
+- Caché por página según el hash del PNG (+ modelo + versión del prompt):
+  una página ya extraída nunca se vuelve a enviar, aunque el proceso se caiga.
+- Escribe las filas de forma incremental (smae_filas.jsonl) conforme
+  terminan las páginas; al final arma smae_tablas.csv y ejecuta la limpieza
+  que produce dataset_limpio.csv.
+
+Uso:
+    python -m nutria_core.smae_ingesta --pdf SMAE.pdf --salida build/
+    python -m nutria_core.smae_ingesta --paginas Extras/pages --salida build/ \\
+        --base-url http://127.0.0.1:8700/v1     # offline contra fake_openai
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+from .smae_limpieza import limpiar_smae
+
+MODELO_VISION = "gpt-4.1-mini"
+
+# Cambiar la versión invalida la caché de todas las páginas
+PROMPT_VERSION = "1"
+
+PROMPT_EXTRACCION = """
+Eres un experto en lectura de tablas del SMAE.
+Extrae la tabla principal de la imagen y devuélvela en este formato EXACTO:
+
+{
+  "categoria": "texto o null",
+  "alimentos": [
+     {
+       "alimento": "",
+       "unidad": "",
+       "peso_crudo_g": null,
+       "peso_neto_g": null,
+       "energia_kcal": null,
+       "proteina_g": null,
+       "lipidos_g": null,
+       "hidratos_carbono_g": null,
+       "fibra_g": null,
+       "azucar_g": null,
+       "colesterol_mg": null,
+       "acidos_saturados_g": null,
+       "acidos_monoinsaturados_g": null,
+       "acidos_poliinsaturados_g": null,
+       "acido_folico_mcg": null,
+       "vitamina_a_mcg": null,
+       "calcio_mg": null,
+       "hierro_mg": null,
+       "sodio_mg": null,
+       "potasio_mg": null,
+       "fosforo_mg": null,
+       "zinc_mg": null,
+       "selenio_mcg": null,
+       "carga_glicemica": null
+    }
+  ]
+}
+
+Reglas IMPORTANTES:
+- Usa SIEMPRE un JSON válido. No añadas texto antes ni después.
+- Si alguna casilla aparece como "ND" o está vacía, pon el valor como null.
+- Si algún nutriente no aparece en la tabla de esa página, llena todos sus valores con null.
+- No inventes filas que no estén en la tabla.
+"""
+
+# Errores transitorios que vale la pena reintentar
+ERRORES_REINTENTABLES = (
+    RateLimitError,
+    APITimeoutError,
+    APIConnectionError,
+    InternalServerError,
+    json.JSONDecodeError,
+)
+
+
+# =========================================================
+# Límite de peticiones
+# =========================================================
+
+class LimitadorTasa:
+    """
+    Token bucket: como máximo `por_minuto` peticiones por minuto,
+    compartido por todos los hilos.
+    """
+
+    def __init__(self, por_minuto: float) -> None:
+        self.capacidad = max(1.0, por_minuto / 60.0)
+        self.ritmo = por_minuto / 60.0  # tokens por segundo
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self) -> None:
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.ritmo)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                falta = (1 - self.tokens) / self.ritmo
+            time.sleep(falta)
+
+
+# =========================================================
+# Caché por página
+# =========================================================
+
+class CachePaginas:
+    """
+    Un archivo JSON por página extraída, nombrado por el hash del contenido.
+    """
+
+    def __init__(self, directorio: str, modelo: str) -> None:
+        self.directorio = directorio
+        self.modelo = modelo
+        os.makedirs(directorio, exist_ok=True)
+
+    def clave(self, png: bytes) -> str:
+        h = hashlib.sha256(png)
+        h.update(f"|{self.modelo}|{PROMPT_VERSION}".encode())
+        return h.hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def leer(self, clave: str) -> Optional[dict]:
+        try:
+            with open(self._ruta(clave), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def guardar(self, clave: str, data: dict) -> None:
+        # Escritura atómica: nunca queda un JSON a medias si el proceso muere
+        tmp = self._ruta(clave) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self._ruta(clave))
+
+
+# =========================================================
+# PDF → PNG
+# =========================================================
+
+def convertir_pdf(
+    pdf_path: str,
+    paginas_dir: str,
+    dpi: int = 180,
+    paralelo: int = 4,
+    poppler_path: Optional[str] = None,
+) -> List[str]:
+    """
+    Convierte cada página del PDF a PNG (una página por tarea, para no
+    saturar memoria). Las páginas que ya existen no se vuelven a convertir.
+    """
+    # Dependencia opcional: solo se necesita si se parte del PDF
+    from pdf2image import convert_from_path, pdfinfo_from_path
+
+    os.makedirs(paginas_dir, exist_ok=True)
+    num_pages = pdfinfo_from_path(pdf_path, poppler_path=poppler_path)["Pages"]
+
+    def convertir(page_num: int) -> str:
+        destino = os.path.join(paginas_dir, f"page_{page_num:03d}.png")
+        if not os.path.exists(destino):
+            img = convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                first_page=page_num,
+                last_page=page_num,
+                poppler_path=poppler_path,
+            )[0]
+            img.save(destino + ".tmp", "PNG")
+            os.replace(destino + ".tmp", destino)
+        return destino
+
+    with ThreadPoolExecutor(max_workers=paralelo) as pool:
+        return list(pool.map(convertir, range(1, num_pages + 1)))
+
+
+def listar_paginas(paginas_dir: str) -> List[str]:
+    return [
+        os.path.join(paginas_dir, f)
+        for f in sorted(os.listdir(paginas_dir))
+        if f.lower().endswith(".png")
+    ]
+
+
+# =========================================================
+# Extracción
+# =========================================================
+
+def extraer_tabla_smae(client: OpenAI, png: bytes, modelo: str) -> dict:
+    """
+    Envía una página al modelo de visión y devuelve el JSON de la tabla.
+    """
+    b64 = base64.b64encode(png).decode("utf-8")
+    response = client.chat.completions.create(
+        model=modelo,
+        response_format={"type": "json_object"},
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": PROMPT_EXTRACCION},
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": f"data:image/png;base64,{b64}"},
+                    },
+                ],
+            }
+        ],
+    )
+    return json.loads(response.choices[0].message.content)
+
+
+class Ingesta:
+    """
+    Orquesta la extracción concurrente con caché, reintentos y escritura
+    incremental de filas.
+    """
+
+    def __init__(
+        self,
+        client: OpenAI,
+        salida_dir: str,
+        modelo: str = MODELO_VISION,
+        concurrencia: int = 4,
+        por_minuto: float = 60.0,
+        reintentos: int = 5,
+        backoff_s: float = 1.0,
+    ) -> None:
+        self.client = client
+        self.modelo = modelo
+        self.concurrencia = concurrencia
+        self.reintentos = reintentos
+        self.backoff_s = backoff_s
+
+        os.makedirs(salida_dir, exist_ok=True)
+        self.cache = CachePaginas(os.path.join(salida_dir, "cache"), modelo)
+        self.limitador = LimitadorTasa(por_minuto)
+        self.filas_path = os.path.join(salida_dir, "smae_filas.jsonl")
+        self.tablas_path = os.path.join(salida_dir, "smae_tablas.csv")
+        self.limpio_path = os.path.join(salida_dir, "dataset_limpio.csv")
+
+        self._lock = threading.Lock()
+        self._paginas_escritas = self._leer_paginas_escritas()
+        self.stats: Dict[str, int] = {"cache": 0, "extraidas": 0, "fallidas": 0, "reintentos": 0}
+
+    def _leer_paginas_escritas(self) -> set:
+        paginas = set()
+        if os.path.exists(self.filas_path):
+            with open(self.filas_path, "r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        paginas.add(json.loads(linea)["pagina"])
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # última línea truncada por una caída
+        return paginas
+
+    def _escribir_filas(self, pagina: str, data: dict) -> None:
+        """
+        Agrega las filas de una página al JSONL (una sola vez por página).
+        """
+        categoria = data.get("categoria")
+        filas = [
+            {**fila, "categoria": categoria, "pagina": pagina}
+            for fila in data.get("alimentos") or []
+            if isinstance(fila, dict)
+        ]
+        with self._lock:
+            if pagina in self._paginas_escritas:
+                return
+            with open(self.filas_path, "a", encoding="utf-8") as f:
+                for fila in filas:
+                    f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+                if not filas:
+                    # Marcador para no volver a considerar la página como pendiente
+                    f.write(json.dumps({"pagina": pagina, "_vacia": True}) + "\n")
+            self._paginas_escritas.add(pagina)
+
+    def _sumar(self, clave: str) -> None:
+        with self._lock:
+            self.stats[clave] += 1
+
+    def procesar_pagina(self, ruta: str) -> None:
+        pagina = os.path.basename(ruta)
+        with open(ruta, "rb") as f:
+            png = f.read()
+
+        clave = self.cache.clave(png)
+        data = self.cache.leer(clave)
+        if data is not None:
+            self._sumar("cache")
+        else:
+            for intento in range(self.reintentos + 1):
+                self.limitador.esperar()
+                try:
+                    data = extraer_tabla_smae(self.client, png, self.modelo)
+                    break
+                except ERRORES_REINTENTABLES as e:
+                    if intento == self.reintentos:
+                        self._sumar("fallidas")
+                        print(f"❌ {pagina}: {e!r} (sin más reintentos)")
+                        return
+                    self._sumar("reintentos")
+                    # Backoff exponencial con jitter completo
+                    time.sleep(random.uniform(0, self.backoff_s * 2 ** intento))
+            self.cache.guardar(clave, data)
+            self._sumar("extraidas")
+
+        self._escribir_filas(pagina, data)
+
+    def ejecutar(self, paginas: List[str], limpiar: bool = True) -> Dict[str, int]:
+        with ThreadPoolExecutor(max_workers=self.concurrencia) as pool:
+            futuros = {pool.submit(self.procesar_pagina, p): p for p in paginas}
+            for i, fut in enumerate(as_completed(futuros), start=1):
+                exc = fut.exception()
+                if exc is not None:
+                    self._sumar("fallidas")
+                    print(f"❌ {os.path.basename(futuros[fut])}: {exc!r}")
+                if i % 10 == 0 or i == len(futuros):
+                    print(f"{i}/{len(futuros)} páginas · {self.stats}")
+
+        self.consolidar(limpiar=limpiar)
+        return self.stats
+
+    def consolidar(self, limpiar: bool = True) -> None:
+        """
+        JSONL → smae_tablas.csv (ordenado por página) → dataset_limpio.csv.
+        """
+        filas = []
+        if os.path.exists(self.filas_path):  # no existe si ninguna página salió bien
+            with open(self.filas_path, "r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        fila = json.loads(linea)
+                    except json.JSONDecodeError:
+                        continue
+                    if not fila.get("_vacia"):
+                        filas.append(fila)
+
+        df = pd.DataFrame(filas)
+        if df.empty:
+            print("No hay filas extraídas todavía.")
+            return
+        df = df.sort_values("pagina", kind="stable")
+        df.to_csv(self.tablas_path, index=False, encoding="utf-8-sig")
+        print(f"{len(df)} filas → {self.tablas_path}")
+
+        if limpiar:
+            limpio = limpiar_smae(df)
+            limpio.to_csv(self.limpio_path, index=False)
+            print(f"{len(limpio)} alimentos → {self.limpio_path}")
+
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Ingesta concurrente y reanudable del SMAE.")
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument("--pdf", help="PDF del SMAE (requiere pdf2image + poppler).")
+    origen.add_argument("--paginas", help="Directorio con las páginas ya convertidas a PNG.")
+    parser.add_argument("--salida", default="ingesta_smae")
+    parser.add_argument("--poppler-path", default=None)
+    parser.add_argument("--dpi", type=int, default=180)
+    parser.add_argument("--modelo", default=MODELO_VISION)
+    parser.add_argument("--concurrencia", type=int, default=4)
+    parser.add_argument("--por-minuto", type=float, default=60.0, help="Máximo de peticiones por minuto.")
+    parser.add_argument("--reintentos", type=int, default=5)
+    parser.add_argument("--backoff-s", type=float, default=1.0)
+    parser.add_argument("--sin-limpieza", action="store_true")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"))
+    args = parser.parse_args()
+
+    if args.pdf:
+        paginas_dir = os.path.join(args.salida, "pages")
+        paginas = convertir_pdf(
+            args.pdf, paginas_dir, dpi=args.dpi,
+            paralelo=args.concurrencia, poppler_path=args.poppler_path,
+        )
+    else:
+        paginas = listar_paginas(args.paginas)
+
+    api_key = os.getenv("OPENAI_API_KEY") or ("fake" if args.base_url else None)
+    # Los reintentos los controla la ingesta (con su propio backoff)
+    client = OpenAI(api_key=api_key, base_url=args.base_url, max_retries=0)
+
+    ingesta = Ingesta(
+        client,
+        args.salida,
+        modelo=args.modelo,
+        concurrencia=args.concurrencia,
+        por_minuto=args.por_minuto,
+        reintentos=args.reintentos,
+        backoff_s=args.backoff_s,
+    )
+    stats = ingesta.ejecutar(paginas, limpiar=not args.sin_limpieza)
+    print("Listo:", stats)
+
+
+if __name__ == "__main__":
+    main()
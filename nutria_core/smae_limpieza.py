@@ -0,0 +1,379 @@
+"""
+Limpieza de las tablas extraídas del SMAE → dataset_limpio.csv.
+
+Es el mismo proceso de `Extras/Limpieza_EDA.ipynb` (sin la parte de EDA),
+empaquetado como función para que la ingesta lo ejecute al final.
+
+Uso:
+    python -m nutria_core.smae_limpieza smae_tablas.csv dataset_limpio.csv
+"""
+
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# =========================================================
+# Catálogos
+# =========================================================
+
+# Páginas del libro que no son tablas de macro y micronutrientes
+PAGINAS_A_ELIMINAR = [
+    1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15,
+    27, 42, 43, 91, 95, 132, 144, 145, 162, 163, 189, 203, 206, 207, 208,
+]
+
+# El modelo nombró las mismas columnas de distintas formas según la página
+COLS_SATURADOS = [
+    "acidos_saturados_g",
+    "ag_saturados_g",
+    "AG saturados_g",
+    "ac_g_saturados_g",
+]
+COLS_MONOINSATURADOS = [
+    "acidos_monoinsaturados_g",
+    "ag_monoinsaturados_g",
+    "AG monoinsaturados_g",
+    "ac_monoinsaturados_g",
+    "AG monoinsaturados (g)",
+]
+COLS_POLIINSATURADOS = [
+    "acidos_poliinsaturados_g",
+    "ag_poliinsaturados_g",
+    "AG poliinsaturados_g",
+    "ac_poliinsaturados_g",
+    "AG poliinsaturados (g)",
+]
+COLS_COLESTEROL = [
+    "colesterol_mg",
+    "colesterol",
+]
+
+MAPA_CATEGORIAS = {
+    # AZÚCARES
+    "azúcares sin grasa": "azucares",
+    "azúcares CON GRASA": "azucares",
+    "azúcares SIN GRASA": "azucares",
+    "azúcares": "azucares",
+    "azúcares con grasa": "azucares",
+    # CEREALES
+    "cereales": "cereales",
+    "cereales CON GRASA": "cereales",
+    "cereales SIN GRASA": "cereales",
+    "cereales sin grasa": "cereales",
+    "cereales con grasa": "cereales",
+    "Cereales con grasa": "cereales",
+    "Cereales sin grasa": "cereales",
+    # VERDURAS
+    "verduras": "verduras",
+    "Verduras": "verduras",
+    # FRUTAS
+    "frutas": "frutas",
+    # LEGUMINOSAS
+    "leguminosas": "leguminosas",
+    # ORIGEN ANIMAL
+    "origen animal": "origen_animal",
+    "origen animal MUY BAJO APORTE DE GRASA": "origen_animal",
+    "origen animal BAJO APORTE DE GRASA": "origen_animal",
+    "origen animal ALTO APORTE DE GRASA": "origen_animal",
+    "Caldo y Consomés": "origen_animal",
+    # GRASAS
+    "grasas": "grasas",
+    "grasas CON PROTEÍNA": "grasas",
+    "grasas con proteína": "grasas",
+    "grasas sin proteína": "grasas",
+    "grasas con proteina": "grasas",
+    "grasas sin proteina": "grasas",
+    "grasas SIN PROTEINA": "grasas",
+    "grasas SIN PROTEÍNA": "grasas",
+    "grasas CON PROTEINA": "grasas",
+    # LÁCTEOS
+    "leche ENTERA": "lacteos",
+    "leche con azúcar": "lacteos",
+    "leche descremada": "lacteos",
+    "Leche descremada": "lacteos",
+    "leche": "lacteos",
+    "leche CON AZUCAR": "lacteos",
+    "leche SEMIDESCREMADA": "lacteos",
+    "leche CON AZÚCAR": "lacteos",
+    # LIBRES EN ENERGÍA
+    "libres en energía": "libres_energia",
+    "libres en energia": "libres_energia",
+    # ALCOHOL
+    "bebidas alcohólicas": "alcohol",
+    # OTROS (tablas del SMAE)
+    "Chocolate para repostería sin azúcar": "otros",
+}
+
+UNIDADES = [
+    "gramos", "gramo", "g",
+    "taza", "tazas",
+    "pieza", "piezas", "pza", "pza med", "pieza ch",
+    "cda", "cucharada", "cucharadas",
+    "cdta", "cdita", "cditas", "cucharadita", "cucharaditas",
+    "reb", "rebanada", "rebanadas", "mitades",
+    "hoja", "hojas", "disp", "disparo",
+    "bolsa", "bolsita", "paquete", "paquetete", "paq", "pack/ch", "Pack ch",
+    "Pak ch", "frasco", "envase", "lata",
+    "copa", "vaso", "hoja", "bolista", "cdtla",
+    "filete", "porcion", "porción",
+    "ml", "orejones", "cdia", "sobre", "barra", "cápsula", "raja",
+    "tarro", "botella", "tubo", "bola", "bote",
+]
+
+CATALOGO_MEDIDAS = {
+    # gramos
+    "gramo": "g",
+    "gramos": "g",
+    "g": "g",
+    # cucharada
+    "cda": "cda",
+    "cucharada": "cda",
+    # cucharadita
+    "cdta": "cdta",
+    "cdita": "cdta",
+    "cdtla": "cdta",
+    "cucharadita": "cdta",
+    "disp.": "cdta",
+    # piezas
+    "pieza": "pieza",
+    "pza": "pieza",
+    "barra": "barra",
+    "cdia": "pieza",
+    "orejones": "pieza",
+    # rebanada
+    "reb": "rebanada",
+    # tazas
+    "taza": "taza",
+    # ml
+    "ml": "ml",
+    # hojas
+    "hoja": "hoja",
+    # empaques
+    "bolsa": "bolsa",
+    "bolsita": "bolsa",
+    "bolista": "bolsa",
+    "paquete": "paquete",
+    # contenedores
+    "frasco": "frasco",
+    "envase": "envase",
+    "lata": "lata",
+    "tarro": "tarro",
+    # porciones
+    "porción": "porcion",
+    # otros
+    "copa": "copa",
+    "vaso": "vaso",
+    "unidad_desconocida": "unidad",
+    "filete": "filete",
+    "sobre": "sobre",
+    "cápsula": "cápsula",
+}
+
+COLUMNAS_NUMERICAS = [
+    "peso_crudo_g", "peso_neto_g", "energía_kcal", "energia_kcal", "proteina_g", "lipidos_g",
+    "hidratos_carbono_g", "fibra_g", "azucar_g", "selenio_mcg", "carga_glicemica",
+    "acido_ascorbico_mg", "peso_bruto_g",
+]
+
+MICROS = [
+    "acido_folico_mcg", "vitamina_a_mcg", "calcio_mg", "hierro_mg",
+    "sodio_mg", "potasio_mg", "fosforo_mg", "zinc_mg", "selenio_mcg",
+    "acido_ascorbico_mg", "carga_glicemica",
+]
+
+
+# =========================================================
+# Helpers
+# =========================================================
+
+def unificar_columnas(df: pd.DataFrame, columnas, nueva: str) -> pd.DataFrame:
+    """
+    Crea una columna tomando el primer valor no nulo de la lista de columnas.
+    """
+    df[nueva] = np.nan
+    for col in columnas:
+        if col in df.columns:
+            df[nueva] = df[nueva].fillna(df[col])
+    return df
+
+
+def parse_cantidad(texto):
+    """
+    "1/2 taza" → 0.5, "1 1/2 pieza" → 1.5, "pieza" → 1.
+    """
+    if not isinstance(texto, str):
+        return np.nan
+
+    texto = texto.strip().lower()
+
+    if not re.search(r"\d", texto):
+        return 1
+
+    if re.fullmatch(r"\d+(\.\d+)?", texto):
+        return float(texto)
+
+    if re.fullmatch(r"\d+/\d+", texto):
+        num, den = texto.split("/")
+        return float(num) / float(den)
+
+    m = re.fullmatch(r"(\d+)\s+(\d+)/(\d+)", texto)
+    if m:
+        return float(m.group(1)) + float(m.group(2)) / float(m.group(3))
+
+    cantidades = []
+    for p in texto.split():
+        if re.fullmatch(r"\d+", p):
+            cantidades.append(float(p))
+        elif re.fullmatch(r"\d+/\d+", p):
+            num, den = p.split("/")
+            cantidades.append(float(num) / float(den))
+
+    return sum(cantidades) if cantidades else 1
+
+
+def parse_medida(texto):
+    """
+    Primera unidad conocida que aparezca en el texto de la porción.
+    """
+    if not isinstance(texto, str):
+        return np.nan
+
+    texto = texto.lower()
+    for u in UNIDADES:
+        if u in texto:
+            return u.replace(" ", "_")
+    return "unidad_desconocida"
+
+
+def limpiar_a_numerico(series: pd.Series) -> pd.Series:
+    """
+    Quita unidades y símbolos ("12 mg", "0,5") y convierte a float.
+    """
+    return (
+        series.astype(str)
+        .str.replace(",", ".", regex=False)
+        .str.replace(r"[^0-9.\-]", "", regex=True)
+        .replace("", "0")
+        .astype(float)
+    )
+
+
+# =========================================================
+# Limpieza
+# =========================================================
+
+def limpiar_smae(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte las filas crudas de la extracción (smae_tablas.csv) en el
+    dataset limpio que consume NutrIA (dataset_limpio.csv).
+    """
+    df = df.copy()
+
+    # 1) Quitar páginas que no son tablas de nutrientes
+    pagina_num = df["pagina"].astype(str).str.extract(r"(\d+)")[0].astype(int)
+    df = df[~pagina_num.isin(PAGINAS_A_ELIMINAR)].copy()
+    df = df.drop(columns=["pagina"])
+
+    # 2) Unificar columnas con nombres distintos
+    todas = list(dict.fromkeys(
+        COLS_SATURADOS + COLS_MONOINSATURADOS + COLS_POLIINSATURADOS + COLS_COLESTEROL
+    ))
+    for col in todas:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    df = unificar_columnas(df, COLS_SATURADOS, "ag_saturados_g_u")
+    df = unificar_columnas(df, COLS_MONOINSATURADOS, "ag_monoinsaturados_g_u")
+    df = unificar_columnas(df, COLS_POLIINSATURADOS, "ag_poliinsaturados_g_u")
+    # El colesterol viene en mg; se pasa a g como el resto de micronutrientes
+    df = unificar_columnas(df, COLS_COLESTEROL, "colesterol_u")
+    df["colesterol_u"] = df["colesterol_u"] * 1e-3
+    df = df.drop(columns=[c for c in todas if c in df.columns])
+
+    # 3) Nombres de columnas estándar
+    df.columns = (
+        df.columns.str.lower()
+        .str.replace(" ", "_")
+        .str.replace("(", "_")
+        .str.replace(")", "")
+        .str.replace(".", "", regex=False)
+    )
+
+    # 4) Categorías
+    df["categoria_limpia"] = df["categoria"].map(MAPA_CATEGORIAS).fillna("otros")
+    df = df.drop(columns=["categoria"])
+
+    # 5) Porciones: cantidad + medida estándar
+    df = df[df["unidad"].notna()].copy()
+    df["cantidad"] = df["unidad"].apply(parse_cantidad)
+    df["medida"] = df["unidad"].apply(parse_medida)
+    df["medida_estandar"] = df["medida"].replace(CATALOGO_MEDIDAS)
+
+    # 6) Nutrientes numéricos e imputación
+    for col in COLUMNAS_NUMERICAS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    for col in ["proteina_g", "lipidos_g", "hidratos_carbono_g", "fibra_g", "azucar_g"]:
+        df[col] = df[col].fillna(0)
+
+    for col in MICROS:
+        if col not in df.columns:
+            df[col] = np.nan
+    df[MICROS] = df[MICROS].fillna(0)
+
+    grasas = ["ag_saturados_g_u", "ag_monoinsaturados_g_u", "ag_poliinsaturados_g_u", "colesterol_u"]
+    df[grasas] = df[grasas].fillna(0)
+
+    # Estimado: 4 kcal/g de proteína y carbohidratos, 9 kcal/g de lípidos
+    df["energia_kcal"] = df["energia_kcal"].fillna(
+        df["proteina_g"] * 4 + df["lipidos_g"] * 9 + df["hidratos_carbono_g"] * 4
+    )
+
+    # 7) µg y mg → g
+    for col in ["acido_folico_mcg", "vitamina_a_mcg", "selenio_mcg"]:
+        df[col.replace("_mcg", "_g")] = limpiar_a_numerico(df[col]) * 1e-6
+        df = df.drop(columns=[col])
+
+    for col in [
+        "calcio_mg", "hierro_mg", "sodio_mg", "potasio_mg",
+        "fosforo_mg", "zinc_mg", "acido_ascorbico_mg",
+    ]:
+        df[col.replace("_mg", "_g")] = limpiar_a_numerico(df[col]) * 1e-3
+        df = df.drop(columns=[col])
+
+    # 8) Nombres finales
+    df = df.drop(columns=["unidad", "medida"], errors="ignore")
+    return df.rename(
+        columns={
+            "ag_saturados_g_u": "ag_saturados_g",
+            "ag_monoinsaturados_g_u": "ag_monoinsaturados_g",
+            "ag_poliinsaturados_g_u": "ag_poliinsaturados_g",
+            "colesterol_u": "colesterol_g",
+            "categoria_limpia": "categoria",
+            "medida_estandar": "medida",
+        }
+    )
+
+
+def limpiar_csv(entrada: str, salida: str) -> pd.DataFrame:
+    df = limpiar_smae(pd.read_csv(entrada))
+    df.to_csv(salida, index=False)
+    return df
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Limpia smae_tablas.csv → dataset_limpio.csv")
+    parser.add_argument("entrada", nargs="?", default="smae_tablas.csv")
+    parser.add_argument("salida", nargs="?", default="dataset_limpio.csv")
+    args = parser.parse_args()
+
+    df = limpiar_csv(args.entrada, args.salida)
+    print(f"{len(df)} alimentos → {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,48 @@ from .food_tools import get_food_info, get_nutrition_recommendations
 from .nutritional_plan import DatosPaciente, generar_plan_nutricional
 
 
+def ejecutar_tool(name: str, args: dict) -> str:
+    """
+    Ejecuta una tool por nombre con sus argumentos ya parseados y devuelve
+    el resultado como string JSON.
+
+    Nunca lanza excepciones: cualquier error se devuelve como {"error": ...}.
+    Se comparte entre el flujo de function calling y el servidor HTTP.
+    """
+    try:
+        # ---------------------------
+        # Tool: get_food_info
+        # ---------------------------
+        if name == "get_food_info":
+            return get_food_info(**args)
+
+        # ---------------------------
+        # Tool: get_nutrition_recommendations
+        # ---------------------------
+        if name == "get_nutrition_recommendations":
+            return get_nutrition_recommendations(**args)
+
+        # ---------------------------
+        # Tool: generar_plan_nutricional
+        # ---------------------------
+        if name == "generar_plan_nutricional":
+            datos = DatosPaciente(**args)
+            plan = generar_plan_nutricional(datos)
+            return plan.model_dump_json(ensure_ascii=False)
+
+        return json.dumps(
+            {"error": f"Función desconocida: {name}"},
+            ensure_ascii=False,
+        )
+
+    except Exception as e:
+        # Responder con error controlado a la tool
+        return json.dumps(
+            {"error": f"Error interno en tool '{name}': {str(e)}"},
+            ensure_ascii=False,
+        )
+
+
 def handle_tool_calls(tool_calls, client):
     """
     Procesa las tool-calls enviadas por el modelo y devuelve una lista
@@ -23,39 +65,7 @@ def handle_tool_calls(tool_calls, client):
         except json.JSONDecodeError:
             args = {}
         
-        try:
-            # ---------------------------
-            # Tool: get_food_info
-            # ---------------------------
-            if name == "get_food_info":
-                result = get_food_info(**args)
-
-            # ---------------------------
-            # Tool: get_nutrition_recommendations
-            # ---------------------------
-            elif name == "get_nutrition_recommendations":
-                result = get_nutrition_recommendations(**args)
-
-            # ---------------------------
-            # Tool: generar_plan_nutricional
-            # ---------------------------
-            elif name == "generar_plan_nutricional":
-                datos = DatosPaciente(**args)
-                plan = generar_plan_nutricional(datos)
-                result = plan.model_dump_json(ensure_ascii=False)
-
-            else:
-                result = json.dumps(
-                    {"error": f"Función desconocida: {name}"},
-                    ensure_ascii=False,
-                )
-
-        except Exception as e:
-            # Responder con error controlado a la tool
-            result = json.dumps(
-                {"error": f"Error interno en tool '{name}': {str(e)}"},
-                ensure_ascii=False,
-            )
+        result = ejecutar_tool(name, args)
 
         messages.append(
             {
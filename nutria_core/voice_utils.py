@@ -1,9 +1,27 @@
 import tempfile
-import os
+import threading
 from typing import Optional
-from openai import OpenAI
 
-client = OpenAI()
+from .openai_scheduler import ClienteProgramado, scheduler_global
+
+_client: Optional[ClienteProgramado] = None
+_lock = threading.Lock()
+
+
+def cliente() -> ClienteProgramado:
+    """
+    Cliente de audio del proceso, creado en el primer uso: importar este
+    módulo no carga el SDK de OpenAI ni exige OPENAI_API_KEY.
+    Mismo scheduler que ChatEngine: cupos y cola compartidos en el proceso.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            from openai import OpenAI
+
+            _client = ClienteProgramado(OpenAI(), scheduler_global())
+        return _client
+
 
 # ======================================================
 #  WHISPER → TEXTO
@@ -14,18 +32,16 @@ def whisper_to_text(uploaded_audio) -> str:
     Convierte audio grabado desde Streamlit en texto usando GPT-4o-mini-Transcribe.
     """
     try:
-        # Guardar el audio temporalmente
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-            tmp.write(uploaded_audio.read())
-            tmp_path = tmp.name
+        # Se envían los bytes directamente (sin archivo temporal); así el
+        # scheduler puede reconocer grabaciones idénticas en vuelo.
+        audio_bytes = uploaded_audio.read()
 
         # Modelo de transcripción correcto
-        result = client.audio.transcriptions.create(
-            file=open(tmp_path, "rb"),
+        result = cliente().audio.transcriptions.create(
+            file=("audio.wav", audio_bytes),
             model="gpt-4o-mini-transcribe",
         )
 
-        os.remove(tmp_path)
         return result.text
 
     except Exception as e:
@@ -45,7 +61,7 @@ def text_to_speech(text: str, voice: str = "alloy") -> Optional[str]:
     """
     try:
         # Llamada correcta al endpoint de TTS
-        response = client.audio.speech.create(
+        response = cliente().audio.speech.create(
             model="gpt-4o-mini-tts",
             voice=voice,       # alloy, nova, verse, shimmer...
             input=text,